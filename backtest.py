@@ -0,0 +1,263 @@
+"""
+Walk-forward backtest of the monthly models: every month t is scored with the model fitted on month t-1,
+as convex_handler.predict does, and measured against the securities' rated group M.
+The sample windows are built once over the golden distribution, then the scored months are split into
+chunks of consecutive months for a process pool - a worker fits (or loads from the model store) month t-1
+and scores month t one month at a time, returning the month's compact (SecurityID, M, M_pred) arrays and
+a confusion matrix. Chunks are consumed in month order with at most workers + 1 of them in flight, and
+folded into running totals, so memory is bounded by the chunks in flight and one state row per security.
+Run from the repository root:
+
+    python backtest.py --workers 4 --chunk-months 12
+"""
+import argparse
+import os
+import resource
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from const import CONSTRAINT_MODE, REQUIRED_SAMPLES
+from convex_class import RnpdEquation
+from data_reader import MonthlyData, get_partition_paths, get_partitions, iter_months, read_months, read_partition
+from model_class import ModelData
+from model_store import ModelStore, get_fit_settings
+
+# M between 1 and the last group - index 0 of the confusion matrix stands for unrated rows and rows not predicted
+GROUPS = max(REQUIRED_SAMPLES)
+BACKTEST_COLUMNS = ['month', 'M', 'SecurityID', 'Duration', 'Rnpd']
+
+# (scored month, model month, models_data of the model month)
+BacktestMonth = Tuple[str, str, pd.DataFrame]
+
+
+def get_previous_month(month: str) -> str:
+    return str(pd.Period(month, freq='M') - 1)
+
+
+def backtest_chunk(chunk: List[BacktestMonth],
+                   partitions: Dict[str, str],
+                   store_path: Optional[str] = None,
+                   constraints: str = CONSTRAINT_MODE) -> Dict:
+    # scores the months of a chunk in order, in a worker process. The store is only read here,
+    # new fits are returned for the parent process to save
+    store = ModelStore(store_path) if store_path else None
+    settings = get_fit_settings(constraints=constraints)
+    confusion = np.zeros((GROUPS + 1, GROUPS + 1), dtype=np.int64)  # rated x predicted
+    months, fitted, errors = [], [], {}
+    for month, model_month, models_data in chunk:
+        frame = read_partition(partitions[month], BACKTEST_COLUMNS)
+        durations, rnpds = frame['Duration'].to_numpy(dtype=float), frame['Rnpd'].to_numpy(dtype=float)
+        valid = np.isfinite(durations) & np.isfinite(rnpds)
+        predicted = np.zeros(len(frame), dtype=np.int8)
+        try:
+            key = store.get_key(models_data, settings) if store is not None else None
+            equation = store.load(key, model_month) if store is not None else None
+            if equation is None:
+                equation = RnpdEquation(data=models_data, month=model_month, constraints=constraints)
+                equation.fit_polynomial_regression()
+                fitted.append((key, equation))
+            predicted[valid] = equation.get_boundary_table().classify(durations[valid], rnpds[valid])
+        except Exception as E:
+            errors[model_month] = str(E)
+        rated = frame['M'].fillna(0).to_numpy().astype(np.int8)
+        np.add.at(confusion, (rated, predicted), 1)
+        months.append((month, frame['SecurityID'].to_numpy(dtype=np.int64), rated, predicted))
+    return {'months': months, 'confusion': confusion, 'fitted': fitted, 'errors': errors}
+
+
+def iter_in_order(run: Callable[[List], Dict], chunks: Iterable[List], workers: int) -> Iterator[Dict]:
+    # results of run(chunk) in chunk order, with at most workers + 1 chunks submitted ahead
+    if workers <= 1:
+        for chunk in chunks:
+            yield run(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(run, chunk))
+            if len(pending) > workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class LeadTimes:
+    """
+    Lead time to rating change, updated a month at a time. Each security keeps its last rated group and
+    the number of consecutive months up to its last month it was predicted above, or below, that group.
+    When its rating moves, the streak in the direction of the move is the lead time - the months the
+    model signalled the change before the rating did (0: not anticipated). Totals are per group before
+    the change.
+    """
+
+    def __init__(self):
+        self.slots: Dict[int, int] = {}
+        self.state = np.zeros((0, 4), dtype=np.int64)  # last month ordinal, last rated group, above, below
+        self.changes = np.zeros(GROUPS + 1, dtype=np.int64)
+        self.anticipated = np.zeros(GROUPS + 1, dtype=np.int64)
+        self.lead_months = np.zeros(GROUPS + 1, dtype=np.int64)
+        self.max_lead = np.zeros(GROUPS + 1, dtype=np.int64)
+
+    def get_slots(self, security_ids: np.ndarray) -> np.ndarray:
+        slots = np.fromiter((self.slots.setdefault(security_id, len(self.slots))
+                             for security_id in security_ids.tolist()), dtype=np.int64, count=len(security_ids))
+        if len(self.slots) > len(self.state):
+            grown = np.zeros((max(len(self.slots), 2 * len(self.state)), 4), dtype=np.int64)
+            grown[:len(self.state), :] = self.state
+            grown[len(self.state):, 0] = np.iinfo(np.int64).min  # never seen
+            self.state = grown
+        return slots
+
+    def update(self, month: str, security_ids: np.ndarray, rated: np.ndarray, predicted: np.ndarray):
+        # a security scored twice in a month (a resampled gov bond) counts once
+        _, first = np.unique(security_ids, return_index=True)
+        security_ids, rated, predicted = security_ids[first], rated[first], predicted[first]
+        ordinal = pd.Period(month, freq='M').ordinal
+        slots = self.get_slots(security_ids)
+        last_month, last_rated, above, below = self.state[slots].T
+
+        consecutive = last_month == ordinal - 1
+        moved = consecutive & (last_rated > 0) & (rated > 0) & (rated != last_rated)
+        lead = np.where(rated > last_rated, above, below)[moved]
+        from_groups = last_rated[moved]
+        np.add.at(self.changes, from_groups, 1)
+        np.add.at(self.anticipated, from_groups, lead > 0)
+        np.add.at(self.lead_months, from_groups, lead)
+        np.maximum.at(self.max_lead, from_groups, lead)
+
+        # streaks count on from a security's previous month only
+        scored = (rated > 0) & (predicted > 0)
+        self.state[slots, 0] = ordinal
+        self.state[slots, 1] = rated
+        self.state[slots, 2] = np.where(scored & (predicted > rated), np.where(consecutive, above, 0) + 1, 0)
+        self.state[slots, 3] = np.where(scored & (predicted < rated), np.where(consecutive, below, 0) + 1, 0)
+
+    def to_frame(self) -> pd.DataFrame:
+        frame = pd.DataFrame({'rating_changes': self.changes, 'anticipated': self.anticipated,
+                              'lead_months': self.lead_months, 'max_lead': self.max_lead},
+                             index=pd.RangeIndex(GROUPS + 1, name='M'))
+        frame['anticipated_rate'] = frame['anticipated'] / frame['rating_changes']
+        frame['mean_lead'] = frame.pop('lead_months') / frame['anticipated']
+        return frame.iloc[1:]
+
+
+class BacktestResult:
+    """
+    Running totals of a backtest: the rated x predicted confusion matrix, the rows and hits per scored
+    month and the lead times to rating change.
+    """
+
+    def __init__(self):
+        self.confusion = np.zeros((GROUPS + 1, GROUPS + 1), dtype=np.int64)
+        self.months: Dict[str, Tuple[int, int]] = {}
+        self.lead_times = LeadTimes()
+        self.errors: Dict[str, str] = {}
+
+    def add_chunk(self, result: Dict):
+        self.confusion += result['confusion']
+        self.errors.update(result['errors'])
+        for month, security_ids, rated, predicted in result['months']:
+            scored = rated > 0
+            self.months[month] = (int(scored.sum()), int((predicted[scored] == rated[scored]).sum()))
+            self.lead_times.update(month, security_ids, rated, predicted)
+
+    def get_confusion(self) -> pd.DataFrame:
+        # rated groups in rows, predicted groups in columns (0 - not predicted), unrated rows left out
+        return pd.DataFrame(self.confusion[1:],
+                            index=pd.RangeIndex(1, GROUPS + 1, name='M'),
+                            columns=pd.RangeIndex(GROUPS + 1, name='M_pred'))
+
+    def get_groups(self) -> pd.DataFrame:
+        # hit rate and within one group rate per rated group, with the lead times of its rating changes
+        confusion = self.confusion[1:, 1:]
+        groups = np.arange(1, GROUPS + 1)
+        near = np.abs(groups[:, None] - groups[None, :]) <= 1
+        frame = pd.DataFrame({'rows': self.confusion[1:].sum(axis=1),
+                              'hits': np.diag(confusion),
+                              'near': (confusion * near).sum(axis=1)},
+                             index=pd.RangeIndex(1, GROUPS + 1, name='M'))
+        frame['hit_rate'] = frame.pop('hits') / frame['rows']
+        frame['within_one'] = frame.pop('near') / frame['rows']
+        frame = frame.join(self.lead_times.to_frame())
+        return frame[(frame['rows'] > 0) | (frame['rating_changes'] > 0)]
+
+    def get_months(self) -> pd.DataFrame:
+        frame = pd.DataFrame.from_dict(self.months, orient='index', columns=['rows', 'hits']).sort_index()
+        frame['hit_rate'] = frame['hits'] / frame['rows']
+        return frame.rename_axis('month')
+
+
+def run_backtest(data: Union[pd.DataFrame, MonthlyData],
+                 test_path: str,
+                 workers: int = 1,
+                 chunk_months: int = 12,
+                 store: Optional[ModelStore] = None,
+                 constraints: str = CONSTRAINT_MODE) -> BacktestResult:
+    # data - the golden distribution the models are fitted on, test_path - csv or month partitions to score
+    model = ModelData(constraints=constraints, raw_data='drop')  # only the median tables are needed
+    for month, month_data in iter_months(data):
+        model.load_month(data=month_data, month=month)
+
+    partitions = get_partition_paths(get_partitions(test_path))
+    scored = []
+    for month in partitions:
+        model_month = get_previous_month(month)
+        if model.models_data.get(model_month) is not None and not model.models_data[model_month].empty:
+            scored.append((month, model_month, model.models_data[model_month]))
+    chunks = [scored[i:i + chunk_months] for i in range(0, len(scored), chunk_months)]
+    run = partial(backtest_chunk, partitions=partitions, store_path=store.path if store is not None else None,
+                  constraints=constraints)
+
+    result = BacktestResult()
+    settings = get_fit_settings(constraints=constraints)
+    for chunk_result in iter_in_order(run, chunks, workers):
+        result.add_chunk(chunk_result)
+        if store is not None:
+            for key, equation in chunk_result['fitted']:
+                store.save(key, equation, settings)
+    return result
+
+
+def get_peak_memory() -> float:
+    # MiB, of this process and of its largest finished worker (ru_maxrss is in KiB on linux)
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data', default='data/preprocessed/data_for_convex.csv', help='golden distribution')
+    parser.add_argument('--test-data', default='data/preprocessed/full_data_for_convex.csv',
+                        help='scored with the previous month\'s model')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-months', type=int, default=12)
+    parser.add_argument('--constraints', choices=['grid', 'adaptive'], default=CONSTRAINT_MODE)
+    parser.add_argument('--no-store', action='store_true', help='fit every month instead of using the model store')
+    parser.add_argument('--output', help='write the group, month and confusion tables to <output>_*.csv')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    result = run_backtest(read_months(args.data), args.test_data, args.workers, args.chunk_months,
+                          None if args.no_store else ModelStore(), args.constraints)
+    months = result.get_months()
+    pd.set_option('display.width', 200)
+    print(result.get_groups().round(3).to_string())
+    print(f'\n{len(months)} months, {months["rows"].sum():,} rated rows, hit rate '
+          f'{months["hits"].sum() / months["rows"].sum():.3f} in {time.perf_counter() - start:.1f}s, '
+          f'peak memory {get_peak_memory():.0f} MiB')
+    for month, error in sorted(result.errors.items()):
+        print(f'month: {month} model failed: {error}')
+    if args.output:
+        result.get_groups().to_csv(f'{args.output}_groups.csv')
+        months.to_csv(f'{args.output}_months.csv')
+        result.get_confusion().to_csv(f'{args.output}_confusion.csv')
+
+
+if __name__ == '__main__':
+    main()
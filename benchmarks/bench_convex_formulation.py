@@ -0,0 +1,58 @@
+"""
+Wall time per month of the scalar (loop) RNPD formulation against the compiled matrix formulation,
+on the golden distribution data. Run from the repository root:
+
+    python -m benchmarks.bench_convex_formulation --months 12
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from convex_class import RnpdEquation
+from model_class import ModelData
+
+DATA_PATH = 'data/preprocessed/data_for_convex.csv'
+
+
+def run(data: pd.DataFrame, n_months: int, tolerance: float):
+    model = ModelData()
+    scalar_times, matrix_times, max_diffs = [], [], []
+    for month in sorted(data.month.astype(str).unique())[:n_months]:
+        model.load_month(data=data[data.month == month], month=month)
+
+        scalar = RnpdEquation(data=model.models_data[month], month=month)
+        start = time.perf_counter()
+        scalar.fit_polynomial_regression_scalar()
+        scalar_times.append(time.perf_counter() - start)
+
+        matrix = RnpdEquation(data=model.models_data[month], month=month)
+        start = time.perf_counter()
+        matrix.fit_polynomial_regression()
+        matrix_times.append(time.perf_counter() - start)
+
+        max_diffs.append(max(np.abs(scalar.coeffs[group] - matrix.coeffs[group]).max()
+                             for group in scalar.coeffs))
+        print(f'month: {month}  scalar: {scalar_times[-1]:.3f}s  matrix: {matrix_times[-1]:.3f}s  '
+              f'max coefficient diff: {max_diffs[-1]:.2e}')
+
+    print(f'\nmean per month  scalar: {np.mean(scalar_times):.3f}s  matrix: {np.mean(matrix_times):.3f}s  '
+          f'(first matrix month includes compilation: {matrix_times[0]:.3f}s)')
+    print(f'speedup: {np.sum(scalar_times) / np.sum(matrix_times):.1f}x')
+    print(f'coefficients equal within {tolerance}: {max(max_diffs) <= tolerance}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--tolerance', type=float, default=1e-4)
+    args = parser.parse_args()
+
+    data = pd.read_csv(DATA_PATH).drop('Unnamed: 0', axis=1)
+    data.rename(columns={'RankID1': 'RankID'}, inplace=True)
+    run(data, args.months, args.tolerance)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Monthly ingest time against row count: ModelData.load_month (one columnar pass into the SampleStore)
+and, for reference, the object based M.update_items path of the Sample / Duration / M classes ModelData
+used before the SampleStore (reference.py). Rows are resampled from the golden distribution.
+Run from the repository root:
+
+    python -m benchmarks.bench_ingest --rows 1000 10000 100000 1000000
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from model_class import ModelData
+from reference import M
+
+DATA_PATH = 'data/preprocessed/data_for_convex.csv'
+OBJECT_PATH_MAX_ROWS = 100000
+MONTHS = 12
+
+
+def time_model_data(months_data):
+    model = ModelData()
+    start = time.perf_counter()
+    for month, data in months_data:
+        model.load_month(data=data, month=month)
+    return (time.perf_counter() - start) / len(months_data)
+
+
+def time_m_classes(months_data):
+    classes = {}
+    start = time.perf_counter()
+    for month, data in months_data:
+        for m in sorted(data['M'].dropna().unique()):
+            classes.setdefault(m, M(m)).update_items(data)
+    return (time.perf_counter() - start) / len(months_data)
+
+
+def run(data: pd.DataFrame, row_counts):
+    data = data.dropna(subset=['M'])
+    months = pd.period_range('2020-01', periods=MONTHS, freq='M').astype(str)
+    for rows in row_counts:
+        months_data = [(month, data.sample(rows, replace=True, random_state=i).assign(month=month))
+                       for i, month in enumerate(months)]
+        line = f'rows per month: {rows:>9,}  load_month: {time_model_data(months_data) * 1000:9.1f} ms/month'
+        if rows <= OBJECT_PATH_MAX_ROWS:
+            line += f'  M.update_items: {time_m_classes(months_data) * 1000:9.1f} ms/month'
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    data = pd.read_csv(DATA_PATH).drop('Unnamed: 0', axis=1)
+    data.rename(columns={'RankID1': 'RankID'}, inplace=True)
+    run(data, args.rows)
+
+
+if __name__ == '__main__':
+    main()
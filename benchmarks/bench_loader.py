@@ -0,0 +1,57 @@
+"""
+Timing of the Loader preprocessing stages on synthetic frames of growing size.
+Run from the repository root:
+
+    python -m benchmarks.bench_loader --rows 10000 100000 1000000
+"""
+import argparse
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+
+from data.data_loader import Loader
+from reference import calculate_rnpd_rowwise, get_ami_means_per_group, make_full_dataset, make_secs
+
+ROWWISE_MAX_ROWS = 100000
+
+
+def bench_calculate_rnpd(rows: int):
+    full_dataset = make_full_dataset(rows=rows, securities=max(rows // 50, 1))
+    loader = Loader()
+    loader.full_dataset = full_dataset.copy()
+    start = time.perf_counter()
+    loader.calculate_rnpd(show_plot=False)
+    line = f'calculate_rnpd  rows: {rows:>9,}  vectorized: {time.perf_counter() - start:8.3f}s'
+    if rows <= ROWWISE_MAX_ROWS:
+        start = time.perf_counter()
+        calculate_rnpd_rowwise(full_dataset)
+        line += f'  row-wise: {time.perf_counter() - start:8.3f}s'
+    print(line)
+
+
+def bench_liquidity_premium(rows: int):
+    secs = make_secs(rows=rows, securities=max(rows // 20, 1))
+    secs['RankGroup'] = Loader.get_rank_groups(secs)
+    secs['month'] = secs['ReportDate'].dt.to_period('M')
+    start = time.perf_counter()
+    Loader.get_ami_means(secs)
+    line = f'get_ami_means   rows: {rows:>9,}  vectorized: {time.perf_counter() - start:8.3f}s'
+    if rows <= ROWWISE_MAX_ROWS:
+        start = time.perf_counter()
+        get_ami_means_per_group(secs)
+        line += f'  per-group: {time.perf_counter() - start:8.3f}s'
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+    for rows in args.rows:
+        bench_liquidity_premium(rows)
+        bench_calculate_rnpd(rows)
+
+
+if __name__ == '__main__':
+    main()
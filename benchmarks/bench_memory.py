@@ -0,0 +1,124 @@
+"""
+Resident memory of the Loader frames and of ModelData's raw monthly frames, before (64 bit defaults,
+object strings, Period months, every raw frame kept) and after the compact schema (LOADER_COLUMNS_DTYPES,
+DATA_COLUMNS_DTYPES, ModelData(raw_data='drop')). Every variant runs in a fresh process and reports its
+peak resident set (ru_maxrss, from the process start), its resident set growth from before it reads or
+generates its input and the deep size of the frames it holds at the end.
+The Loader numbers are from synthetic workbooks of the real universe's size (synthetic_data.py) - the
+ranked workbooks are not in the tree. The ModelData numbers are from the preprocessed golden distribution.
+Run from the repository root:
+
+    python -m benchmarks.bench_memory --scale 1 10
+"""
+import argparse
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+from data_reader import read_months
+
+DATA_PATH = 'data/preprocessed/data_for_convex.csv'
+
+
+def get_rss() -> int:
+    # current resident set size in bytes (linux)
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def get_peak_rss() -> int:
+    # largest resident set size of this process since it started, in bytes (ru_maxrss is in KiB on linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def get_frame_bytes(frames) -> int:
+    return sum(int(frame.memory_usage(deep=True).sum()) for frame in frames if frame is not None)
+
+
+def run_loader(compact: bool, scale: float) -> dict:
+    from data.data_loader import Loader
+    from synthetic_data import MONTHS, SECURITIES, make_ranked_data
+
+    gc.collect()
+    start = get_rss()
+    secs, gov, prospectus = make_ranked_data(months=MONTHS, securities=round(SECURITIES * scale))
+    with tempfile.TemporaryDirectory() as path:
+        prospectus_path = os.path.join(path, 'prospectus.xlsx')
+        prospectus.to_excel(prospectus_path, sheet_name='prospectus', index=False)
+        loader = Loader(compact=compact)
+        loader.secs, loader.gov = Loader.filter_ranked_data(secs, gov, compact)
+        del secs, gov
+        loader.add_prospectus_data(prospectus_path, 'prospectus')
+        loader.add_liquidity_premium()
+        loader.build_full_dataset()
+        loader.calculate_rnpd(show_plot=False)
+        gc.collect()
+        return {'peak': get_peak_rss(), 'rss': get_rss() - start,
+                'frames': get_frame_bytes([loader.secs, loader.gov, loader.full_dataset]),
+                'rows': len(loader.full_dataset)}
+
+
+def run_model_data(compact: bool, scale: float) -> dict:
+    from model_class import ModelData
+
+    gc.collect()
+    start = get_rss()
+    if compact:
+        months = list(read_months(DATA_PATH))
+    else:
+        data = pd.read_csv(DATA_PATH).drop('Unnamed: 0', axis=1).rename(columns={'RankID1': 'RankID'})
+        data['month'] = data['month'].astype(str)
+        months = [(month, frame) for month, frame in data.groupby('month')]
+        del data
+    if scale != 1:
+        months = [(month, frame.sample(frac=scale, replace=True, random_state=0)) for month, frame in months]
+    model = ModelData(raw_data='drop' if compact else 'keep')
+    while months:
+        month, frame = months.pop(0)
+        model.load_month(data=frame, month=month)
+        del frame
+    gc.collect()
+    return {'peak': get_peak_rss(), 'rss': get_rss() - start, 'frames': get_frame_bytes(model.data.values()),
+            'rows': int(model.get_metrics()['rows'].sum())}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=float, nargs='+', default=[1, 10], help='rows per month, times the real universe')
+    parser.add_argument('--variant', nargs=3, help=argparse.SUPPRESS)  # target, compact, scale - the child process
+    args = parser.parse_args()
+
+    if args.variant:
+        target, compact, scale = args.variant
+        run = run_loader if target == 'loader' else run_model_data
+        print(json.dumps(run(compact == 'compact', float(scale))))
+        return
+
+    rows = []
+    for scale in args.scale:
+        for target in ['loader', 'model_data']:
+            result = {}
+            for compact in ['default', 'compact']:
+                output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_memory', '--variant', target, compact,
+                                         str(scale)], capture_output=True, text=True, check=True).stdout
+                result[compact] = json.loads(output.strip().splitlines()[-1])
+            rows.append({'target': target + (' (synthetic)' if target == 'loader' else ''),
+                         'scale': f'{scale:g}x', 'rows': result['compact']['rows'],
+                         'peak before (MiB)': result['default']['peak'] / 1024 ** 2,
+                         'peak after (MiB)': result['compact']['peak'] / 1024 ** 2,
+                         'rss before (MiB)': result['default']['rss'] / 1024 ** 2,
+                         'rss after (MiB)': result['compact']['rss'] / 1024 ** 2,
+                         'frames before (MiB)': result['default']['frames'] / 1024 ** 2,
+                         'frames after (MiB)': result['compact']['frames'] / 1024 ** 2})
+    pd.set_option('display.width', 200)
+    print(pd.DataFrame(rows).round(2).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
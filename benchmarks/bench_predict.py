@@ -0,0 +1,86 @@
+"""
+Prediction throughput (rows per second) of the former row-wise group matching against the batch
+RnpdEquation.get_matching_groups, the sorted-search BoundaryTable and the integer duration lookup tables
+(DurationTables, as ModelData.predict_class uses them), scoring the full data with a model fitted on the golden distribution.
+Run from the repository root:
+
+    python -m benchmarks.bench_predict --rows 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from model_class import ModelData
+
+DATA_PATH = 'data/preprocessed/data_for_convex.csv'
+FULL_DATA_PATH = 'data/preprocessed/full_data_for_convex.csv'
+ROWWISE_ROWS = 20000
+
+
+def rowwise_matching_group(equation, duration: float, rnpd: float) -> int:
+    # the per-row list comprehension that predict_class used to apply
+    groups = sorted(equation.coeffs.keys())
+    closest_group = [
+        abs(sum([equation.coeffs[group][i] * duration ** i for i in range(len(equation.coeffs[group]))]) - rnpd)
+        for group in groups
+    ]
+    return groups[np.argmin(closest_group)]
+
+
+def run(data: pd.DataFrame, full_data: pd.DataFrame, month: str, n_rows: int):
+    model = ModelData()
+    for loaded_month in sorted(m for m in data.month.astype(str).unique() if m <= month):
+        model.load_month(data=data[data.month == loaded_month], month=loaded_month)
+    model.add_monthly_model(month=month)
+    equation = model.models[month]
+
+    rows = full_data[['Duration', 'Rnpd']].dropna()
+    rows = rows.sample(n_rows, replace=True, random_state=0)
+    durations, rnpds = rows['Duration'].values, rows['Rnpd'].values
+
+    n_rowwise = min(n_rows, ROWWISE_ROWS)
+    start = time.perf_counter()
+    rowwise = rows.head(n_rowwise).apply(lambda x: rowwise_matching_group(equation, x['Duration'], x['Rnpd']),
+                                           axis=1)
+    rowwise_rate = n_rowwise / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    batch = equation.get_matching_groups(durations, rnpds)
+    batch_rate = n_rows / (time.perf_counter() - start)
+
+    table = equation.get_boundary_table()
+    start = time.perf_counter()
+    searched = table.classify(durations, rnpds)
+    table_rate = n_rows / (time.perf_counter() - start)
+
+    tables = model.get_month_tables(month)
+    start = time.perf_counter()
+    looked_up = tables.classify(np.zeros(n_rows, dtype=int), durations, rnpds)
+    lookup_rate = n_rows / (time.perf_counter() - start)
+
+    print(f'row-wise:       {rowwise_rate:,.0f} rows/s (on {n_rowwise:,} rows)')
+    print(f'batch:          {batch_rate:,.0f} rows/s (on {n_rows:,} rows)')
+    print(f'boundary table: {table_rate:,.0f} rows/s (on {n_rows:,} rows)')
+    print(f'lookup tables:  {lookup_rate:,.0f} rows/s (on {n_rows:,} rows)')
+    same = np.array_equal(rowwise.values, batch[:n_rowwise]) and np.array_equal(batch, searched) and \
+        np.array_equal(batch, looked_up)
+    print(f'speedup: {batch_rate / rowwise_rate:.0f}x batch, {table_rate / rowwise_rate:.0f}x boundary table, '
+          f'{lookup_rate / rowwise_rate:.0f}x lookup tables, same labels: {same}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--month', default='2016-12')
+    args = parser.parse_args()
+
+    data = pd.read_csv(DATA_PATH).drop('Unnamed: 0', axis=1)
+    data.rename(columns={'RankID1': 'RankID'}, inplace=True)
+    full_data = pd.read_csv(FULL_DATA_PATH).drop('Unnamed: 0', axis=1)
+    run(data, full_data, args.month, args.rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Scaling curves of the fit/predict pipeline and the Loader stages on synthetic data (synthetic_data.py),
+from the current universe (about 400 securities a month) up to 10x the securities. For every stage the
+time at each scale and its ratio to linear growth from 1x (1.00 = linear, below 1 = better) are printed.
+Run from the repository root:
+
+    python -m benchmarks.bench_scaling --scales 1 2 5 10
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable, Dict
+
+import pandas as pd
+
+from convex_class import RnpdEquation
+from data.data_loader import Loader
+from model_class import ModelData
+from synthetic_data import MONTHS, SECURITIES, make_convex_data, make_ranked_data
+
+
+def best_time(run: Callable, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def time_convex(months: int, securities: int, repeat: int) -> Dict[str, float]:
+    data = make_convex_data(months=months, securities=securities)
+    months_data = [(month, frame) for month, frame in data.groupby('month')]
+    fit_month, predict_month = months_data[-2][0], months_data[-1][1]
+
+    def load_months():
+        model = ModelData()
+        for month, frame in months_data:
+            model.load_month(data=frame, month=month)
+        return model
+
+    model = load_months()
+    equation = RnpdEquation(data=model.models_data[fit_month], month=fit_month)
+    model.models[fit_month] = equation
+    equation.fit_polynomial_regression()
+    return {
+        'ModelData.load_month (per month)': best_time(load_months, repeat) / len(months_data),
+        'ModelData.fit_current_data_to_df': best_time(model.fit_current_data_to_df, repeat),
+        'RnpdEquation.fit_polynomial_regression': best_time(equation.fit_polynomial_regression, repeat),
+        'ModelData.predict_class (one month)': best_time(lambda: model.predict_class(month=fit_month,
+                                                                                     data=predict_month), repeat),
+    }
+
+
+def time_loader(months: int, securities: int, repeat: int) -> Dict[str, float]:
+    # the Loader stages from the raw frames on - the workbooks' parse is cached (data/excel_cache.py)
+    secs, gov, prospectus = make_ranked_data(months=months, securities=securities)
+    times = {}
+    with tempfile.TemporaryDirectory() as path:
+        prospectus_path = os.path.join(path, 'prospectus.xlsx')
+        prospectus.to_excel(prospectus_path, sheet_name='prospectus', index=False)
+
+        def run(stage: str, step: Callable[[Loader], None], loader: Callable[[], Loader]):
+            loaders = [loader() for _ in range(repeat)]
+            times[f'Loader.{stage}'] = best_time(lambda: step(loaders.pop()), repeat)
+            return loader()
+
+        def filtered() -> Loader:
+            loader = Loader()
+            loader.secs, loader.gov = Loader.filter_ranked_data(secs.copy(), gov.copy())
+            return loader
+
+        def with_prospectus() -> Loader:
+            loader = filtered()
+            loader.add_prospectus_data(prospectus_path, 'prospectus')
+            return loader
+
+        def with_liquidity() -> Loader:
+            loader = with_prospectus()
+            loader.add_liquidity_premium()
+            return loader
+
+        def with_full_dataset() -> Loader:
+            loader = with_liquidity()
+            loader.build_full_dataset()
+            return loader
+
+        with_prospectus()  # parses the prospectus workbook once, later reads hit the cache
+        times['Loader.filter_ranked_data'] = best_time(lambda: Loader.filter_ranked_data(secs.copy(), gov.copy()),
+                                                       repeat)
+        run('add_prospectus_data', lambda l: l.add_prospectus_data(prospectus_path, 'prospectus'), filtered)
+        run('add_liquidity_premium', lambda l: l.add_liquidity_premium(), with_prospectus)
+        run('build_full_dataset', lambda l: l.build_full_dataset(), with_liquidity)
+        run('calculate_rnpd', lambda l: l.calculate_rnpd(show_plot=False), with_full_dataset)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 2, 5, 10])
+    parser.add_argument('--months', type=int, default=MONTHS)
+    parser.add_argument('--securities', type=int, default=SECURITIES, help='securities at scale 1')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    results = {}
+    for scale in args.scales:
+        securities = round(args.securities * scale)
+        results[scale] = {**time_convex(args.months, securities, args.repeat),
+                          **time_loader(args.months, securities, args.repeat)}
+        print(f'scale {scale:g}x ({securities:,} securities, {securities * args.months:,} rows) done', flush=True)
+
+    times = pd.DataFrame(results) * 1000
+    base = args.scales[0]
+    linearity = times.div(times[base], axis=0).div([scale / base for scale in args.scales], axis=1)
+    pd.set_option('display.width', 200)
+    print('\ntime (ms)')
+    print(times.rename(columns=lambda scale: f'{scale:g}x').round(2).to_string())
+    print(f'\ntime / linear growth from {base:g}x')
+    print(linearity.rename(columns=lambda scale: f'{scale:g}x').round(2).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Load test of the online scoring service: latency percentiles and requests per second of micro-batch
+/predict calls over keep-alive connections, with a hot reload to the next month half way through.
+The service runs as its own process on a temporary model store. Run from the repository root:
+
+    python -m benchmarks.bench_scoring_service --seconds 10 --connections 8 --batch 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from model_class import ModelData
+from model_store import ModelStore, get_fit_settings
+from scoring_service import ScoringModel
+
+DATA_PATH = 'data/preprocessed/data_for_convex.csv'
+FULL_DATA_PATH = 'data/preprocessed/full_data_for_convex.csv'
+
+
+def fit_months(data: pd.DataFrame, months) -> ModelData:
+    model = ModelData()
+    for month in sorted(m for m in data.month.astype(str).unique() if m <= max(months)):
+        model.load_month(data=data[data.month == month], month=month)
+    model.add_monthly_models(months)
+    return model
+
+
+async def send(reader, writer, method: str, path: str, payload: bytes = b''):
+    writer.write(f'{method} {path} HTTP/1.1\r\nContent-Length: {len(payload)}\r\n\r\n'.encode() + payload)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (line := await reader.readline()) != b'\r\n':
+        if line.lower().startswith(b'content-length'):
+            length = int(line.split(b':')[1])
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def wait_for_service(port: int, timeout: float = 30):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            status, _ = await send(reader, writer, 'GET', '/health')
+            writer.close()
+            return status
+        except ConnectionError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def client(port: int, payloads, deadline: float, latencies: list, months: dict, errors: list):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        status, response = await send(reader, writer, 'POST', '/predict', payloads[i % len(payloads)])
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            errors.append(response)
+        else:
+            months[response['month']] = months.get(response['month'], 0) + 1
+        i += 1
+    writer.close()
+
+
+async def reload_later(port: int, delay: float, store: ModelStore, model: ModelData, month: str) -> float:
+    # a newly fitted month lands in the store, then the service is told to reload
+    await asyncio.sleep(delay)
+    store.save(store.get_key(model.models_data[month], get_fit_settings()), model.models[month], get_fit_settings())
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    start = time.perf_counter()
+    status, response = await send(reader, writer, 'POST', '/reload')
+    writer.close()
+    assert status == 200 and response['month'] == month, response
+    return time.perf_counter() - start
+
+
+async def load_test(port: int, payloads, args, store: ModelStore, model: ModelData, next_month: str):
+    latencies, months, errors = [], {}, []
+    deadline = time.perf_counter() + args.seconds
+    start = time.perf_counter()
+    results = await asyncio.gather(reload_later(port, args.seconds / 2, store, model, next_month),
+                                   *[client(port, payloads, deadline, latencies, months, errors)
+                                     for _ in range(args.connections)])
+    return latencies, months, errors, time.perf_counter() - start, results[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--connections', type=int, default=8)
+    parser.add_argument('--batch', type=int, default=64)
+    parser.add_argument('--month', default='2016-12', help='served first, the next month is hot-reloaded')
+    parser.add_argument('--port', type=int, default=8799)
+    args = parser.parse_args()
+
+    data = pd.read_csv(DATA_PATH).drop('Unnamed: 0', axis=1).rename(columns={'RankID1': 'RankID'})
+    full_data = pd.read_csv(FULL_DATA_PATH)[['SecurityID', 'Duration', 'Rnpd']].dropna()
+    next_month = str(pd.Period(args.month, 'M') + 1)
+    model = fit_months(data, [args.month, next_month])
+
+    rows = full_data.sample(args.batch * 1000, replace=True, random_state=0)
+    batches = [rows.iloc[i:i + args.batch] for i in range(0, len(rows), args.batch)]
+    payloads = [json.dumps({column: batch[column].tolist() for column in ['SecurityID', 'Duration', 'Rnpd']}).encode()
+                for batch in batches]
+
+    # in-process scoring time per batch, without the transport
+    scoring = ScoringModel(model.models[args.month])
+    scoring_times = []
+    for batch in batches:
+        start = time.perf_counter()
+        scoring.score(batch['Duration'].values, batch['Rnpd'].values)
+        scoring_times.append(time.perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as store_path:
+        store = ModelStore(store_path)
+        store.save(store.get_key(model.models_data[args.month], get_fit_settings()), model.models[args.month],
+                   get_fit_settings())
+        server = subprocess.Popen([sys.executable, '-m', 'scoring_service', '--store', store_path,
+                                   '--port', str(args.port)], cwd=os.getcwd())
+        try:
+            asyncio.run(wait_for_service(args.port))
+            latencies, months, errors, elapsed, reload_time = asyncio.run(
+                load_test(args.port, payloads, args, store, model, next_month))
+        finally:
+            server.terminate()
+            server.wait()
+
+    latencies, scoring_times = np.array(latencies) * 1000, np.array(scoring_times) * 1000
+    print(f'{len(latencies):,} requests of {args.batch} rows on {args.connections} connections in {elapsed:.1f}s')
+    print(f'throughput: {len(latencies) / elapsed:,.0f} requests/s, {len(latencies) * args.batch / elapsed:,.0f} rows/s')
+    print(f'latency:    p50 {np.percentile(latencies, 50):.3f} ms, p99 {np.percentile(latencies, 99):.3f} ms')
+    print(f'scoring:    p50 {np.percentile(scoring_times, 50):.3f} ms, p99 {np.percentile(scoring_times, 99):.3f} ms '
+          f'per batch in process')
+    print(f'hot reload: {reload_time * 1000:.1f} ms, requests per month {months}, errors {len(errors)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,5 @@
+import os
+
 REQUIRED_SAMPLES = {1: 20,
                     2: 20,
                     3: 20,
@@ -16,8 +18,72 @@ EXPECTED_DATA_COLUMNS = ['month', 'M',
                          'YieldBruto', 'Net Hazard Rate AMI',
                          'ZSpread', 'SecurityID', 'Duration', 'RankID', 'Rnpd']
 
+# preprocessed csv column names that differ from EXPECTED_DATA_COLUMNS
+DATA_COLUMNS_RENAME = {'RankID1': 'RankID'}
+
+# compact dtypes of the preprocessed csv columns the model reads, keyed on the csv's own column names - Rnpd
+# stays 64 bit, the medians and fits depend on it. M is missing for part of the golden distribution rows and
+# Duration may be, so both are the nullable Int16. Every other column is read at full precision
+DATA_COLUMNS_DTYPES = {'month': 'category',
+                       'M': 'Int16',
+                       'Duration': 'Int16',
+                       'Rnpd': 'float64'}
+
+# column of the month partitions holding each row's position in the source csv, read back as the index
+PARTITION_ROW_COLUMN = 'source_row'
+
+# rows per chunk when streaming the preprocessed csv
+READ_CHUNK_ROWS = 100000
+
+# what ModelData does with a month's raw frame once it is in the sample windows - 'keep' it in ModelData.data,
+# 'drop' it, or 'spill' it to a parquet file in SPILL_DIR
+RAW_DATA_MODE = 'keep'
+
+SPILL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'spill')
+
 RNPD_EQUATION_POLY_DEGREE = 2
 
 CONVEX_EPSILON_BETWEEN_GROUPS = 0.02
 
 LAMBDA_REG = 1.5
+
+
+# duration range and number of grid points on which the fit constraints are enforced
+CONVEX_DURATION_RANGE = (0, 10)
+
+CONVEX_GRID_POINTS = 100
+
+# where the fit constraints hold - 'grid': on the CONVEX_GRID_POINTS grid, 'adaptive': on the whole range
+# (exact conditions up to degree 2, cutting planes on a fine grid above, see RnpdEquation)
+CONSTRAINT_MODE = 'grid'
+
+CUTTING_PLANE_COARSE_POINTS = 11
+
+CUTTING_PLANE_FINE_POINTS = 1001
+
+CUTTING_PLANE_TOLERANCE = 1e-7
+
+CUTTING_PLANE_MAX_ROUNDS = 30
+
+# compiled fit problems kept per process, least recently used first out - a layout (groups, durations,
+# degree, constraints) is reused across the months that share it
+PROBLEM_CACHE_SIZE = 16
+
+# solver used by ModelData(warm_start=True) - it has to honor cvxpy warm starts
+WARM_START_SOLVER = 'SCS'
+
+# points per duration unit of the precomputed boundary table used for prediction
+BOUNDARY_GRID_RESOLUTION = 100
+
+# on-disk cache of monthly fits (see model_store.ModelStore)
+MODEL_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'model_store')
+
+MODEL_STORE_MAX_BYTES = 512 * 1024 ** 2
+
+# localhost address of the online scoring service (see scoring_service.py)
+SCORING_HOST = '127.0.0.1'
+
+SCORING_PORT = 8765
+
+# seconds between the scoring service's checks of the model store index for a newly fitted month
+SCORING_RELOAD_INTERVAL = 5.0
@@ -1,4 +1,5 @@
-from abc import abstractmethod
+import time
+from collections import OrderedDict
 
 import pandas as pd
 import numpy as np
@@ -6,8 +7,450 @@ import cvxpy as cvx
 import matplotlib.pyplot as plt
 from cvxpy import Expression
 
-from const import RNPD_EQUATION_POLY_DEGREE, CONVEX_EPSILON_BETWEEN_GROUPS, LAMBDA_REG
-from typing import List, Optional, Dict
+from const import (RNPD_EQUATION_POLY_DEGREE, CONVEX_EPSILON_BETWEEN_GROUPS, LAMBDA_REG,
+                   CONVEX_DURATION_RANGE, CONVEX_GRID_POINTS, BOUNDARY_GRID_RESOLUTION, CONSTRAINT_MODE,
+                   CUTTING_PLANE_COARSE_POINTS, CUTTING_PLANE_FINE_POINTS, CUTTING_PLANE_TOLERANCE,
+                   CUTTING_PLANE_MAX_ROUNDS, PROBLEM_CACHE_SIZE)
+from typing import List, Optional, Dict, Tuple
+
+
+def constraint_grid() -> np.ndarray:
+    return np.linspace(*CONVEX_DURATION_RANGE, CONVEX_GRID_POINTS)
+
+
+def vandermonde(x: np.ndarray, degree: int) -> np.ndarray:
+    # rows are [1, x, x^2, ..., x^degree], matching coefficient order coef[i] * x ** i
+    return np.vander(np.asarray(x, dtype=float), degree + 1, increasing=True)
+
+
+def second_derivative_matrix(x: np.ndarray, degree: int) -> np.ndarray:
+    # rows are d2/dx2 of [1, x, ..., x^degree] evaluated at each x
+    x = np.asarray(x, dtype=float)
+    matrix = np.zeros((len(x), degree + 1))
+    for i in range(2, degree + 1):
+        matrix[:, i] = i * (i - 1) * x ** (i - 2)
+    return matrix
+
+
+def evaluate_polynomials(x: np.ndarray, coefficients: np.ndarray) -> np.ndarray:
+    # Horner evaluation of every polynomial (rows of coefficients) at every x -> (len(x) x polynomials).
+    # elementwise only, so a value does not depend on the batch it was computed in
+    x = np.asarray(x, dtype=float)[:, None]
+    values = np.zeros((len(x), len(coefficients))) + coefficients[:, -1]
+    for i in range(coefficients.shape[1] - 2, -1, -1):
+        values = values * x + coefficients[:, i]
+    return values
+
+
+def evaluate_rows(x: np.ndarray, coefficients: np.ndarray) -> np.ndarray:
+    # Horner evaluation of polynomial coefficients[i] at x[i], same arithmetic as evaluate_polynomials
+    values = np.zeros(len(x)) + coefficients[:, -1]
+    for i in range(coefficients.shape[1] - 2, -1, -1):
+        values = values * x + coefficients[:, i]
+    return values
+
+
+def get_initial_coefficients(coeffs: Dict[int, np.ndarray], groups: Tuple[int, ...], poly_degree: int) -> np.ndarray:
+    # another fit's curves as a (groups x degree+1) starting point - a group it has no curve for takes the
+    # curve of its nearest group, extra degrees are zero
+    labels = np.array(sorted(coeffs))
+    initial = np.zeros((len(groups), poly_degree + 1))
+    for i, group in enumerate(groups):
+        curve = coeffs[labels[np.argmin(np.abs(labels - group))]][:poly_degree + 1]
+        initial[i, :len(curve)] = curve
+    return initial
+
+
+def closest_curves(durations: np.ndarray, rnpds: np.ndarray, coefficients: np.ndarray) -> np.ndarray:
+    # index of the curve closest to each (duration, rnpd), evaluating every curve for every row
+    curves = evaluate_polynomials(durations, coefficients)  # (rows x groups)
+    return np.argmin(np.abs(curves - np.asarray(rnpds, dtype=float)[:, None]), axis=1)
+
+
+class RnpdProblem:
+    """
+    Matrix form of the RNPD fit: one (groups x degree+1) coefficient variable and a handful of
+    vector constraints evaluated on the constraint grid - or, with x_vals=None and degree <= 2, the exact
+    conditions over the whole duration range (see exact_constraints).
+    The problem is built once per layout (groups, durations, degree, grid) and reused across months -
+    monthly medians, the duration mask, epsilon and lambda are cvx.Parameters, so cvxpy only
+    canonicalizes the problem on its first solve. The last PROBLEM_CACHE_SIZE layouts are kept.
+    """
+
+    _cache: 'OrderedDict[tuple, RnpdProblem]' = OrderedDict()
+
+    def __init__(self,
+                 groups: Tuple[int, ...],
+                 durations: Tuple[float, ...],
+                 poly_degree: int,
+                 x_vals: Optional[np.ndarray]):
+        self.groups = groups
+        self.durations = durations
+        self.poly_degree = poly_degree
+        # key of the problem in the cache, and whether the last get() found it there
+        self.key: Optional[tuple] = None
+        self.reused = False
+        n_groups, n_durations = len(groups), len(durations)
+
+        self.coefficients = cvx.Variable((n_groups, poly_degree + 1))
+        # medians are passed pre-masked (0 where the group has no sample for that duration)
+        self.medians = cvx.Parameter((n_groups, n_durations))
+        self.mask = cvx.Parameter((n_groups, n_durations), nonneg=True)
+        self.epsilon = cvx.Parameter(nonneg=True)
+        self.lambda_reg = cvx.Parameter(nonneg=True)
+
+        fitted = self.coefficients @ vandermonde(np.array(durations), poly_degree).T  # (groups x durations)
+
+        total_data_error = cvx.sum(cvx.abs(self.medians - cvx.multiply(self.mask, fitted)))
+        regularization = self.lambda_reg * cvx.sum(cvx.abs(self.coefficients))
+
+        constraints = self.grid_constraints(x_vals) if x_vals is not None else self.exact_constraints()
+        self.problem = cvx.Problem(cvx.Minimize(total_data_error + regularization), constraints)
+
+    def grid_constraints(self, x_vals: np.ndarray) -> List:
+        curves = vandermonde(x_vals, self.poly_degree) @ self.coefficients.T  # (grid x groups)
+        # RNPD between 0 and 1 on the grid
+        constraints = [curves >= 0, curves <= 1]
+        # non-intersecting lines - each group above the previous one by epsilon
+        if len(self.groups) > 1:
+            constraints.append(curves[:, 1:] - curves[:, :-1] >= self.epsilon)
+        # second derivative >= 0
+        if self.poly_degree >= 2:
+            constraints.append(second_derivative_matrix(x_vals, self.poly_degree) @ self.coefficients.T >= 0)
+        return constraints
+
+    def exact_constraints(self) -> List:
+        """
+        The grid constraints for every duration of the range, for degree <= 2:
+        the second derivative is the constant 2 * c2, and a convex curve is at most 1 on the range when it
+        is at its endpoints. The lowest curve above 0 and the gaps between curves above epsilon need a
+        quadratic to be nonnegative on the range - at the endpoints and, when it lies inside, at the vertex.
+        """
+        if self.poly_degree > 2:
+            raise ValueError('Exact constraints are available up to degree 2, use the cutting plane fit')
+        low, high = CONVEX_DURATION_RANGE
+        constraints = [vandermonde(np.array([low, high]), self.poly_degree) @ self.coefficients.T <= 1]
+        if self.poly_degree == 2:
+            constraints.append(self.coefficients[:, 2] >= 0)
+        lowest = self.coefficients[:1]
+        gaps = self.coefficients[1:] - self.coefficients[:-1] - np.eye(1, self.poly_degree + 1) * self.epsilon
+        for polynomials in [lowest] + ([gaps] if len(self.groups) > 1 else []):
+            constraints += self.nonnegative_on_range(polynomials, low, high)
+        return constraints
+
+    def nonnegative_on_range(self, polynomials, low: float, high: float) -> List:
+        # rows p of polynomials (degree <= 2) nonnegative on [low, high]
+        if self.poly_degree < 2:
+            return [vandermonde(np.array([low, high]), self.poly_degree) @ polynomials.T >= 0]
+        # p = s + mu * (x - low) * (high - x) with s a sum of squares [1, x] Q [1, x]^T and mu >= 0, Q PSD
+        # (Lukacs) - the convex form of the vertex check. The 2x2 Q is PSD when its entries lie in a cone.
+        mu = cvx.Variable(polynomials.shape[0], nonneg=True)
+        q00 = polynomials[:, 0] + mu * low * high
+        q01 = (polynomials[:, 1] - mu * (low + high)) / 2
+        q11 = polynomials[:, 2] + mu
+        return [cvx.SOC(q00 + q11, cvx.vstack([2 * q01, q00 - q11]), axis=0)]
+
+    @classmethod
+    def get(cls,
+            groups: Tuple[int, ...],
+            durations: Tuple[float, ...],
+            poly_degree: int,
+            x_vals: Optional[np.ndarray]) -> 'RnpdProblem':
+        key = (groups, durations, poly_degree, None if x_vals is None else x_vals.tobytes())
+        return cls.get_cached(key, lambda: cls(groups, durations, poly_degree, x_vals))
+
+    @staticmethod
+    def get_cached(key: tuple, build) -> 'RnpdProblem':
+        # least recently used cache shared by RnpdProblem and CuttingPlaneProblem
+        cache = RnpdProblem._cache
+        if key in cache:
+            cache.move_to_end(key)
+            problem = cache[key]
+            problem.reused = True
+        else:
+            problem = cache[key] = build()
+            problem.key = key
+            if len(cache) > PROBLEM_CACHE_SIZE:
+                cache.popitem(last=False)
+        return problem
+
+    def solve(self,
+              medians: np.ndarray,
+              epsilon: float = CONVEX_EPSILON_BETWEEN_GROUPS,
+              lambda_reg: float = LAMBDA_REG,
+              initial: Optional[np.ndarray] = None,
+              initial_state: Optional[Dict] = None,
+              **solve_kwargs) -> np.ndarray:
+        # medians - (groups x durations) matrix, nan where a group has no data for a duration.
+        # with warm_start=True the solve starts from the `initial` (groups x degree+1) coefficients and the
+        # solver state of another solve (see set_initial and get_solver_state)
+        mask = ~np.isnan(medians)
+        self.mask.value = mask.astype(float)
+        self.medians.value = np.where(mask, medians, 0.0)
+        self.epsilon.value = epsilon
+        self.lambda_reg.value = lambda_reg
+        if initial is not None and solve_kwargs.get('warm_start'):
+            self.set_initial(initial, initial_state, solve_kwargs.get('solver'))
+        self.problem.solve(**solve_kwargs)
+
+        if self.problem.status in ["optimal", "optimal_inaccurate"]:
+            return self.coefficients.value
+        else:
+            raise Exception("Optimization failed")
+
+    def set_initial(self, initial: np.ndarray, state: Optional[Dict], solver: Optional[str]):
+        """
+        Sets the coefficients to `initial` before a warm started solve. cvxpy starts SCS from the last
+        solution of the problem (x, y, s) rather than the variables' values, so for SCS that solution is
+        replaced: by `state` when it is a solution of this layout, else by the last solution of this problem
+        (zero when it was not solved yet), with the coefficients' entries of x set to `initial`.
+        """
+        self.coefficients.value = initial
+        if solver != cvx.SCS:
+            return
+        # compiles the problem on its first use, which clears its solver cache - so before it is set
+        data, _, inverse_data = self.problem.get_problem_data(cvx.SCS)
+        n_constraints, n_variables = data['A'].shape
+        offsets = [inverse.var_offsets[self.coefficients.id] for inverse in inverse_data
+                   if getattr(inverse, 'x_length', None) == n_variables and
+                   self.coefficients.id in inverse.var_offsets]
+        if state is None or state['key'] != self.key:
+            state = self.problem._solver_cache.get(cvx.SCS)
+        if state is None or len(state['x']) != n_variables or len(state['y']) != n_constraints:
+            state = {'x': np.zeros(n_variables), 'y': np.zeros(n_constraints), 's': np.zeros(n_constraints)}
+        x = state['x'].copy()
+        if offsets:
+            # cvxpy stacks a matrix variable column-major
+            x[offsets[0]:offsets[0] + initial.size] = initial.flatten(order='F')
+        self.problem._solver_cache[cvx.SCS] = {'x': x, 'y': state['y'], 's': state['s']}
+
+    def get_solver_state(self) -> Optional[Dict]:
+        # the last SCS solution of this problem, which another problem of the layout can start from
+        solution = self.problem._solver_cache.get(cvx.SCS)
+        if solution is None:
+            return None
+        return {'key': self.key, 'x': solution['x'].copy(), 'y': solution['y'].copy(), 's': solution['s'].copy()}
+
+    def get_solver_stats(self) -> Dict:
+        return get_solver_stats(self.problem)
+
+
+class CuttingPlaneProblem(RnpdProblem):
+    """
+    RnpdProblem with the grid constraints on `capacity` points that are set per solve - the point
+    matrices are cvx.Parameters, so the cutting plane rounds and the months of a layout share one
+    canonicalization. Rows beyond the cut points take spare points spread over the fine grid (repeating a
+    point would make the solve degenerate).
+    """
+
+    def __init__(self,
+                 groups: Tuple[int, ...],
+                 durations: Tuple[float, ...],
+                 poly_degree: int,
+                 capacity: int):
+        self.capacity = capacity
+        self.points = cvx.Parameter((capacity, poly_degree + 1))
+        self.second_derivatives = cvx.Parameter((capacity, poly_degree + 1))
+        super().__init__(groups, durations, poly_degree, np.empty(0))
+
+    def grid_constraints(self, x_vals: np.ndarray) -> List:
+        curves = self.points @ self.coefficients.T  # (capacity x groups)
+        constraints = [curves >= 0, curves <= 1, self.second_derivatives @ self.coefficients.T >= 0]
+        if len(self.groups) > 1:
+            constraints.append(curves[:, 1:] - curves[:, :-1] >= self.epsilon)
+        return constraints
+
+    @classmethod
+    def get_for_points(cls,
+                       groups: Tuple[int, ...],
+                       durations: Tuple[float, ...],
+                       poly_degree: int,
+                       points: np.ndarray,
+                       spare: np.ndarray) -> 'CuttingPlaneProblem':
+        # capacity grows in powers of two, so a layout is compiled a few times at most
+        capacity = int(2 ** np.ceil(np.log2(max(len(points), 16))))
+        key = (groups, durations, poly_degree, 'cutting planes', capacity)
+        problem = cls.get_cached(key, lambda: cls(groups, durations, poly_degree, capacity))
+        spare = np.setdiff1d(spare, points)
+        padded = np.concatenate([points, spare[np.linspace(0, len(spare) - 1, capacity - len(points)).astype(int)]])
+        problem.points.value = vandermonde(padded, poly_degree)
+        problem.second_derivatives.value = second_derivative_matrix(padded, poly_degree)
+        return problem
+
+
+def get_solver_stats(problem: cvx.Problem) -> Dict:
+    # status is 'optimal' or 'optimal_inaccurate' for an accepted fit
+    stats = problem.solver_stats
+    return {'status': problem.status,
+            'solver': stats.solver_name,
+            'iterations': stats.num_iters,
+            'solve_time': stats.solve_time,
+            'setup_time': stats.setup_time,
+            'compilation_time': problem.compilation_time,
+            'constraints': len(problem.constraints),
+            'constraint_rows': sum(constraint.size for constraint in problem.constraints),
+            'variables': sum(variable.size for variable in problem.variables())}
+
+
+def get_violated_points(coefficients: np.ndarray, x: np.ndarray, epsilon: float, tolerance: float) -> np.ndarray:
+    # the x of the worst violation of every violated grid constraint row - a group's bounds and convexity,
+    # a pair's gap
+    curves = evaluate_polynomials(x, coefficients)  # (x x groups)
+    violations = [-curves, curves - 1, -(second_derivative_matrix(x, coefficients.shape[1] - 1) @ coefficients.T)]
+    if coefficients.shape[0] > 1:
+        violations.append(epsilon - np.diff(curves, axis=1))
+    points = [x[violation.argmax(axis=0)[violation.max(axis=0) > tolerance]] for violation in violations]
+    return np.unique(np.concatenate(points))
+
+
+class BoundaryTable:
+    """
+    Sorted-search group matching for one monthly model.
+    Inside the constrained duration range the fit keeps the group curves ordered, so the closest curve
+    to an rnpd is one of the two around its sorted position (the boundary between them is their midpoint).
+    Durations on the fine grid use the precomputed curve values, other in-range durations evaluate only
+    the log(groups) curves visited by the search, and everything else falls back to full evaluation.
+    Results are identical to RnpdEquation.get_matching_groups, including argmin's lowest-group tie rule.
+    """
+
+    # minimal gap between adjacent curves for a grid point / the polynomials to count as ordered
+    ORDER_TOLERANCE = 1e-9
+
+    def __init__(self,
+                 labels: np.ndarray,
+                 coefficients: np.ndarray,
+                 duration_range: Tuple[float, float] = CONVEX_DURATION_RANGE,
+                 resolution: int = BOUNDARY_GRID_RESOLUTION):
+        self.labels = labels
+        self.coefficients = coefficients
+        self.low, self.high = duration_range
+        self.resolution = resolution
+        # grid points are integers / resolution, so integer durations fall exactly on the grid
+        self.grid = np.arange(round(self.low * resolution), round(self.high * resolution) + 1) / resolution
+        self.curves = evaluate_polynomials(self.grid, coefficients)  # (grid x groups)
+        self.ordered_grid = np.all(np.diff(self.curves, axis=1) > self.ORDER_TOLERANCE, axis=1)
+        self.ordered_polynomials = self.check_polynomials_order()
+        # lookup tables of the integer durations (Duration is rounded to months): the curve values sorted per
+        # duration, their labels in that order and the midpoints between neighbouring values
+        self.durations = np.arange(np.ceil(self.low), np.floor(self.high) + 1)
+        curves = evaluate_polynomials(self.durations, coefficients)
+        order = np.argsort(curves, axis=1, kind='stable')
+        self.sorted_curves = np.take_along_axis(curves, order, axis=1)
+        self.sorted_labels = labels[order]
+        self.thresholds = (self.sorted_curves[:, 1:] + self.sorted_curves[:, :-1]) / 2
+
+    def check_polynomials_order(self) -> bool:
+        # minimum of every adjacent curve difference over the range - at the endpoints or a critical point
+        for lower, upper in zip(self.coefficients[:-1], self.coefficients[1:]):
+            difference = np.polynomial.Polynomial(upper - lower)
+            critical = difference.deriv().roots() if len(upper) > 2 else np.array([])
+            critical = critical[np.isreal(critical)].real
+            points = np.concatenate([[self.low, self.high], critical[(critical > self.low) & (critical < self.high)]])
+            if difference(points).min() <= self.ORDER_TOLERANCE:
+                return False
+        return True
+
+    def search(self, rnpds: np.ndarray, curve_values) -> np.ndarray:
+        # curve_values(groups) -> value of curve groups[i] at row i's duration, curves ascending per row
+        n_groups = len(self.labels)
+        low, high = np.zeros(len(rnpds), dtype=int), np.full(len(rnpds), n_groups)
+        for _ in range(int(np.ceil(np.log2(n_groups + 1)))):
+            active = low < high
+            middle = (low + high) // 2
+            go_up = curve_values(np.minimum(middle, n_groups - 1)) < rnpds
+            low = np.where(active & go_up, middle + 1, low)
+            high = np.where(active & ~go_up, middle, high)
+        # low is the number of curves below the rnpd - the closest one is just below or just above it
+        below, above = np.clip(low - 1, 0, n_groups - 1), np.clip(low, 0, n_groups - 1)
+        pick_below = np.abs(curve_values(below) - rnpds) <= np.abs(curve_values(above) - rnpds)
+        return np.where(pick_below, below, above)
+
+    def classify(self, durations: np.ndarray, rnpds: np.ndarray) -> np.ndarray:
+        durations, rnpds = np.asarray(durations, dtype=float), np.asarray(rnpds, dtype=float)
+        in_range = (durations >= self.low) & (durations <= self.high)
+        index = np.rint((np.where(in_range, durations, self.low) - self.low) * self.resolution).astype(int)
+        on_grid = in_range & (self.grid[index] == durations) & self.ordered_grid[index]
+        by_polynomials = in_range & ~on_grid & self.ordered_polynomials
+        fallback = ~(on_grid | by_polynomials)
+
+        positions = np.empty(len(durations), dtype=int)
+        if on_grid.any():
+            rows = index[on_grid]
+            positions[on_grid] = self.search(rnpds[on_grid], lambda groups: self.curves[rows, groups])
+        if by_polynomials.any():
+            rows = durations[by_polynomials]
+            positions[by_polynomials] = self.search(rnpds[by_polynomials],
+                                                    lambda groups: evaluate_rows(rows, self.coefficients[groups]))
+        if fallback.any():
+            positions[fallback] = closest_curves(durations[fallback], rnpds[fallback], self.coefficients)
+        return self.labels[positions]
+
+
+class DurationTables:
+    """
+    The integer duration lookup tables of many monthly BoundaryTables, stacked in contiguous
+    (months x durations x groups) arrays - months with fewer groups are padded with inf curves and
+    thresholds. A batch of rows of mixed months is classified with one gather of its rows' tables and a
+    searchsorted of the rnpd in the midpoints (a count of the thresholds below it); the rounding of a
+    midpoint is settled on the values of the neighbouring curves, so the labels are identical to
+    RnpdEquation.get_matching_groups. Rows off the integer durations go to their month's BoundaryTable.
+    """
+
+    def __init__(self, months: List[str], tables: List[BoundaryTable]):
+        self.months = months
+        self.month_index: Dict[str, int] = {month: i for i, month in enumerate(months)}
+        self.tables = tables
+        self.low = tables[0].durations[0]
+        n_durations = len(tables[0].durations)
+        n_groups = max(len(table.labels) for table in tables)
+        self.labels = np.zeros((len(tables), n_durations, n_groups), dtype=tables[0].labels.dtype)
+        self.curves = np.full((len(tables), n_durations, n_groups), np.inf)
+        # padded to a power of two, so the branchless search never steps out of a cell
+        self.thresholds = np.full((len(tables), n_durations, 1 << int(np.ceil(np.log2(max(n_groups - 1, 1))))), np.inf)
+        for i, table in enumerate(tables):
+            groups = len(table.labels)
+            self.labels[i, :, :groups] = table.sorted_labels
+            self.curves[i, :, :groups] = table.sorted_curves
+            self.thresholds[i, :, :groups - 1] = table.thresholds
+
+    def classify(self, month_index: np.ndarray, durations: np.ndarray, rnpds: np.ndarray) -> np.ndarray:
+        # month_index - each row's position in self.months
+        month_index = np.asarray(month_index, dtype=int)
+        durations, rnpds = np.asarray(durations, dtype=float), np.asarray(rnpds, dtype=float)
+        index = durations - self.low
+        on_table = (index >= 0) & (index < self.labels.shape[1]) & (index == np.floor(index)) & np.isfinite(rnpds)
+        rows = slice(None) if on_table.all() else on_table  # a view when every row is on the tables
+
+        labels = np.empty(len(durations), dtype=self.labels.dtype)
+        values = rnpds[rows]
+        n_groups = self.labels.shape[2]
+        cells = month_index[rows] * self.labels.shape[1] + index[rows].astype(int)
+        # branchless searchsorted of every row in its own cell's thresholds - the count of thresholds below it
+        width = self.thresholds.shape[2]
+        thresholds = self.thresholds.ravel()
+        start = cells * width
+        position = np.zeros(len(values), dtype=int)
+        step = width >> 1
+        while step:
+            position = np.where(thresholds[start + position + step - 1] < values, position + step, position)
+            step >>= 1
+        position += thresholds[start + position] < values
+        # a value within rounding of a midpoint is settled on the distances to the neighbouring curves,
+        # the lowest label on a tie
+        curves, sorted_labels = self.curves.ravel(), self.labels.ravel()
+        best = cells * n_groups + position
+        for offset in (-1, 1):
+            other = cells * n_groups + np.clip(position + offset, 0, n_groups - 1)
+            best_distance, other_distance = np.abs(curves[best] - values), np.abs(curves[other] - values)
+            closer = (other_distance < best_distance) | \
+                     ((other_distance == best_distance) & (sorted_labels[other] < sorted_labels[best]))
+            best = np.where(closer, other, best)
+        labels[rows] = sorted_labels[best]
+
+        for i in np.unique(month_index[~on_table]):
+            off_table = ~on_table & (month_index == i)
+            labels[off_table] = self.tables[i].classify(durations[off_table], rnpds[off_table])
+        return labels
 
 
 class RnpdEquation:
@@ -15,16 +458,26 @@ class RnpdEquation:
     def __init__(self,
                  data: pd.DataFrame,
                  month: str,
-                 poly_degree: int = RNPD_EQUATION_POLY_DEGREE):
+                 poly_degree: int = RNPD_EQUATION_POLY_DEGREE,
+                 constraints: str = CONSTRAINT_MODE):
         # data consists of columns ['group_index','duration_index','rnpd']
+        # constraints - 'grid': the fit constraints hold on constraint_grid(). 'adaptive': they hold on the
+        # whole duration range for degree <= 2 (exact conditions), on a fine grid by cutting planes above
         self.data: pd.DataFrame = data
         self.month: str = month
         self.poly_degree: int = poly_degree
+        if constraints not in ('grid', 'adaptive'):
+            raise ValueError(f"constraints is 'grid' or 'adaptive', not {constraints}")
+        self.constraints: str = constraints
         self.groups: Optional[Dict[int, pd.DataFrame]] = {
             int(group): data[data['group_index']==group].set_index('group_index')
             for group in sorted(data['group_index'].unique())
         }
-        self.coefficients = None
+        self.coeffs: Optional[Dict[int, np.ndarray]] = None
+        self.solver_stats: Optional[Dict] = None
+        # last SCS solution of the fit, the next month's warm start (see RnpdProblem.get_solver_state)
+        self.solver_state: Optional[Dict] = None
+        self.boundary_table: Optional[BoundaryTable] = None
 
     @property
     def __name__(self):
@@ -36,8 +489,79 @@ class RnpdEquation:
     def __repr__(self):
         return f"RnpdEquation(month='{self.month}')"
 
+    def get_median_matrix(self) -> Tuple[Tuple[int, ...], Tuple[float, ...], np.ndarray]:
+        # pivot the (group, duration) medians to a (groups x durations) matrix, nan for missing cells
+        table = self.data.assign(group_index=self.data['group_index'].astype(int))\
+            .pivot(index='group_index', columns='duration_index', values='rnpd')\
+            .sort_index().sort_index(axis=1)
+        return tuple(int(g) for g in table.index), tuple(float(d) for d in table.columns), table.values
+
+    def fit_polynomial_regression(self,
+                                  epsilon=CONVEX_EPSILON_BETWEEN_GROUPS,
+                                  lambda_reg=LAMBDA_REG,
+                                  initial: Optional['RnpdEquation'] = None,
+                                  **solve_kwargs):
+        # solve_kwargs are passed to cvx.Problem.solve, e.g. solver='SCS', warm_start=True.
+        # with warm_start the solver starts from the fit `initial` - in a monthly load the previous month's -
+        # its coeffs mapped to this month's groups (see get_initial_coefficients) and its solver state
+        start = time.perf_counter()
+        if self.data.duplicated(['group_index', 'duration_index']).any():
+            # the matrix form holds one median per (group, duration) cell
+            self.fit_polynomial_regression_scalar(epsilon, lambda_reg)
+            self.solver_stats['fit_time'] = time.perf_counter() - start
+            return
+
+        groups, durations, medians = self.get_median_matrix()
+        initial_coefficients = None if initial is None or not initial.coeffs else \
+            get_initial_coefficients(initial.coeffs, groups, self.poly_degree)
+        initial_state = None if initial is None else initial.solver_state
+        if self.constraints == 'adaptive' and self.poly_degree > 2:
+            coefficients, self.solver_stats, problem = self.fit_cutting_planes(
+                groups, durations, medians, epsilon, lambda_reg, initial_coefficients, initial_state, **solve_kwargs)
+        else:
+            x_vals = None if self.constraints == 'adaptive' else constraint_grid()
+            problem = RnpdProblem.get(groups, durations, self.poly_degree, x_vals)
+            coefficients = problem.solve(medians, epsilon=epsilon, lambda_reg=lambda_reg,
+                                         initial=initial_coefficients, initial_state=initial_state, **solve_kwargs)
+            # whether the problem was built for this fit or reused
+            self.solver_stats = dict(problem.get_solver_stats(), problem_reused=problem.reused)
+        if solve_kwargs.get('warm_start'):
+            self.solver_state = problem.get_solver_state()
+        self.coeffs = {group: coefficients[i] for i, group in enumerate(groups)}
+        # wall time of the whole fit
+        self.solver_stats['fit_time'] = time.perf_counter() - start
+        self.boundary_table = None
+
+    def fit_cutting_planes(self, groups, durations, medians, epsilon, lambda_reg, initial=None, initial_state=None,
+                           **solve_kwargs) -> Tuple[np.ndarray, Dict, 'CuttingPlaneProblem']:
+        # grid constraints on a coarse grid first, then rounds adding the worst fine grid violation of every
+        # constraint row until there is none. The fine grid holds constraint_grid(), so the result is
+        # feasible wherever the 'grid' fit is. A warm started round starts from the previous round's solution,
+        # the first one from `initial` and `initial_state`
+        fine = np.union1d(constraint_grid(), np.linspace(*CONVEX_DURATION_RANGE, CUTTING_PLANE_FINE_POINTS))
+        points = np.linspace(*CONVEX_DURATION_RANGE, CUTTING_PLANE_COARSE_POINTS)
+        totals = {'iterations': 0, 'solve_time': 0.0, 'setup_time': 0.0, 'compilation_time': 0.0}
+        reused = True
+        for rounds in range(1, CUTTING_PLANE_MAX_ROUNDS + 1):
+            problem = CuttingPlaneProblem.get_for_points(groups, durations, self.poly_degree, points, fine)
+            coefficients = problem.solve(medians, epsilon=epsilon, lambda_reg=lambda_reg,
+                                         initial=initial if rounds == 1 else coefficients,
+                                         initial_state=initial_state if rounds == 1 else None, **solve_kwargs)
+            stats = problem.get_solver_stats()
+            reused = reused and problem.reused
+            for name in totals:
+                totals[name] += stats[name] or 0
+            violated = np.setdiff1d(get_violated_points(coefficients, fine, epsilon, CUTTING_PLANE_TOLERANCE), points)
+            if not len(violated):
+                break
+            points = np.union1d(points, violated)
+        else:
+            stats['status'] = 'optimal_inaccurate'  # still violated on the fine grid after the last round
+        stats.update(totals, cutting_plane_rounds=rounds, constraint_points=len(points), problem_reused=reused)
+        return coefficients, stats, problem
 
-    def fit_polynomial_regression(self, epsilon=CONVEX_EPSILON_BETWEEN_GROUPS):
+    def fit_polynomial_regression_scalar(self, epsilon=CONVEX_EPSILON_BETWEEN_GROUPS, lambda_reg=LAMBDA_REG):
+        # reference formulation - one cvxpy constraint per group and grid point, rebuilt on every call
         # Define variables for polynomial coefficients
         degree = self.poly_degree
         coefficients = {group: cvx.Variable(degree + 1) for group in sorted(self.groups.keys())}
@@ -59,10 +583,10 @@ class RnpdEquation:
             # L1 norm of the coefficient vector
             regularization_terms.append(cvx.norm1(coefficients[group]))
 
-        total_error: Expression = cvx.sum(total_data_error) + cvx.sum(LAMBDA_REG * sum(regularization_terms))
+        total_error: Expression = cvx.sum(total_data_error) + cvx.sum(lambda_reg * sum(regularization_terms))
 
         # Constraints for non-intersecting lines
-        x_vals = np.linspace(0, 10, 100)
+        x_vals = constraint_grid()
         constraints = []
 
         sorted_groups = sorted(self.groups.keys())
@@ -85,31 +609,44 @@ class RnpdEquation:
 
         if problem.status in ["optimal", "optimal_inaccurate"]:
             self.coeffs = {group: coefficients[group].value for group in sorted_groups}
+            self.solver_stats = get_solver_stats(problem)
+            self.boundary_table = None
         else:
             raise Exception("Optimization failed")
 
-    def get_matching_group(self, duration: float, rnpd: float) -> int:
+    def get_coefficient_matrix(self) -> Tuple[np.ndarray, np.ndarray]:
+        # group labels and the (groups x degree+1) matrix of their stacked coefficients
         if self.coeffs is None:
             raise ValueError("Coefficients are not computed. Please run fit_polynomial_regression first.")
+        labels = np.array(sorted(self.coeffs.keys()))
+        return labels, np.vstack([self.coeffs[group] for group in labels])
 
-        closest_group = [
-            abs(sum([self.coeffs[group][i] * duration ** i for i in range(len(self.coeffs[group]))]) - rnpd)
-            for group in self.groups
-        ]
-        return np.argmin(closest_group) + 1
+    def get_matching_groups(self, durations: np.ndarray, rnpds: np.ndarray) -> np.ndarray:
+        # batch version of get_matching_group - evaluates every group curve for every row in one broadcast
+        labels, coefficients = self.get_coefficient_matrix()
+        return labels[closest_curves(durations, rnpds, coefficients)]
 
+    def get_boundary_table(self) -> BoundaryTable:
+        # built on first use and kept until the next fit
+        if self.boundary_table is None:
+            self.boundary_table = BoundaryTable(*self.get_coefficient_matrix())
+        return self.boundary_table
+
+    def get_matching_group(self, duration: float, rnpd: float) -> int:
+        return int(self.get_matching_groups(np.array([duration]), np.array([rnpd]))[0])
 
-    def plot_graphs(self, month):
-        if self.coeffs is None:
-            raise ValueError("Coefficients are not computed. Please run fit_polynomial_regression first.")
 
-        x_vals = np.linspace(0, 10, 100)
+    def plot_graphs(self, month: Optional[str] = None):
+        # interactive plot of this month's curves - model_plots.py renders many months headless
+        labels, coefficients = self.get_coefficient_matrix()
+        month = self.month if month is None else month
+
+        x_vals = constraint_grid()
 
         plt.figure(figsize=(10, 6))
 
-        # Plotting each polynomial for each group
-        for group in sorted(self.groups.keys()):
-            poly_vals = sum([self.coeffs[group][i] * x_vals ** i for i in range(self.poly_degree + 1)])
+        # Plotting each polynomial for each group, all evaluated in one pass
+        for group, poly_vals in zip(labels, evaluate_polynomials(x_vals, coefficients).T):
             plt.plot(x_vals, poly_vals, label=f'Group {group}')
 
         plt.ylabel('RNPD')
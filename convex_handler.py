@@ -1,51 +1,103 @@
+import argparse
+import os
+from typing import Iterator, Optional, Union
 from model_class import ModelData
+from model_store import ModelStore
+from metrics import profiled
+from prediction_history import PredictionHistory
+from data_reader import MonthlyData, iter_months, read_months
+from const import DATA_COLUMNS_RENAME
 import pandas as pd
 
 
-def load(data: pd.DataFrame):
-    model = ModelData()
-    months = sorted(data.month.astype(str).unique())
-    for month in months:
+def load(data: Union[pd.DataFrame, MonthlyData],
+         warm_start: bool = False,
+         workers: int = 1,
+         store: Optional[ModelStore] = None):
+    # data - a frame of all months, or (month, frame) pairs in month order such as read_months yields
+    model = ModelData(warm_start=warm_start)
+    months = []
+
+    #  phase 1 - sequential update of the sample windows, snapshots models_data[month] for every month
+    for month, month_data in iter_months(data):
+        months.append(month)
         try:
-            model.load_month(data=data[data.month == month],
+            model.load_month(data=month_data,
                              month=month)
-            model.add_monthly_model(month=month)
-            print(f'month: {month} loaded and model calculated')
         except Exception as E:
+            model.errors[month] = E
+
+    #  phase 2 - independent convex fit per month, in parallel when workers > 1
+    model.add_monthly_models(months=[month for month in months if month not in model.errors],
+                             workers=workers,
+                             store=store)
+    for month in months:
+        if month in model.models:
+            stats = model.models[month].solver_stats
+            print(f'month: {month} loaded and model calculated '
+                  f'({stats["iterations"]} iterations, solve time {stats["solve_time"]:.3f}s)')
+            if stats['status'] != 'optimal':
+                print(f'month: {month} model accepted with solver status {stats["status"]}')
+        elif month in model.errors:
             print(f'Exception during data parsing of month: {month}')
-            print(E)
-            pass
+            print(model.errors[month])
     return model
 
 
-def predict(model: ModelData,
-            df: pd.DataFrame):
-    months = sorted(df.month.astype(str).unique())
-    results = []
-    for month in months[1:]:
-        x_test = df[df['month'] == month].copy()
+def iter_predictions(model: ModelData,
+                     df: Union[pd.DataFrame, MonthlyData]) -> Iterator[pd.DataFrame]:
+    # each month (but the first) scored with the previous month's model, one month at a time
+    for i, (month, x_test) in enumerate(iter_months(df)):
+        if i == 0:
+            continue
+        x_test = x_test.copy()
         x_test['M_pred'] = model.predict_class(month=str(pd.to_datetime(month).to_period('M') - 1),
                                                data=x_test)
-        results.append(x_test)
         print(f'month: {month} data was predicted')
-    return pd.concat(results)
+        yield x_test
+
+
+def predict(model: ModelData,
+            df: Union[pd.DataFrame, MonthlyData]):
+    return pd.concat(iter_predictions(model, df))
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--metrics', help='dump the per-month metrics to this .json or .csv file')
+    parser.add_argument('--profile', choices=['cprofile', 'tracemalloc'], help='profile the whole load and predict run')
+    parser.add_argument('--profile-output', help='keep the raw pstats / tracemalloc snapshot in this file')
+    parser.add_argument('--history', help='prediction history (.npz) to append the new predicted months to - '
+                                          'their rank-change alerts are saved next to the predictions')
+    args = parser.parse_args()
+    history = None
+    if args.history:
+        history = PredictionHistory.load(args.history) if os.path.exists(args.history) else PredictionHistory()
+
+    with profiled(args.profile, args.profile_output):
+        #  create monthly equations using golden distribution
+        model = load(data=read_months('data/preprocessed/data_for_convex.csv'),
+                     workers=os.cpu_count(),
+                     store=ModelStore())
+
+        #  predict the latest duration/rnpd per Security on last month's model and save results month by month,
+        #  with every column of the input under its own name and its row positions as the index
+        output_path = os.path.expanduser('~/Desktop/predicted_data.csv')
+        alerts_path = os.path.expanduser('~/Desktop/rank_change_alerts.csv')
+        for i, results in enumerate(iter_predictions(model=model,
+                                                     df=read_months('data/preprocessed/full_data_for_convex.csv',
+                                                                     columns=None))):
+            results.to_csv(output_path, mode='w' if i == 0 else 'a', header=i == 0)
+            month = results['month'].iloc[0]
+            if history is not None and month not in history.months:
+                alerts = history.append(month, results.rename(columns=DATA_COLUMNS_RENAME))
+                alerts.to_csv(alerts_path, mode='a', header=not os.path.exists(alerts_path), index=False)
+                print(f'month: {month} {len(alerts)} rank-change alerts')
 
-    #  create monthly equations using golden distribution
-    golden_distribution_df = pd.read_csv('data/preprocessed/data_for_convex.csv').drop('Unnamed: 0', axis=1)
-    golden_distribution_df.rename(columns={'RankID1': 'RankID'}, inplace=True)
-    model = load(data=golden_distribution_df)
-
-    #  predict the latest duration/rnpd per Security on last month's model (and save results)
-    full_data = pd.read_csv('data/preprocessed/full_data_for_convex.csv').drop('Unnamed: 0', axis=1)
-    results = predict(
-        model=model,
-        df=full_data
-    )
-    #  save to file
-    results.to_csv('~/Desktop/predicted_data.csv')
+    if history is not None:
+        history.save(args.history)
+    if args.metrics:
+        model.metrics.dump(args.metrics)
 
 
 if __name__ == '__main__':
@@ -12,6 +12,25 @@ RANKED_DATA_RELEVANT_COLUMNS = ['ReportDate', 'SecurityID','IssuerName','IssuerS
                                 AMIHOOD_LIQUIDITY_COLUMN, HAZARD_RATE_COL
                                 ]
 
+# columns read from the ranked workbooks - RankID is derived from RANK_COLUMN after loading
+RANKED_FILE_COLUMNS = [column for column in RANKED_DATA_RELEVANT_COLUMNS if column != 'RankID']
+
+# compact dtypes of the Loader frames (Loader(compact=True)) - the issuer strings as categoricals, the
+# ranks as int16, month as the monthly period ordinal (months since 1970-01). The columns the liquidity
+# premium and RNPD are calculated from (YieldBruto, the Amihud measure, the hazard rates) stay 64 bit
+LOADER_COLUMNS_DTYPES = {'IssuerName': 'category',
+                         'IssuerSuperSectorName': 'category',
+                         'PriceClose': 'float32',
+                         'DurationBruto': 'float32',
+                         'ZSpread': 'float32',
+                         RANK_COLUMN: 'float32',
+                         'RankID': 'int16',
+                         'M': 'int16',
+                         'GuaranteeID': 'float32',
+                         'NegativePledgeID': 'float32',
+                         'SeniorityID': 'float32',
+                         'month': 'int32'}
+
 GOLDEN_DISTRIBUTION_FILTER_COLUMNS = ['NegativePledgeID', 'GuaranteeID', 'SeniorityID']
 
 GOLDEN_DISTRIBUTION_CONDITIONS = lambda df: (df['NegativePledgeID'] == 0) & (df['GuaranteeID'] == 0)\
@@ -23,4 +42,18 @@ SEC_FILE_PATH = os.path.join(BASE_DIR, 'data', 'originals', 'RNPD_2016-2023_Corp
 PROSPECTUS_FILE = {'path': os.path.join(BASE_DIR, 'data', 'originals', 'prospectus', 'CorpCPI.xlsx'),
                    'sheet': 'Corp CPI prospectus'}
 
-GOV_SAMPLE_SIZE = 2000
\ No newline at end of file
+GOV_SAMPLE_SIZE = 2000
+
+# Amihud values from this quantile of the secs up are left out of the liquidity premium
+LIQUIDITY_QUANTILE = 0.99
+
+# most Amihud values a monthly update state keeps for the LIQUIDITY_QUANTILE threshold - a month the kept values
+# are too few for reads the threshold from a rebuild of the history (see data/monthly_update.py)
+LIQUIDITY_TAIL_CAP = 100000
+
+# columns of data_for_convex.csv, the golden distribution input of convex_handler
+CONVEX_FILE_COLUMNS = ['month', 'M', 'YieldBruto', 'Net Hazard Rate AMI', 'ZSpread', 'SecurityID', 'Rnpd', 'RankID1',
+                       'Duration']
+
+# stage results of data/pipeline.py
+CHECKPOINT_DIR = os.path.join(BASE_DIR, 'data', 'checkpoints')
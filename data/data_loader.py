@@ -5,16 +5,20 @@ from typing import Optional
 from data.const import (PROSPECTUS_COLUMNS, RANKED_DATA_RELEVANT_COLUMNS, HAZARD_RATE_COL,
                    AMIHOOD_LIQUIDITY_COLUMN, RANK_COLUMN, GOLDEN_DISTRIBUTION_FILTER_COLUMNS,
                    GOLDEN_DISTRIBUTION_CONDITIONS, GOV_FILE_PATH, SEC_FILE_PATH, PROSPECTUS_FILE,
-                   GOV_SAMPLE_SIZE
+                   GOV_SAMPLE_SIZE, RANKED_FILE_COLUMNS, LIQUIDITY_QUANTILE, LOADER_COLUMNS_DTYPES
                    )
 import warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 import matplotlib.pyplot as plt
+from data.excel_cache import read_excel_cached
 
 class Loader:
 
-    def __init__(self):
+    def __init__(self, compact: bool = False):
+        # compact - keep the frames in LOADER_COLUMNS_DTYPES, months as integer ordinals instead of Periods.
+        # off by default - a csv exported from a compact full_dataset holds ordinals, not 'YYYY-MM' months
+        self.compact: bool = compact
         self.secs: Optional[pd.DataFrame] = None
         self.gov: Optional[pd.DataFrame] = None
         self.full_dataset: Optional[pd.DataFrame] = None
@@ -28,52 +32,72 @@ class Loader:
                          sec_file_apath: str = SEC_FILE_PATH)\
     -> [pd.DataFrame, pd.DataFrame]:
         try:
-            secs = pd.read_excel(sec_file_apath)
-            gov = pd.read_excel(gov_file_path)
+            secs = read_excel_cached(sec_file_apath, RANKED_FILE_COLUMNS)
+            gov = read_excel_cached(gov_file_path, RANKED_FILE_COLUMNS)
+            self.secs, self.gov = Loader.filter_ranked_data(secs, gov, self.compact)
+            self.is_loading_successful = True
 
-            '''set ranks from originals columns according to business logic (gov = best rank = 1)'''
+        except Exception as e:
+            logging.error("Error occurred during loading of ranked data: %s", e)
 
-            secs['RankID'] = secs[RANK_COLUMN]
-            gov['RankID'] = 1
+    @staticmethod
+    def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+        # df with its LOADER_COLUMNS_DTYPES columns cast, columns already in their dtype are left as they are
+        dtypes = {column: dtype for column, dtype in LOADER_COLUMNS_DTYPES.items()
+                  if column in df and df[column].dtype != dtype}
+        return df.astype(dtypes) if dtypes else df
 
-            ''' 
-            filtering rows with null value - all required for RNPD:
-            #   1. RankID - between 1-28
-            #   2. HAZARD_RATE per-calculated
-            #   3. liquidity score
-            '''
+    @staticmethod
+    def get_months(dates: pd.Series, compact: bool = False) -> pd.Series:
+        months = dates.dt.to_period('M')
+        return pd.Series(months.array.asi8, index=dates.index, dtype='int32') if compact else months
 
-            gov = gov[(~gov[HAZARD_RATE_COL].isnull()) &
-                      (~gov[AMIHOOD_LIQUIDITY_COLUMN].isnull())]
+    @staticmethod
+    def filter_ranked_data(secs: pd.DataFrame, gov: pd.DataFrame, compact: bool = False) -> [pd.DataFrame, pd.DataFrame]:
+        '''set ranks from originals columns according to business logic (gov = best rank = 1)'''
 
-            secs = secs[(~secs[RANK_COLUMN].isnull()) &
-                        (~secs[HAZARD_RATE_COL].isnull()) &
-                        (~secs[AMIHOOD_LIQUIDITY_COLUMN].isnull())]
+        secs['RankID'] = secs[RANK_COLUMN]
+        gov['RankID'] = 1
 
-            '''fetch relevant columns only'''
+        ''' 
+        filtering rows with null value - all required for RNPD:
+        #   1. RankID - between 1-28
+        #   2. HAZARD_RATE per-calculated
+        #   3. liquidity score
+        '''
 
-            self.secs = secs[RANKED_DATA_RELEVANT_COLUMNS]
-            self.gov = gov[RANKED_DATA_RELEVANT_COLUMNS]
-            self.is_loading_successful = True
+        gov = gov[(~gov[HAZARD_RATE_COL].isnull()) &
+                  (~gov[AMIHOOD_LIQUIDITY_COLUMN].isnull())]
 
-        except Exception as e:
-            logging.error("Error occurred during loading of ranked data: %s", e)
+        secs = secs[(~secs[RANK_COLUMN].isnull()) &
+                    (~secs[HAZARD_RATE_COL].isnull()) &
+                    (~secs[AMIHOOD_LIQUIDITY_COLUMN].isnull())]
 
+        '''fetch relevant columns only'''
+
+        secs, gov = secs[RANKED_DATA_RELEVANT_COLUMNS], gov[RANKED_DATA_RELEVANT_COLUMNS]
+        if compact:
+            return Loader.compact_frame(secs), Loader.compact_frame(gov)
+        return secs, gov
 
     def add_prospectus_data(self,
                             prospectus_path: str = PROSPECTUS_FILE['path'],
-                            sheet_name: str = PROSPECTUS_FILE['sheet']):
+                            sheet_name: str = PROSPECTUS_FILE['sheet'],
+                            last_known: Optional[pd.DataFrame] = None):
 
         try:
-            secs = self.secs.copy()
-            prospectus = pd.read_excel(prospectus_path, sheet_name)
-            secs = secs.merge(prospectus[PROSPECTUS_COLUMNS], on=['SecurityID'], how='left')
+            prospectus = read_excel_cached(prospectus_path, PROSPECTUS_COLUMNS, sheet_name)
+            secs = self.secs.merge(prospectus[PROSPECTUS_COLUMNS], on=['SecurityID'], how='left')
 
             '''filling missing data when known for each Security'''
             secs[GOLDEN_DISTRIBUTION_FILTER_COLUMNS] = secs.sort_values('ReportDate').groupby('SecurityID')\
                 [GOLDEN_DISTRIBUTION_FILTER_COLUMNS].transform(lambda x: x.ffill())
+            if last_known is not None:
+                # appending a month - values still missing come from the last known ones per SecurityID
+                secs[GOLDEN_DISTRIBUTION_FILTER_COLUMNS] = secs[GOLDEN_DISTRIBUTION_FILTER_COLUMNS].fillna(
+                    last_known[GOLDEN_DISTRIBUTION_FILTER_COLUMNS].reindex(secs['SecurityID']).set_axis(secs.index))
 
-            self.secs = secs
+            self.secs = Loader.compact_frame(secs) if self.compact else secs
             self.is_prospectus_updated = True
 
         except Exception as e:
@@ -91,23 +115,46 @@ class Loader:
 
 
     @staticmethod
-    def get_ami_means(df: pd.DataFrame):
-        df = df[df[AMIHOOD_LIQUIDITY_COLUMN] < df[AMIHOOD_LIQUIDITY_COLUMN].quantile(0.99)].copy()
-        df['duration'] = np.round(df['DurationBruto'])
-        df.drop_duplicates(subset=['month', 'SecurityID'], keep='first', inplace=True)
-        df = df.groupby(['RankGroup', 'month']).apply(lambda x: Loader.get_monthly_mean_yield(x))
-        return df
+    def get_rank_groups(df: pd.DataFrame) -> np.ndarray:
+        return np.select([df['RankID'].between(1, 5), df['RankID'].between(6, 10)], [1, 2], default=3)
 
-
-    def add_liquidity_premium(self):
+    @staticmethod
+    def get_ami_means(df: pd.DataFrame, threshold: Optional[float] = None):
+        # get_monthly_mean_yield of every (RankGroup, month) in grouped passes - nan for groups of 3 rows or less
+        # rows at or above `threshold` are left out, by default the LIQUIDITY_QUANTILE of df
+        keys = ['RankGroup', 'month']
+        if threshold is None:
+            threshold = df[AMIHOOD_LIQUIDITY_COLUMN].quantile(LIQUIDITY_QUANTILE)
+        df = df[df[AMIHOOD_LIQUIDITY_COLUMN] < threshold]
+        # first row per (month, SecurityID) - deduplicated on month codes, hashing Period objects is slow
+        df = df[~pd.DataFrame({'month': pd.factorize(df['month'])[0],
+                               'SecurityID': df['SecurityID'].to_numpy()}).duplicated(keep='first').to_numpy()]
+
+        # rank by illiquidity within each group once and mark the most and least illiquid thirds
+        ranked = df.sort_values(by=AMIHOOD_LIQUIDITY_COLUMN, ascending=False, kind='stable')
+        grouped = ranked.groupby(keys, sort=False)
+        position = grouped.cumcount()
+        size = grouped[AMIHOOD_LIQUIDITY_COLUMN].transform('size')
+        samples = size // 3
+        third = np.select([position < samples, position >= size - samples], [1, 2], default=0)  # 1 upper, 2 lower
+
+        # both medians in one grouped aggregation
+        # groups of 2 rows or less have no upper and lower third, so both columns may be missing
+        medians = ranked.groupby(keys + [third])['YieldBruto'].median().unstack().reindex(columns=[0, 1, 2])
+        sizes = df.groupby(keys).size()
+        ami_means = (medians[1] - medians[2]).round(3).reindex(sizes.index)
+        return ami_means.where(sizes > 3)
+
+
+    def add_liquidity_premium(self, threshold: Optional[float] = None):
         try:
-            # add liquidity
-            secs = self.secs.copy()
-            secs['RankGroup'] = np.where(secs['RankID'].between(1, 5), 1,
-                                    np.where(secs['RankID'].between(6, 10), 2, 3))
-            secs['month'] = secs['ReportDate'].dt.to_period('M')
-            ami_means = Loader.get_ami_means(secs)
-            secs['liquidity_premium_ami'] = secs.set_index(['RankGroup', 'month']).index.map(ami_means).fillna(0)
+            # add liquidity - in place, secs is the frame built by the prospectus merge
+            secs = self.secs
+            secs['RankGroup'] = Loader.get_rank_groups(secs)
+            secs['month'] = Loader.get_months(secs['ReportDate'], self.compact)
+            ami_means = Loader.get_ami_means(secs, threshold)
+            secs['liquidity_premium_ami'] = ami_means.reindex(
+                pd.MultiIndex.from_frame(secs[['RankGroup', 'month']])).fillna(0).to_numpy()
             secs['liquidity_premium_ami'] = np.clip(secs['liquidity_premium_ami'], 0, None)
             secs.drop('RankGroup', axis=1, inplace=True)
             self.secs = secs
@@ -119,60 +166,56 @@ class Loader:
 
             #  fill value in new columns in gov as well
             self.gov['Net Hazard Rate'] = self.gov[HAZARD_RATE_COL]
-            self.gov['month'] = self.gov['ReportDate'].dt.to_period('M')
+            self.gov['month'] = Loader.get_months(self.gov['ReportDate'], self.compact)
 
         except Exception as e:
                 logging.error("Error occurred during liquidity premium calculation: %s", e)
 
-    def build_full_dataset(self):
+    def build_full_dataset(self, gov_sample_size: int = GOV_SAMPLE_SIZE):
         try:
             self.gov['GuaranteeID'] = 0
             self.gov['NegativePledgeID'] = 0
             self.gov['SeniorityID'] = 1
 
-            self.full_dataset = pd.concat([self.gov.sample(GOV_SAMPLE_SIZE, replace=True),
+            self.full_dataset = pd.concat([self.gov.sample(gov_sample_size, replace=True),
                                            self.secs]).dropna(subset=['DurationBruto','Net Hazard Rate'])
+            if self.compact:
+                # the issuer categories of gov and secs differ, so their concatenation is back to object
+                self.full_dataset = Loader.compact_frame(self.full_dataset)
 
         except Exception as e:
             logging.error("Error occurred during concatenation gov and secs to a full dataframe: %s", e)
 
 
-    def calculate_rnpd(self):
+    def calculate_rnpd(self, show_plot: bool = True):
         try:
-            self.full_dataset['M'] =\
-                np.where(self.full_dataset['RankID'].between(12, 23), 11,
-                  np.where(self.full_dataset['RankID'] >= 24, 12,
-                    self.full_dataset['RankID']))
-
-            rnpd_dictionary = self.full_dataset.groupby(['SecurityID', 'month']).apply(lambda x: \
-                1 - np.exp(-x['Net Hazard Rate'].mean() / 10), include_groups=False)
+            self.full_dataset['M'] = np.select([self.full_dataset['RankID'].between(12, 23),
+                                                self.full_dataset['RankID'] >= 24],
+                                               [11, 12],
+                                               default=self.full_dataset['RankID'])
 
-            self.full_dataset['RNPD'] = self.full_dataset.apply\
-                (lambda x: rnpd_dictionary[(x.SecurityID, x.month)], axis=1)
+            mean_hazard_rate = self.full_dataset.groupby(['SecurityID', 'month'])['Net Hazard Rate']\
+                .transform('mean')
+            self.full_dataset['RNPD'] = 1 - np.exp(-mean_hazard_rate.to_numpy() / 10)
 
             #  override protocol definitions in this calculation
             self.full_dataset.loc[self.full_dataset['RankID'] == 1, 'RNPD'] = 0  #  gov
             self.full_dataset.loc[self.full_dataset['RankID'] >= 24, 'RNPD'] = 1  # defaulted
+            if self.compact:
+                self.full_dataset = Loader.compact_frame(self.full_dataset)
 
-            print(self.full_dataset.shape)
-            self.full_dataset['RNPD'].plot.hist(bins=30, title='RNPD')
-            plt.show()
+            if show_plot:
+                print(self.full_dataset.shape)
+                self.full_dataset['RNPD'].plot.hist(bins=30, title='RNPD')
+                plt.show()
 
         except Exception as e:
             logging.error("Error occurred during RNPD calculation: %s", e)
 
-def main_handler():
-    loader = Loader()
-    loader.load_ranked_data(gov_file_path=GOV_FILE_PATH,
-                            sec_file_apath=SEC_FILE_PATH)
-    if loader.is_loading_successful:
-        loader.add_prospectus_data(prospectus_path=PROSPECTUS_FILE['path'],
-                                   sheet_name=PROSPECTUS_FILE['sheet'])
-        if loader.is_prospectus_updated:
-            loader.add_liquidity_premium()
-            if loader.is_liquidity_calculated and loader.is_net_hazard_rate_updated:
-                loader.build_full_dataset()
-                loader.calculate_rnpd()
+def main_handler() -> Loader:
+    # the steps run as checkpointed stages, see data/pipeline.py
+    from data.pipeline import LoaderPipeline
+    return LoaderPipeline().run()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+from typing import List, Optional, Union
+
+import pandas as pd
+
+try:
+    from pyarrow import feather
+    CACHE_FORMAT = 'feather'
+except ImportError:
+    feather = None
+    CACHE_FORMAT = 'pickle'
+
+
+def get_file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_cache_path(path: str, sheet_name: Union[str, int] = 0) -> str:
+    # the cache sits next to the original: <file>[.<sheet>].feather (.pkl without pyarrow)
+    sheet = '' if sheet_name == 0 else f'.{sheet_name}'
+    return f'{path}{sheet}.{"feather" if CACHE_FORMAT == "feather" else "pkl"}'
+
+
+def read_cache_meta(cache_path: str) -> Optional[dict]:
+    if not (os.path.exists(cache_path) and os.path.exists(cache_path + '.json')):
+        return None
+    with open(cache_path + '.json') as f:
+        return json.load(f)
+
+
+def write_cache_meta(path: str, cache_path: str, columns: List[str], sha256: Optional[str] = None):
+    stat = os.stat(path)
+    with open(cache_path + '.json', 'w') as f:
+        json.dump({'mtime': stat.st_mtime,
+                   'size': stat.st_size,
+                   'sha256': sha256 or get_file_hash(path),
+                   'columns': columns}, f, indent=1)
+
+
+def is_cache_current(path: str, cache_path: str, columns: List[str]) -> bool:
+    # current while the source keeps its mtime and size - or its content hash, when only the mtime moved
+    meta = read_cache_meta(cache_path)
+    if meta is None or not set(columns) <= set(meta['columns']):
+        return False
+    stat = os.stat(path)
+    if meta['mtime'] == stat.st_mtime and meta['size'] == stat.st_size:
+        return True
+    if meta['size'] == stat.st_size and meta['sha256'] == get_file_hash(path):
+        write_cache_meta(path, cache_path, meta['columns'], meta['sha256'])
+        return True
+    return False
+
+
+def read_cache(cache_path: str) -> pd.DataFrame:
+    if CACHE_FORMAT == 'feather':
+        return feather.read_feather(cache_path, memory_map=True)
+    return pd.read_pickle(cache_path)
+
+
+def write_cache(df: pd.DataFrame, cache_path: str):
+    if CACHE_FORMAT == 'feather':
+        df.to_feather(cache_path + '.tmp')
+    else:
+        df.to_pickle(cache_path + '.tmp')
+    os.replace(cache_path + '.tmp', cache_path)
+
+
+def read_excel_cached(path: str, columns: List[str], sheet_name: Union[str, int] = 0) -> pd.DataFrame:
+    """
+    pd.read_excel of the `columns` found in the sheet. The workbook is parsed once, and later calls
+    read a typed columnar copy next to it (memory-mapped feather when pyarrow is installed) until the
+    workbook's mtime and content change.
+    """
+    cache_path = get_cache_path(path, sheet_name)
+    if is_cache_current(path, cache_path, columns):
+        df = read_cache(cache_path)
+        return df[[column for column in df.columns if column in columns]]
+
+    df = pd.read_excel(path, sheet_name=sheet_name, usecols=lambda column: column in columns)
+    write_cache(df.reset_index(drop=True), cache_path)
+    write_cache_meta(path, cache_path, columns)
+    return df
@@ -0,0 +1,212 @@
+import math
+import os
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from data.const import (AMIHOOD_LIQUIDITY_COLUMN, GOLDEN_DISTRIBUTION_FILTER_COLUMNS, PROSPECTUS_FILE,
+                        GOV_SAMPLE_SIZE, LIQUIDITY_QUANTILE, LIQUIDITY_TAIL_CAP, CONVEX_FILE_COLUMNS)
+from data.data_loader import Loader
+from data.pipeline import LoaderPipeline
+
+
+def get_quantile_index(count: int, q: float = LIQUIDITY_QUANTILE) -> float:
+    # the virtual index of np.quantile's default 'linear' method, with the same float operations
+    return (count - 1) * q
+
+
+def get_tail_size(count: int, q: float = LIQUIDITY_QUANTILE) -> int:
+    # how many of the largest values the q quantile of `count` values reads
+    return count - math.floor(get_quantile_index(count, q)) if count else 0
+
+
+def get_tail_quantile(tail: np.ndarray, count: int, q: float = LIQUIDITY_QUANTILE) -> float:
+    """
+    pd.Series.quantile(q) of `count` values given only the largest of them, `tail`, sorted ascending.
+    Interpolates like numpy's 'linear' method, so the result is the same float.
+    """
+    if count == 0:
+        return np.nan
+    index = get_quantile_index(count, q)
+    previous = min(math.floor(index), count - 1)
+    gamma = index - previous
+    lower = tail[previous - (count - len(tail))]
+    upper = tail[min(previous + 1, count - 1) - (count - len(tail))]
+    if gamma >= 0.5:
+        return float(upper - (upper - lower) * (1 - gamma))
+    return float(lower + (upper - lower) * gamma)
+
+
+class LoaderState:
+    """
+    What a month of the Loader reads from the history before it. That is the last known prospectus values
+    per SecurityID for the forward fill, and the largest Amihud values and their count for the global
+    LIQUIDITY_QUANTILE threshold. Also the number of gov rows, for the gov sampling rate.
+    The prospectus table is sized by the securities. The Amihud values are the largest share the threshold
+    reads, but at most tail_cap of them, so the state stops growing with the months once it holds that many.
+    """
+
+    def __init__(self,
+                 last_known: pd.DataFrame,
+                 liquidity_tail: np.ndarray,
+                 liquidity_count: int,
+                 gov_count: int,
+                 month: pd.Period,
+                 tail_cap: Optional[int] = LIQUIDITY_TAIL_CAP):
+        self.last_known = last_known
+        self.liquidity_tail = liquidity_tail
+        self.liquidity_count = liquidity_count
+        self.gov_count = gov_count
+        self.month = month
+        self.tail_cap = tail_cap
+
+    @classmethod
+    def from_loader(cls,
+                    loader: Loader,
+                    before: Optional[pd.Period] = None,
+                    tail_cap: Optional[int] = LIQUIDITY_TAIL_CAP) -> 'LoaderState':
+        # from a Loader taken through add_prospectus_data, e.g. a full rebuild - of its months before `before`
+        secs, gov = loader.secs, loader.gov
+        if before is not None:
+            secs = secs[secs['ReportDate'].dt.to_period('M') < before]
+            gov = gov[gov['ReportDate'].dt.to_period('M') < before]
+        state = cls(last_known=pd.DataFrame(columns=GOLDEN_DISTRIBUTION_FILTER_COLUMNS),
+                    liquidity_tail=np.empty(0),
+                    liquidity_count=0,
+                    gov_count=0,
+                    month=None,
+                    tail_cap=tail_cap)
+        state.update(secs, gov)
+        return state
+
+    def has_liquidity_tail(self, count: int) -> bool:
+        # whether the kept Amihud values are enough for the threshold of a month of `count` values
+        return len(self.liquidity_tail) >= min(self.liquidity_count, get_tail_size(self.liquidity_count + count))
+
+    def get_liquidity_threshold(self, values: np.ndarray) -> float:
+        # the LIQUIDITY_QUANTILE of the history and `values` together
+        if not self.has_liquidity_tail(len(values)):
+            raise Exception("The state keeps too few Amihud values for this month, pass append_month a rebuild")
+        return get_tail_quantile(np.sort(np.concatenate([self.liquidity_tail, values])),
+                                 self.liquidity_count + len(values))
+
+    def update(self, secs: pd.DataFrame, gov: pd.DataFrame):
+        # secs and gov of the months after self.month, with the prospectus columns filled
+        last_known = secs.sort_values('ReportDate').groupby('SecurityID')[GOLDEN_DISTRIBUTION_FILTER_COLUMNS].last()
+        self.last_known = last_known.combine_first(self.last_known) if len(self.last_known) else last_known
+
+        # twice the tail the threshold reads, so next month can be as large as the whole history - up to tail_cap
+        values = secs[AMIHOOD_LIQUIDITY_COLUMN].dropna().to_numpy()
+        self.liquidity_count += len(values)
+        tail = np.sort(np.concatenate([self.liquidity_tail, values]))
+        size = 2 * get_tail_size(self.liquidity_count)
+        if self.tail_cap is not None:
+            size = min(size, self.tail_cap)
+        self.liquidity_tail = tail[len(tail) - min(len(tail), size):]
+
+        self.gov_count += len(gov)
+        dates = pd.concat([secs['ReportDate'], gov['ReportDate']])
+        if len(dates):
+            month = dates.max().to_period('M')
+            self.month = month if self.month is None else max(self.month, month)
+
+    def save(self, path: str):
+        pd.to_pickle(self.__dict__, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'LoaderState':
+        return cls(**pd.read_pickle(path))
+
+
+def append_month(secs: pd.DataFrame,
+                 gov: pd.DataFrame,
+                 state: LoaderState,
+                 prospectus_file: dict = PROSPECTUS_FILE,
+                 gov_sample_size: int = GOV_SAMPLE_SIZE,
+                 show_plot: bool = False,
+                 compact: bool = False,
+                 rebuild: Optional[Callable[[], Loader]] = None) -> Optional[pd.DataFrame]:
+    """
+    The full_dataset rows of a new month, from its raw ranked rows (as read from the GOV and CorpCPI
+    workbooks) and the state of the months before. Updates the state.
+    Security rows equal those of a full rebuild including the month. Gov rows are sampled from the
+    month at the rate a full rebuild samples the whole gov history.
+    Rows of earlier months are not revised, but a full rebuild would move their liquidity threshold.
+    compact - the rows in the dtypes of Loader(compact=True)
+    rebuild - a Loader of the history through add_prospectus_data (see load_history), read for the
+    liquidity threshold of a month the state keeps too few Amihud values for (see LoaderState.tail_cap)
+    """
+    loader = Loader(compact=compact)
+    loader.secs, loader.gov = Loader.filter_ranked_data(secs, gov, compact)
+    months = pd.concat([loader.secs['ReportDate'], loader.gov['ReportDate']]).dt.to_period('M')
+    if state.month is not None and months.min() <= state.month:
+        raise Exception(f"Rows of {months.min()} are not after the state's last month {state.month}")
+
+    loader.add_prospectus_data(prospectus_file['path'], prospectus_file['sheet'], last_known=state.last_known)
+    if not loader.is_prospectus_updated:
+        raise Exception("Loader step 'prospectus' failed, see the logged error")
+
+    values = loader.secs[AMIHOOD_LIQUIDITY_COLUMN].dropna().to_numpy()
+    if not state.has_liquidity_tail(len(values)) and rebuild is not None:
+        # the state keeps the largest tail_cap values only - the threshold is read from the whole history
+        threshold = LoaderState.from_loader(rebuild(), before=months.min(), tail_cap=None)\
+            .get_liquidity_threshold(values)
+    else:
+        threshold = state.get_liquidity_threshold(values)
+    loader.add_liquidity_premium(threshold)
+    if not (loader.is_liquidity_calculated and loader.is_net_hazard_rate_updated):
+        raise Exception("Loader step 'liquidity_premium' failed, see the logged error")
+
+    gov_count = state.gov_count + len(loader.gov)
+    loader.build_full_dataset(round(gov_sample_size * len(loader.gov) / gov_count) if gov_count else 0)
+    loader.calculate_rnpd(show_plot)
+    if loader.full_dataset is None or 'RNPD' not in loader.full_dataset:
+        raise Exception("Loader steps 'full_dataset' and 'rnpd' failed, see the logged error")
+
+    state.update(loader.secs, loader.gov)
+    return loader.full_dataset
+
+
+def load_history() -> Loader:
+    # the ranked workbooks through the prospectus step, from the pipeline's checkpoints when they are current
+    return LoaderPipeline().run('prospectus')
+
+
+def get_convex_rows(full_dataset: pd.DataFrame) -> pd.DataFrame:
+    # full_dataset rows in the CONVEX_FILE_COLUMNS of data_for_convex.csv, months as 'YYYY-MM'
+    month = full_dataset['month']
+    if pd.api.types.is_integer_dtype(month):
+        month = pd.PeriodIndex.from_ordinals(month.to_numpy(), freq='M')  # a compact full_dataset
+    return full_dataset.assign(**{'month': month.astype(str).to_numpy(),
+                                  'Net Hazard Rate AMI': full_dataset['Net Hazard Rate'],
+                                  'Rnpd': full_dataset['RNPD'],
+                                  'RankID1': full_dataset['RankID'],
+                                  'Duration': full_dataset['DurationBruto'].clip(0).round().astype(int)})\
+        [CONVEX_FILE_COLUMNS]
+
+
+def export_for_convex(full_dataset: pd.DataFrame, path: str, append: bool = False):
+    # writes the rows to a data_for_convex.csv at `path`, or with append adds them to it - the index is the
+    # row position in the file
+    start = 0
+    if append and os.path.exists(path):
+        with open(path) as f:
+            start = max(sum(1 for _ in f) - 1, 0)
+    rows = get_convex_rows(full_dataset)
+    rows.index = pd.RangeIndex(start, start + len(rows))
+    rows.to_csv(path, mode='a' if start else 'w', header=not start)
+
+
+def append_month_to_convex(secs: pd.DataFrame,
+                           gov: pd.DataFrame,
+                           state: LoaderState,
+                           path: str,
+                           prospectus_file: dict = PROSPECTUS_FILE,
+                           gov_sample_size: int = GOV_SAMPLE_SIZE,
+                           compact: bool = False,
+                           rebuild: Optional[Callable[[], Loader]] = load_history) -> Optional[pd.DataFrame]:
+    # append_month, with the new month's rows added to the data_for_convex.csv at `path`
+    rows = append_month(secs, gov, state, prospectus_file, gov_sample_size, compact=compact, rebuild=rebuild)
+    export_for_convex(rows, path, append=True)
+    return rows
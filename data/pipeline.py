@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from data.const import (PROSPECTUS_COLUMNS, RANKED_FILE_COLUMNS, HAZARD_RATE_COL, AMIHOOD_LIQUIDITY_COLUMN,
+                        RANK_COLUMN, GOLDEN_DISTRIBUTION_FILTER_COLUMNS, GOV_FILE_PATH, SEC_FILE_PATH,
+                        PROSPECTUS_FILE, GOV_SAMPLE_SIZE, LIQUIDITY_QUANTILE, CHECKPOINT_DIR, LOADER_COLUMNS_DTYPES)
+from data.data_loader import Loader
+
+
+class Stage:
+    """
+    One Loader step: `run` reads the `inputs` attributes of the Loader and sets its `outputs`, `done` tells
+    whether it succeeded. The result is checkpointed under a key of the params, the source files and the
+    keys of the stages that produced the inputs - bump `version` when the step's code changes.
+    """
+
+    def __init__(self,
+                 name: str,
+                 run: Callable[[Loader], None],
+                 inputs: List[str],
+                 outputs: List[str],
+                 done: Callable[[Loader], bool],
+                 params: Optional[dict] = None,
+                 files: Optional[List[str]] = None,
+                 version: int = 1):
+        self.name = name
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        self.done = done
+        self.params = params or {}
+        self.files = files or []
+        self.version = version
+
+
+def get_stages(gov_file_path: str = GOV_FILE_PATH,
+               sec_file_path: str = SEC_FILE_PATH,
+               prospectus_file: dict = PROSPECTUS_FILE,
+               gov_sample_size: int = GOV_SAMPLE_SIZE) -> List[Stage]:
+    # main_handler's chain - GOV_SAMPLE_SIZE only reaches full_dataset, so the stages before it stay cached
+    return [
+        Stage('ranked_data',
+              run=lambda loader: loader.load_ranked_data(gov_file_path, sec_file_path),
+              inputs=[], outputs=['secs', 'gov'],
+              done=lambda loader: loader.is_loading_successful,
+              params={'columns': RANKED_FILE_COLUMNS, 'rank_column': RANK_COLUMN,
+                      'hazard_rate_column': HAZARD_RATE_COL, 'liquidity_column': AMIHOOD_LIQUIDITY_COLUMN,
+                      'dtypes': LOADER_COLUMNS_DTYPES},
+              files=[gov_file_path, sec_file_path]),
+        Stage('prospectus',
+              run=lambda loader: loader.add_prospectus_data(prospectus_file['path'], prospectus_file['sheet']),
+              inputs=['secs'], outputs=['secs'],
+              done=lambda loader: loader.is_prospectus_updated,
+              params={'columns': PROSPECTUS_COLUMNS, 'sheet': prospectus_file['sheet'],
+                      'fill_columns': GOLDEN_DISTRIBUTION_FILTER_COLUMNS},
+              files=[prospectus_file['path']]),
+        Stage('liquidity_premium',
+              run=lambda loader: loader.add_liquidity_premium(),
+              inputs=['secs', 'gov'], outputs=['secs', 'gov'],
+              done=lambda loader: loader.is_liquidity_calculated and loader.is_net_hazard_rate_updated,
+              params={'hazard_rate_column': HAZARD_RATE_COL, 'liquidity_column': AMIHOOD_LIQUIDITY_COLUMN,
+                      'liquidity_quantile': LIQUIDITY_QUANTILE}),
+        Stage('full_dataset',
+              run=lambda loader: loader.build_full_dataset(gov_sample_size),
+              inputs=['secs', 'gov'], outputs=['full_dataset'],
+              done=lambda loader: loader.full_dataset is not None,
+              params={'gov_sample_size': gov_sample_size}),
+        Stage('rnpd',
+              run=lambda loader: loader.calculate_rnpd(show_plot=False),
+              inputs=['full_dataset'], outputs=['full_dataset'],
+              done=lambda loader: 'RNPD' in loader.full_dataset),
+    ]
+
+
+def get_file_fingerprint(path: str) -> Optional[list]:
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime]
+
+
+class LoaderPipeline:
+    """
+    Runs the Loader stages lazily: a stage whose checkpoint is current is skipped without reading it, and a
+    checkpoint is read only when a stage that has to run needs it as an input. A failing stage raises.
+    """
+
+    def __init__(self,
+                 stages: Optional[List[Stage]] = None,
+                 checkpoint_dir: str = CHECKPOINT_DIR,
+                 loader: Optional[Loader] = None):
+        self.stages = stages if stages is not None else get_stages()
+        self.checkpoint_dir = checkpoint_dir
+        self.loader = loader if loader is not None else Loader()
+        self.ran: List[str] = []  # stages computed by the last run, the others were current
+
+    def get_keys(self) -> Dict[str, str]:
+        keys, producers = {}, {}
+        for stage in self.stages:
+            missing = [name for name in stage.inputs if name not in producers]
+            if missing:
+                raise Exception(f"Stage '{stage.name}' reads {missing} before any stage writes it")
+            # compact and 64 bit Loaders differ in dtypes and month format, so they never share a checkpoint
+            key = {'stage': stage.name,
+                   'version': stage.version,
+                   'compact': self.loader.compact,
+                   'params': stage.params,
+                   'files': [get_file_fingerprint(path) for path in stage.files],
+                   'inputs': {name: keys[producers[name]] for name in stage.inputs}}
+            keys[stage.name] = hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+            producers.update({name: stage.name for name in stage.outputs})
+        return keys
+
+    def get_checkpoint_path(self, stage_name: str, key: str, output: Optional[str] = None) -> str:
+        path = os.path.join(self.checkpoint_dir, stage_name, key[:16])
+        return path if output is None else os.path.join(path, f'{output}.pkl')
+
+    def is_current(self, stage: Stage, key: str) -> bool:
+        return all(os.path.exists(self.get_checkpoint_path(stage.name, key, name)) for name in stage.outputs)
+
+    def read_checkpoint(self, stage_name: str, key: str, output: str) -> pd.DataFrame:
+        return pd.read_pickle(self.get_checkpoint_path(stage_name, key, output))
+
+    def write_checkpoint(self, stage: Stage, key: str):
+        # written aside and renamed into place, the checkpoints of the stage's former keys are dropped
+        path = self.get_checkpoint_path(stage.name, key)
+        shutil.rmtree(path + '.tmp', ignore_errors=True)
+        os.makedirs(path + '.tmp')
+        for name in stage.outputs:
+            getattr(self.loader, name).to_pickle(os.path.join(path + '.tmp', f'{name}.pkl'))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(path + '.tmp', path)
+        stage_dir = os.path.dirname(path)
+        for entry in os.listdir(stage_dir):
+            if entry != key[:16]:
+                shutil.rmtree(os.path.join(stage_dir, entry), ignore_errors=True)
+
+    def get_stage_index(self, name: Optional[str]) -> int:
+        if name is None:
+            return len(self.stages) - 1
+        names = [stage.name for stage in self.stages]
+        if name not in names:
+            raise Exception(f"Unknown stage '{name}', stages are {names}")
+        return names.index(name)
+
+    def run(self, until: Optional[str] = None) -> Loader:
+        """
+        Brings every stage up to `until` (the last stage by default) up to date and returns the Loader
+        holding that stage's outputs.
+        """
+        keys = self.get_keys()
+        producers: Dict[str, str] = {}  # output -> stage whose checkpoint holds its current value
+        loaded = set()  # outputs whose current value is on the loader
+        self.ran = []
+
+        for stage in self.stages[:self.get_stage_index(until) + 1]:
+            key = keys[stage.name]
+            if not self.is_current(stage, key):
+                for name in stage.inputs:
+                    if name not in loaded:
+                        setattr(self.loader, name, self.read_checkpoint(producers[name], keys[producers[name]], name))
+                        loaded.add(name)
+
+                stage.run(self.loader)
+                if not stage.done(self.loader):
+                    raise Exception(f"Loader stage '{stage.name}' failed, see the logged error")
+                self.write_checkpoint(stage, key)
+                self.ran.append(stage.name)
+                # a step may have changed inputs it does not output - read them again if needed
+                loaded.difference_update(stage.inputs)
+                loaded.update(stage.outputs)
+            else:
+                loaded.difference_update(stage.outputs)
+            producers.update({name: stage.name for name in stage.outputs})
+
+        for name in self.stages[self.get_stage_index(until)].outputs:
+            if name not in loaded:
+                setattr(self.loader, name, self.read_checkpoint(producers[name], keys[producers[name]], name))
+        return self.loader
+
+    def get(self, output: str, until: Optional[str] = None) -> pd.DataFrame:
+        # the current checkpoint of `output` as of stage `until`, without running anything
+        keys, producer = self.get_keys(), None
+        for stage in self.stages[:self.get_stage_index(until) + 1]:
+            if output in stage.outputs:
+                producer = stage
+        if producer is None or not self.is_current(producer, keys[producer.name]):
+            raise Exception(f"No current checkpoint of '{output}', run the pipeline first")
+        return self.read_checkpoint(producer.name, keys[producer.name], output)
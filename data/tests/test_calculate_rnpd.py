@@ -0,0 +1,16 @@
+import numpy as np
+
+from data.data_loader import Loader
+from reference import make_full_dataset, calculate_rnpd_rowwise
+
+
+def test_calculate_rnpd_matches_rowwise_implementation():
+    loader = Loader()
+    loader.full_dataset = make_full_dataset()
+    expected = calculate_rnpd_rowwise(loader.full_dataset)
+    loader.calculate_rnpd(show_plot=False)
+
+    np.testing.assert_array_equal(loader.full_dataset['M'].values, expected['M'].values)
+    np.testing.assert_allclose(loader.full_dataset['RNPD'].values, expected['RNPD'].values, rtol=1e-14, atol=0)
+    assert (loader.full_dataset.loc[loader.full_dataset['RankID'] == 1, 'RNPD'] == 0).all()
+    assert (loader.full_dataset.loc[loader.full_dataset['RankID'] >= 24, 'RNPD'] == 1).all()
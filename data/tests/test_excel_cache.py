@@ -0,0 +1,45 @@
+import os
+
+import pandas as pd
+import pytest
+
+from data import excel_cache
+from data.excel_cache import read_excel_cached
+
+
+@pytest.fixture(params=['feather', 'pickle'])
+def cache_format(request, monkeypatch):
+    monkeypatch.setattr(excel_cache, 'CACHE_FORMAT', request.param)
+    return request.param
+
+
+def count_excel_reads(monkeypatch) -> list:
+    reads = []
+    read_excel = pd.read_excel
+    monkeypatch.setattr(pd, 'read_excel', lambda *args, **kwargs: reads.append(args[0]) or read_excel(*args, **kwargs))
+    return reads
+
+
+def test_workbook_is_parsed_once_until_it_changes(tmp_path, monkeypatch, cache_format):
+    path = str(tmp_path / 'ranked.xlsx')
+    pd.DataFrame({'SecurityID': [1, 2, 3], 'YieldBruto': [1.5, 2.5, 3.5], 'Other': ['a', 'b', 'c']})\
+        .to_excel(path, sheet_name='ranked', index=False)
+    reads = count_excel_reads(monkeypatch)
+
+    first = read_excel_cached(path, ['SecurityID', 'YieldBruto', 'RankID'], sheet_name='ranked')
+    second = read_excel_cached(path, ['YieldBruto', 'SecurityID'], sheet_name='ranked')
+    assert len(reads) == 1 and list(first.columns) == ['SecurityID', 'YieldBruto']
+    pd.testing.assert_frame_equal(first, second)
+    assert os.path.exists(excel_cache.get_cache_path(path, 'ranked'))
+
+    os.utime(path, (1, 1))  # touched, same content
+    read_excel_cached(path, ['SecurityID', 'YieldBruto'], sheet_name='ranked')
+    assert len(reads) == 1
+
+    read_excel_cached(path, ['SecurityID', 'Other'], sheet_name='ranked')  # a column not cached yet
+    assert len(reads) == 2
+
+    pd.DataFrame({'SecurityID': [4], 'YieldBruto': [0.5], 'Other': ['d']})\
+        .to_excel(path, sheet_name='ranked', index=False)
+    assert list(read_excel_cached(path, ['SecurityID', 'Other'], sheet_name='ranked')['SecurityID']) == [4]
+    assert len(reads) == 3
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from data.data_loader import Loader
+from reference import make_secs, get_ami_means_per_group
+
+
+def test_liquidity_premium_matches_per_group_implementation():
+    loader = Loader()
+    loader.secs, loader.gov = make_secs(), make_secs(rows=50, seed=1)
+    loader.add_liquidity_premium()
+    assert loader.is_liquidity_calculated
+
+    secs = make_secs()
+    secs['RankGroup'] = np.where(secs['RankID'].between(1, 5), 1, np.where(secs['RankID'].between(6, 10), 2, 3))
+    secs['month'] = secs['ReportDate'].dt.to_period('M')
+    ami_means = get_ami_means_per_group(secs)
+    expected = np.clip(secs.set_index(['RankGroup', 'month']).index.map(ami_means).fillna(0), 0, None)
+
+    assert ami_means.isna().any() and (ami_means > 0).any()
+    np.testing.assert_array_equal(loader.secs['liquidity_premium_ami'].values, np.asarray(expected, dtype=float))
+    pd.testing.assert_series_equal(Loader.get_ami_means(secs), ami_means.astype(float), check_names=False)
+
+
+def test_months_of_small_groups_get_no_premium():
+    # a single appended month - every (RankGroup, month) group has 3 rows or less
+    loader = Loader()
+    secs = make_secs(rows=6, securities=6)
+    secs['ReportDate'] = pd.Timestamp('2020-01-31')
+    secs['RankID'] = [1, 2, 7, 8, 15, 20]
+    loader.secs, loader.gov = secs, make_secs(rows=5, seed=1)
+    loader.add_liquidity_premium(threshold=np.inf)
+    assert loader.is_liquidity_calculated and loader.is_net_hazard_rate_updated
+    assert (loader.secs['liquidity_premium_ami'] == 0).all()
@@ -0,0 +1,148 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.const import AMIHOOD_LIQUIDITY_COLUMN, LOADER_COLUMNS_DTYPES
+from data.data_loader import Loader
+from data.monthly_update import LoaderState, append_month, append_month_to_convex, export_for_convex
+from data.tests.test_pipeline import make_ranked
+from convex_handler import load, predict
+from data_reader import read_months
+
+
+@pytest.fixture
+def ranked(tmp_path):
+    secs, gov = make_ranked(3000, range(100, 2100), 0), make_ranked(300, range(1, 5), 1)
+    # later months less liquid, so their rows are cut by the quantile of the whole history, not their own
+    secs[AMIHOOD_LIQUIDITY_COLUMN] *= secs['ReportDate'].dt.month
+    prospectus = {'path': str(tmp_path / 'prospectus.xlsx'), 'sheet': 'prospectus'}
+    pd.DataFrame({'SecurityID': range(100, 1600), 'GuaranteeID': np.arange(1500) % 2, 'NegativePledgeID': 0,
+                  'SeniorityID': 1}).to_excel(prospectus['path'], sheet_name=prospectus['sheet'], index=False)
+    return secs, gov, prospectus
+
+
+def rebuild(secs: pd.DataFrame, gov: pd.DataFrame, prospectus: dict, compact: bool = False) -> Loader:
+    loader = Loader(compact=compact)
+    loader.secs, loader.gov = Loader.filter_ranked_data(secs.copy(), gov.copy(), compact)
+    loader.add_prospectus_data(prospectus['path'], prospectus['sheet'])
+    loader.add_liquidity_premium()
+    loader.build_full_dataset(50)
+    loader.calculate_rnpd(show_plot=False)
+    return loader
+
+
+def get_security_rows(full_dataset: pd.DataFrame, month) -> pd.DataFrame:
+    rows = full_dataset[(full_dataset['month'] == month) & (full_dataset['SecurityID'] >= 100)]
+    assert len(rows)
+    return rows.reset_index(drop=True)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_appended_months_match_a_full_rebuild(tmp_path, ranked, compact):
+    secs, gov, prospectus = ranked
+    months = secs['ReportDate'].dt.to_period('M')
+    gov_months = gov['ReportDate'].dt.to_period('M')
+    appended = sorted(months.unique())[-3:]
+
+    state = LoaderState.from_loader(rebuild(secs[months < appended[0]], gov[gov_months < appended[0]], prospectus,
+                                            compact))
+    for month in appended:
+        state.save(str(tmp_path / 'state.pkl'))
+        state = LoaderState.load(str(tmp_path / 'state.pkl'))
+        rows = append_month(secs[months == month].copy(), gov[gov_months == month].copy(), state, prospectus,
+                            compact=compact)
+
+        expected = rebuild(secs[months <= month], gov[gov_months <= month], prospectus, compact).full_dataset
+        # compact frames keep the month as its period ordinal
+        key = month.ordinal if compact else month
+        pd.testing.assert_frame_equal(get_security_rows(rows, key), get_security_rows(expected, key),
+                                      check_dtype=False)
+        assert (rows['month'] == key).all() and state.month == month
+        assert len(state.liquidity_tail) < 0.05 * state.liquidity_count
+
+    with pytest.raises(Exception, match='not after'):
+        append_month(secs[months == appended[-1]].copy(), gov[gov_months == appended[-1]].copy(), state, prospectus)
+
+
+def test_state_size_stays_flat_across_appended_months(tmp_path, ranked):
+    # securities traded every month, so the prospectus table is full from the start
+    _, gov, prospectus = ranked
+    secs = make_ranked(3000, range(100, 400), 2)
+    secs[AMIHOOD_LIQUIDITY_COLUMN] *= secs['ReportDate'].dt.month
+    months = secs['ReportDate'].dt.to_period('M')
+    gov_months = gov['ReportDate'].dt.to_period('M')
+    appended = sorted(months.unique())[-4:]
+    rebuilds = []
+
+    def history() -> Loader:
+        rebuilds.append(1)
+        return rebuild(secs, gov, prospectus)
+
+    state = LoaderState.from_loader(rebuild(secs[months < appended[0]], gov[gov_months < appended[0]], prospectus),
+                                    tail_cap=10)
+    tails, sizes = [], []
+    for month in appended:
+        rows = append_month(secs[months == month].copy(), gov[gov_months == month].copy(), state, prospectus,
+                            rebuild=history)
+        expected = rebuild(secs[months <= month], gov[gov_months <= month], prospectus).full_dataset
+        pd.testing.assert_frame_equal(get_security_rows(rows, month), get_security_rows(expected, month))
+        state.save(str(tmp_path / 'state.pkl'))
+        tails.append(len(state.liquidity_tail))
+        sizes.append(os.path.getsize(tmp_path / 'state.pkl'))
+
+    # past the cap the threshold is read from the history, the state does not grow
+    assert tails == [10] * len(appended) and rebuilds
+    assert max(sizes) - min(sizes) < 0.01 * max(sizes)
+    with pytest.raises(Exception, match='too few'):
+        state.get_liquidity_threshold(np.ones(1000))
+
+
+def test_exported_dataset_is_read_and_scored_by_month(tmp_path, ranked):
+    full_dataset = rebuild(*ranked).full_dataset
+    path = str(tmp_path / 'data_for_convex.csv')
+    export_for_convex(full_dataset, path)
+
+    secs, gov, _ = ranked
+    expected = sorted(pd.concat([secs['ReportDate'], gov['ReportDate']]).dt.to_period('M').astype(str).unique())
+    assert [month for month, _ in read_months(path)] == expected
+    model = load(read_months(path))
+    predictions = predict(model, read_months(path))
+    assert sorted(predictions['month'].astype(str).unique()) == expected[1:]
+    assert predictions['M_pred'].notna().mean() > 0.9
+
+
+def test_appended_month_is_added_to_the_convex_file(tmp_path, ranked):
+    secs, gov, prospectus = ranked
+    months = secs['ReportDate'].dt.to_period('M')
+    gov_months = gov['ReportDate'].dt.to_period('M')
+    last = months.max()
+    path = str(tmp_path / 'data_for_convex.csv')
+    history = rebuild(secs[months < last], gov[gov_months < last], prospectus, compact=True)
+    export_for_convex(history.full_dataset, path)
+
+    state = LoaderState.from_loader(history)
+    rows = append_month_to_convex(secs[months == last].copy(), gov[gov_months == last].copy(), state, path,
+                                  prospectus, compact=True)
+    written = pd.read_csv(path, index_col=0)
+    assert list(written.index) == list(range(len(history.full_dataset) + len(rows)))
+    assert written['month'].iloc[-len(rows):].eq(str(last)).all()
+    assert [month for month, _ in read_months(path)][-1] == str(last)
+
+
+def test_compact_dataset_matches_the_64_bit_one(ranked):
+    # the same government bond sample in both builds
+    np.random.seed(0)
+    compact = rebuild(*ranked, compact=True).full_dataset
+    np.random.seed(0)
+    default = rebuild(*ranked).full_dataset
+    for column, dtype in LOADER_COLUMNS_DTYPES.items():
+        if column in compact:
+            assert compact[column].dtype == dtype
+    assert compact.memory_usage(deep=True).sum() < 0.6 * default.memory_usage(deep=True).sum()
+
+    default['month'] = default['month'].map(lambda month: month.ordinal)
+    pd.testing.assert_frame_equal(compact, default, check_dtype=False, check_categorical=False, rtol=1e-6)
+    # the RNPD inputs are not narrowed
+    np.testing.assert_array_equal(compact['RNPD'], default['RNPD'])
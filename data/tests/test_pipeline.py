@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.const import RANKED_FILE_COLUMNS, RANK_COLUMN, HAZARD_RATE_COL, AMIHOOD_LIQUIDITY_COLUMN
+from data.data_loader import Loader
+from data.pipeline import LoaderPipeline, get_stages
+
+STAGES = ['ranked_data', 'prospectus', 'liquidity_premium', 'full_dataset', 'rnpd']
+
+
+def make_ranked(rows: int, securities: range, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({column: rng.normal(2, 1, rows) for column in RANKED_FILE_COLUMNS})
+    df['ReportDate'] = pd.to_datetime('2020-01-31') + pd.to_timedelta(rng.integers(0, 180, rows), unit='D')
+    df['SecurityID'] = rng.choice(securities, rows)
+    df['IssuerName'] = 'issuer_' + (df['SecurityID'] % 7).astype(str)
+    df['IssuerSuperSectorName'] = 'sector'
+    df[RANK_COLUMN] = rng.integers(1, 29, rows)
+    df[AMIHOOD_LIQUIDITY_COLUMN] = rng.lognormal(0, 1, rows)
+    df[HAZARD_RATE_COL] = rng.uniform(0, 1, rows)
+    return df
+
+
+@pytest.fixture
+def files(tmp_path) -> dict:
+    make_ranked(300, range(100, 140), 0).to_excel(tmp_path / 'secs.xlsx', index=False)
+    make_ranked(50, range(1, 5), 1).to_excel(tmp_path / 'gov.xlsx', index=False)
+    pd.DataFrame({'SecurityID': range(100, 140), 'GuaranteeID': 0, 'NegativePledgeID': 0, 'SeniorityID': 1})\
+        .to_excel(tmp_path / 'prospectus.xlsx', sheet_name='prospectus', index=False)
+    return {'gov_file_path': str(tmp_path / 'gov.xlsx'),
+            'sec_file_path': str(tmp_path / 'secs.xlsx'),
+            'prospectus_file': {'path': str(tmp_path / 'prospectus.xlsx'), 'sheet': 'prospectus'}}
+
+
+def test_current_stages_are_skipped(tmp_path, files):
+    pipeline = LoaderPipeline(get_stages(**files, gov_sample_size=20), checkpoint_dir=str(tmp_path / 'checkpoints'))
+    full_dataset = pipeline.run().full_dataset
+    assert pipeline.ran == STAGES and 'RNPD' in full_dataset
+
+    pipeline = LoaderPipeline(get_stages(**files, gov_sample_size=20), checkpoint_dir=str(tmp_path / 'checkpoints'))
+    pd.testing.assert_frame_equal(pipeline.run().full_dataset, full_dataset)
+    assert pipeline.ran == [] and pipeline.loader.secs is None
+
+    # only the stages from full_dataset on depend on the gov sample size
+    pipeline = LoaderPipeline(get_stages(**files, gov_sample_size=30), checkpoint_dir=str(tmp_path / 'checkpoints'))
+    assert len(pipeline.run().full_dataset) == len(full_dataset) + 10
+    assert pipeline.ran == ['full_dataset', 'rnpd']
+    assert 'liquidity_premium_ami' in pipeline.get('secs')
+    assert 'liquidity_premium_ami' not in pipeline.get('secs', until='prospectus')
+
+
+def test_failing_stage_raises(tmp_path, files):
+    files['prospectus_file'] = {'path': str(tmp_path / 'missing.xlsx'), 'sheet': 'prospectus'}
+    pipeline = LoaderPipeline(get_stages(**files), checkpoint_dir=str(tmp_path / 'checkpoints'))
+    with pytest.raises(Exception, match='prospectus'):
+        pipeline.run()
+    assert pipeline.ran == ['ranked_data']
+
+
+def test_compact_and_64_bit_runs_keep_their_own_checkpoints(tmp_path, files, monkeypatch):
+    # a headless run never reaches plt.show
+    monkeypatch.setattr('matplotlib.pyplot.show', lambda: pytest.fail('plt.show called'))
+    checkpoints = str(tmp_path / 'checkpoints')
+    compact = LoaderPipeline(get_stages(**files), checkpoint_dir=checkpoints, loader=Loader(compact=True)).run()\
+        .full_dataset
+    pipeline = LoaderPipeline(get_stages(**files), checkpoint_dir=checkpoints, loader=Loader(compact=False))
+    default = pipeline.run().full_dataset
+    assert pipeline.ran == STAGES
+    assert compact['month'].dtype == 'int32' and isinstance(default['month'].iloc[0], pd.Period)
@@ -1,60 +1,126 @@
+import bisect
+import warnings
+import numpy as np
 import pandas as pd
 from typing import List, Optional, Dict
-from datetime import datetime
 from const import REQUIRED_SAMPLES
 
 
-class Sample:
-    def __init__(self, month: datetime.date, group: int, rnpd: float, duration: int):
-        self.month = month
-        self.group = group # ranging between 1-12 possible groups(M)
-        self.rnpd = rnpd  #  rnpd calculated before in the pipeline
-        self.duration = duration  # rounded monthly value of DurationBruto
-
-
-class Duration:
-    def __init__(self, group:int, duration: int, samples: List[Sample]):
-        self.group = group
-        self.duration = duration
-        self.samples = []
-        self.set_multiple_samples(samples)
-
-    def get_oldest_sample(self) -> Optional[Sample]:
-        return min(self.samples, key=lambda sample: sample.month) if self.samples else None
-
-    def set_new_sample(self, sample: Sample):
-        if len(self.samples) < REQUIRED_SAMPLES[self.group]:
-            self.samples.append(sample)
-        else:
-            oldest_sample : Optional[Sample] = self.get_oldest_sample()
-            self.samples.remove(oldest_sample)
-            self.samples.append(sample)
-
-    def set_multiple_samples(self, samples: List[Sample]):
-        for sam in samples:
-            if sam.group == self.group and sam.duration == self.duration:
-                self.set_new_sample(sam)
-
-    def get_list_len(self):
-        return len(self.samples)
-
-
-class M:
-    def __init__(self, group: int):
-        self.group = group
-        self.durations: Optional[dict[int, Duration]] = {}
-
-    def update_items(self, data: pd.DataFrame):
-        # Filter rows where column M matches the current group.
-        df = data[data['M'] == self.group].copy()
-
-        # Group the DataFrame by duration (x) and create Sample objects for each group.
-        samples = df.groupby('Duration').apply(
-                        lambda group: [Sample(row['month'], row['M'], row['Rnpd'], row['Duration'])
-                        for index, row in group.iterrows()])
-        if not df.empty:
-            for duration_index in sorted(df['Duration'].unique()):
-                if not duration_index in self.durations.keys():
-                    self.durations[duration_index] = Duration(self.group, duration_index, samples.loc[duration_index])
-                else:
-                    self.durations[duration_index].set_multiple_samples(samples.loc[duration_index])
+def month_ordinals(months) -> np.ndarray:
+    # monthly period ordinals of 'YYYY-MM' strings, dates or periods - parsed once per distinct month
+    codes, uniques = pd.factorize(pd.Series(months).astype(str))
+    return pd.PeriodIndex(uniques, freq='M').asi8[codes]
+
+
+class SampleStore:
+    """
+    Sample windows of all (group, duration) cells in preallocated arrays of shape
+    (groups x durations x max(REQUIRED_SAMPLES)), holding month ordinals and rnpd values.
+    Each cell is a ring buffer of REQUIRED_SAMPLES[group] slots - a new sample overwrites the oldest one,
+    which is the retention of the former per-object windows (benchmarks/bench_ingest.py) as long as months
+    are added in chronological order.
+    The median table is kept between calls and only the cells touched since the last call are recomputed.
+    With order_statistics, each cell also keeps its values in a sorted list (bisect insert and delete),
+    so its median is patched on every insert or eviction instead - useful for small, frequent updates.
+    """
+
+    def __init__(self, required_samples: Dict[int, int] = REQUIRED_SAMPLES, order_statistics: bool = False):
+        self.required_samples = required_samples
+        self.order_statistics: bool = order_statistics
+        self.depth: int = max(required_samples.values())
+        self.groups: np.ndarray = np.array([])  # labels in order of first appearance
+        self.durations: np.ndarray = np.array([])
+        self.windows: np.ndarray = np.zeros(0, dtype=int)  # window size per group
+        self.months: np.ndarray = np.zeros((0, 0, self.depth), dtype=np.int64)
+        self.rnpds: np.ndarray = np.full((0, 0, self.depth), np.nan)
+        self.heads: np.ndarray = np.zeros((0, 0), dtype=int)  # next slot to overwrite per cell
+        self.counts: np.ndarray = np.zeros((0, 0), dtype=int)
+        self.medians: np.ndarray = np.full((0, 0), np.nan)
+        self.dirty: np.ndarray = np.zeros((0, 0), dtype=bool)  # cells whose median is out of date
+        self.sorted_windows: Dict[tuple, List[float]] = {}
+
+    def grow(self, new_groups: np.ndarray, new_durations: np.ndarray):
+        if len(new_groups) == 0 and len(new_durations) == 0:
+            return
+        pad = ((0, len(new_groups)), (0, len(new_durations)))
+        self.months = np.pad(self.months, pad + ((0, 0),), constant_values=-1)
+        self.rnpds = np.pad(self.rnpds, pad + ((0, 0),), constant_values=np.nan)
+        self.heads = np.pad(self.heads, pad)
+        self.counts = np.pad(self.counts, pad)
+        self.medians = np.pad(self.medians, pad, constant_values=np.nan)
+        self.dirty = np.pad(self.dirty, pad)
+        self.windows = np.append(self.windows, [self.required_samples[group] for group in new_groups]).astype(int)
+        self.groups = np.append(self.groups, new_groups)
+        self.durations = np.append(self.durations, new_durations)
+
+    def add(self, groups: np.ndarray, durations: np.ndarray, months: np.ndarray, rnpds: np.ndarray):
+        # rows without a group or a duration don't belong to any cell
+        groups, durations = np.asarray(groups, dtype=float), np.asarray(durations, dtype=float)
+        keep = ~(np.isnan(groups) | np.isnan(durations))
+        groups, durations = groups[keep], durations[keep]
+        months, rnpds = np.asarray(months)[keep], np.asarray(rnpds, dtype=float)[keep]
+        if len(groups) == 0:
+            return
+
+        self.grow(np.setdiff1d(np.unique(groups), self.groups), np.setdiff1d(np.unique(durations), self.durations))
+        g = pd.Index(self.groups).get_indexer(groups)
+        d = pd.Index(self.durations).get_indexer(durations)
+
+        # order the new samples by cell, keeping their arrival order inside a cell
+        order = np.argsort(g * len(self.durations) + d, kind='stable')
+        g, d, months, rnpds = g[order], d[order], months[order], rnpds[order]
+        starts = np.flatnonzero(np.r_[True, (np.diff(g) != 0) | (np.diff(d) != 0)])
+        sizes = np.diff(np.r_[starts, len(g)])
+        rank = np.arange(len(g)) - np.repeat(starts, sizes)  # k-th new sample of its cell
+        cell_g, cell_d = g[starts], d[starts]
+        windows = self.windows[g]
+
+        # samples that later samples of the same batch would evict are never written
+        written = rank >= np.repeat(sizes, sizes) - windows
+        slots = (self.heads[g, d] + rank) % windows
+        g, d, slots, months, rnpds = g[written], d[written], slots[written], months[written], rnpds[written]
+        if self.order_statistics:
+            self.update_sorted_windows(g, d, self.rnpds[g, d, slots], rnpds)
+        self.months[g, d, slots] = months
+        self.rnpds[g, d, slots] = rnpds
+
+        if not self.order_statistics:
+            self.dirty[cell_g, cell_d] = True
+        self.heads[cell_g, cell_d] = (self.heads[cell_g, cell_d] + sizes) % self.windows[cell_g]
+        self.counts[cell_g, cell_d] = np.minimum(self.counts[cell_g, cell_d] + sizes, self.windows[cell_g])
+
+    def update_sorted_windows(self, g: np.ndarray, d: np.ndarray, evicted: np.ndarray, added: np.ndarray):
+        # evicted - values overwritten by the added ones (nan for empty slots), nan values are not kept
+        for cell_g, cell_d, old, new in zip(g, d, evicted, added):
+            window = self.sorted_windows.setdefault((cell_g, cell_d), [])
+            if not np.isnan(old):
+                del window[bisect.bisect_left(window, old)]
+            if not np.isnan(new):
+                bisect.insort(window, new)
+            n = len(window)
+            if n == 0:
+                self.medians[cell_g, cell_d] = np.nan
+            elif n % 2:
+                self.medians[cell_g, cell_d] = window[n // 2]
+            else:
+                self.medians[cell_g, cell_d] = (window[n // 2 - 1] + window[n // 2]) / 2
+
+    def get_medians(self) -> np.ndarray:
+        # (groups x durations) median rnpd of every cell, nan for cells without samples.
+        # the table is patched in place - copy it to keep a snapshot
+        if self.dirty.any():
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', category=RuntimeWarning)
+                self.medians[self.dirty] = np.nanmedian(self.rnpds[self.dirty], axis=1)
+            self.dirty[:] = False
+        return self.medians
+
+    def to_frame(self) -> Optional[pd.DataFrame]:
+        # medians of the non-empty cells, sorted by group and duration
+        g, d = np.nonzero(self.counts)
+        if len(g) == 0:
+            return None
+        df = pd.DataFrame({'group_index': self.groups[g],
+                           'duration_index': self.durations[d],
+                           'rnpd': self.get_medians()[g, d]})
+        return df.sort_values(['group_index', 'duration_index'], ignore_index=True)
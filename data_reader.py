@@ -0,0 +1,123 @@
+import os
+import shutil
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from const import (EXPECTED_DATA_COLUMNS, DATA_COLUMNS_RENAME, DATA_COLUMNS_DTYPES, READ_CHUNK_ROWS,
+                   PARTITION_ROW_COLUMN)
+
+MonthlyData = Iterable[Tuple[str, pd.DataFrame]]
+
+
+def get_source_columns(columns: Optional[List[str]]) -> Tuple[callable, dict]:
+    # usecols and dtype arguments of read_csv, accepting both the csv's own and the renamed column names.
+    # columns=None is every column but the csv's unnamed index, under its own name. The partitions' row
+    # column is always read
+    if columns is None:
+        usecols = lambda column: not column.startswith('Unnamed:')
+    else:
+        usecols = lambda column: DATA_COLUMNS_RENAME.get(column, column) in columns or column == PARTITION_ROW_COLUMN
+    dtype = dict(DATA_COLUMNS_DTYPES)
+    dtype.update({DATA_COLUMNS_RENAME[source]: dtype[source] for source in dtype if source in DATA_COLUMNS_RENAME})
+    return usecols, dtype
+
+
+def read_csv(path: str, columns: Optional[List[str]] = EXPECTED_DATA_COLUMNS, **kwargs):
+    usecols, dtype = get_source_columns(columns)
+    return pd.read_csv(path, usecols=usecols, dtype=dtype, **kwargs)
+
+
+def get_csv_columns(path: str) -> List[str]:
+    # header of a csv, without its unnamed index
+    return [column for column in pd.read_csv(path, nrows=0).columns if not column.startswith('Unnamed:')]
+
+
+def get_partitions_dir(path: str) -> str:
+    return os.path.splitext(path)[0] + '_months'
+
+
+def partition_months(path: str,
+                     partitions_dir: str,
+                     chunksize: int = READ_CHUNK_ROWS) -> str:
+    # one chunked pass over a csv in any row order, appending each month's rows to <partitions_dir>/<month>.csv.
+    # partitions keep every column under its own name and each row's position in the csv, so any column subset
+    # can be read back
+    tmp_dir = partitions_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for chunk in read_csv(path, None, chunksize=chunksize):
+        for month, frame in chunk.groupby('month', sort=False, observed=True):
+            month_path = os.path.join(tmp_dir, f'{month}.csv')
+            frame.to_csv(month_path, mode='a', header=not os.path.exists(month_path), index_label=PARTITION_ROW_COLUMN)
+    shutil.rmtree(partitions_dir, ignore_errors=True)
+    os.replace(tmp_dir, partitions_dir)
+    return partitions_dir
+
+
+def read_partition(path: str, columns: Optional[List[str]] = EXPECTED_DATA_COLUMNS) -> pd.DataFrame:
+    # one <month>.csv or <month>.parquet partition file, indexed by the rows' position in the source csv.
+    # requested columns come renamed to EXPECTED_DATA_COLUMNS, columns=None keeps the csv's own names
+    if path.endswith('.parquet'):
+        frame = pd.read_parquet(path, columns=columns)
+    else:
+        # the partitions hold the repr of the values parsed from the source csv, read back exactly
+        frame = read_csv(path, columns, float_precision='round_trip')
+    if PARTITION_ROW_COLUMN in frame:
+        frame = frame.set_index(PARTITION_ROW_COLUMN).rename_axis(None)
+    return frame if columns is None else frame.rename(columns=DATA_COLUMNS_RENAME)
+
+
+def get_partition_paths(partitions_dir: str) -> Dict[str, str]:
+    # month -> partition file, in month order
+    return {os.path.splitext(name)[0]: os.path.join(partitions_dir, name)
+            for name in sorted(os.listdir(partitions_dir)) if os.path.splitext(name)[1] in ('.csv', '.parquet')}
+
+
+def iter_partitions(partitions_dir: str,
+                    columns: Optional[List[str]] = EXPECTED_DATA_COLUMNS) -> Iterator[Tuple[str, pd.DataFrame]]:
+    # month partitions as <month>.csv or <month>.parquet files, yielded in month order
+    for month, path in get_partition_paths(partitions_dir).items():
+        yield month, read_partition(path, columns)
+
+
+def is_partitioned(path: str, partitions_dir: str) -> bool:
+    # partitions newer than the csv and written with the row positions and every column of the csv, unrenamed
+    if not os.path.isdir(partitions_dir) or os.path.getmtime(partitions_dir) < os.path.getmtime(path):
+        return False
+    paths = list(get_partition_paths(partitions_dir).values())
+    return not paths or list(pd.read_csv(paths[0], nrows=0).columns) == [PARTITION_ROW_COLUMN, *get_csv_columns(path)]
+
+
+def get_partitions(path: str, chunksize: int = READ_CHUNK_ROWS) -> str:
+    # the month partitions directory of `path` - itself when a directory, else the csv's partitions,
+    # (re)written when missing, older than the csv or in the former layout
+    if os.path.isdir(path):
+        return path
+    partitions_dir = get_partitions_dir(path)
+    if not is_partitioned(path, partitions_dir):
+        partition_months(path, partitions_dir, chunksize)
+    return partitions_dir
+
+
+def read_months(path: str,
+                columns: Optional[List[str]] = EXPECTED_DATA_COLUMNS,
+                chunksize: int = READ_CHUNK_ROWS) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+    Streams the preprocessed data one month at a time, reading only `columns` (every column under the csv's
+    own name with None), the model's columns with compact dtypes, indexed by the rows' position in the csv.
+    `path` is either a directory of month partitions or a csv, which is partitioned by month on first
+    read (and again whenever the csv is newer than its partitions), so memory is bounded by a month of
+    data plus a read chunk.
+    """
+    return iter_partitions(get_partitions(path, chunksize), columns)
+
+
+def split_months(data: pd.DataFrame) -> Iterator[Tuple[str, pd.DataFrame]]:
+    # in-memory frame split by month in a single groupby pass
+    for month, frame in data.groupby(data['month'].astype(str), sort=True):
+        yield month, frame
+
+
+def iter_months(data: Union[pd.DataFrame, MonthlyData]) -> Iterator[Tuple[str, pd.DataFrame]]:
+    return split_months(data) if isinstance(data, pd.DataFrame) else iter(data)
@@ -0,0 +1,91 @@
+import cProfile
+import json
+import pstats
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class Metrics:
+    """
+    Timers and counters of a run, one record per month. Timers are in seconds (`<stage>_time`) and add
+    up over repeated calls of a stage for the same month, counters add up the same way.
+    """
+
+    def __init__(self):
+        self.records: Dict[str, Dict] = defaultdict(dict)
+
+    @contextmanager
+    def timer(self, month: str, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(month, f'{stage}_time', time.perf_counter() - start)
+
+    def add(self, month: str, name: str, value=1):
+        self.records[month][name] = self.records[month].get(name, 0) + value
+
+    def set(self, month: str, **values):
+        self.records[month].update(values)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame.from_dict(self.records, orient='index').sort_index()
+
+    def to_json(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(dict(sorted(self.records.items())), f, indent=1,
+                      default=lambda x: x.item() if isinstance(x, np.generic) else str(x))
+
+    def to_csv(self, path: str):
+        self.to_frame().to_csv(path, index_label='month')
+
+    def dump(self, path: str):
+        # by the file extension, .json or .csv
+        if path.endswith('.json'):
+            self.to_json(path)
+        elif path.endswith('.csv'):
+            self.to_csv(path)
+        else:
+            raise ValueError(f'Metrics are dumped to .json or .csv files, not {path}')
+
+
+@contextmanager
+def profiled(kind: Optional[str] = None, output: Optional[str] = None, top: int = 25):
+    """
+    Opt-in profiling of a block: 'cprofile' prints the top cumulative call times, 'tracemalloc' the peak
+    traced memory and the top allocating lines. `output` keeps the raw pstats / snapshot file.
+    Fits run in worker processes (workers > 1) are not traced - their solver times are in the metrics.
+    """
+    if kind is None:
+        yield
+    elif kind == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if output:
+                profiler.dump_stats(output)
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(top)
+    elif kind == 'tracemalloc':
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            if output:
+                snapshot.dump(output)
+            print(f'peak traced memory: {peak / 1024 ** 2:.1f} MiB')
+            for stat in snapshot.statistics('lineno')[:top]:
+                print(stat)
+    else:
+        raise ValueError(f"Unknown profiler {kind}, use 'cprofile' or 'tracemalloc'")
@@ -1,26 +1,86 @@
+import os
 import numpy as np
 import pandas as pd
-from typing import List, Optional, Dict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Dict, Tuple, Union
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 warnings.simplefilter(action='ignore', category=DeprecationWarning)
-from convex_class import RnpdEquation
-from data_classes import M
-from const import EXPECTED_DATA_COLUMNS
+from convex_class import RnpdEquation, DurationTables
+from data_classes import SampleStore, month_ordinals
+from const import (EXPECTED_DATA_COLUMNS, WARM_START_SOLVER, RNPD_EQUATION_POLY_DEGREE, CONSTRAINT_MODE,
+                   RAW_DATA_MODE, SPILL_DIR)
+from model_store import ModelStore, get_fit_settings
+from metrics import Metrics
+
+
+def fit_monthly_models(months_data: List[Tuple[str, pd.DataFrame]],
+                       poly_degree: int = RNPD_EQUATION_POLY_DEGREE,
+                       solve_kwargs: Optional[Dict] = None,
+                       constraints: str = CONSTRAINT_MODE,
+                       initial: Optional[RnpdEquation] = None)\
+        -> List[Tuple[str, Union[RnpdEquation, Exception]]]:
+    # fits a chunk of consecutive months in order and returns the fitted equation, or the exception raised,
+    # per month. With warm_start in solve_kwargs the first month starts from the fit `initial` and every
+    # next month from the month fitted before it
+    results = []
+    for month, models_data in months_data:
+        try:
+            equation = RnpdEquation(data=models_data, month=month, poly_degree=poly_degree, constraints=constraints)
+            equation.fit_polynomial_regression(initial=initial, **(solve_kwargs or {}))
+            if initial is not None:
+                initial.solver_state = None  # only the latest fit's state is a next start
+            initial = equation
+            results.append((month, equation))
+        except Exception as E:
+            results.append((month, E))
+    return results
 
 
 class ModelData:
-    def __init__(self):
+    def __init__(self, warm_start: bool = False, solver: Optional[str] = None, order_statistics: bool = False,
+                 constraints: str = CONSTRAINT_MODE, raw_data: str = RAW_DATA_MODE, spill_dir: str = SPILL_DIR):
+        # warm_start - start every monthly fit from the coefficients and solver state of the month fitted before it
+        # solver - cvxpy solver name, defaults to cvxpy's choice (WARM_START_SOLVER when warm starting)
+        # order_statistics - keep sorted sample windows and patch medians per sample (see SampleStore)
+        # constraints - 'grid' or 'adaptive' fit constraints (see RnpdEquation)
+        # raw_data - 'keep' every month's frame in self.data, 'drop' it or 'spill' it to spill_dir once it is
+        # in the sample windows (see get_month_data)
+        if raw_data not in ('keep', 'drop', 'spill'):
+            raise ValueError(f"raw_data is 'keep', 'drop' or 'spill', not {raw_data}")
+        self.raw_data: str = raw_data
+        self.spill_dir: str = spill_dir
+        self.warm_start: bool = warm_start
+        self.constraints: str = constraints
+        self.solver: Optional[str] = WARM_START_SOLVER if warm_start and solver is None else solver
         self.data: Dict[str, pd.DataFrame] = {}
-        # each item in the dict is perpetualy updating a
-        # group class of type M. groups are ranging between 1-12
-        self.classes: Dict[int, M] = {}
+        # perpetually updated sample windows of every (group, duration) cell. groups are ranging between 1-12
+        self.samples: SampleStore = SampleStore(order_statistics=order_statistics)
         # each month is keeping a track of its own data for model calculation
         self.models_data: Dict[str, pd.DataFrame] = {}
         # each month has its own model calculated on "gold distribution"
         self.models: Dict[str, RnpdEquation] = {}
+        # months that failed to load or fit, with the exception raised
+        self.errors: Dict[str, Exception] = {}
+        # per-month timers and counters of loading, fitting and predicting (see get_metrics)
+        self.metrics: Metrics = Metrics()
+        # lookup tables of all monthly models for mixed-month batches, rebuilt once a model is added or refitted
+        self.duration_tables: Optional[DurationTables] = None
+        # lookup tables of single months, built on a month's first predict_class
+        self.month_tables: Dict[str, DurationTables] = {}
 
 
+    @classmethod
+    def from_store(cls, store: ModelStore, **kwargs) -> 'ModelData':
+        # models and models_data of every month in the store, without the sample windows
+        model = cls(**kwargs)
+        for month, key in sorted(store.index.items()):
+            equation = store.load(key, month)
+            if equation is not None:
+                model.models[month] = equation
+                model.models_data[month] = equation.data
+        return model
+
     @staticmethod
     def check_input_data(data: pd.DataFrame) -> bool:
         return all([col in EXPECTED_DATA_COLUMNS for col in data.columns])
@@ -28,53 +88,157 @@ class ModelData:
     def load_month(self, data: pd.DataFrame, month: str):
         # param1: data - df containing columns:
         # param2: month
-        # Iterate over unique classes (M)  & durations (x) in the DataFrame and load to class
+        # Load all classes (M) & durations (x) of the month to the sample windows in one columnar pass
 
         if not self.check_input_data(data):
-            print(f'data input is not with the expected columns:\n{EXPECTED_DATA_COLUMNS}')
-            exit()
+            raise ValueError(f'month {month} data input is not with the expected columns:\n{EXPECTED_DATA_COLUMNS}')
+
+        if self.raw_data == 'keep':
+            self.data[month] = data
+        elif self.raw_data == 'spill':
+            os.makedirs(self.spill_dir, exist_ok=True)
+            data.to_parquet(self.get_spill_path(month))
+
+        with self.metrics.timer(month, 'load_month'):
+            self.metrics.add(month, 'rows', len(data))
+            if data['M'].notna().any():
+                with self.metrics.timer(month, 'samples_add'):
+                    self.samples.add(groups=data['M'].values,
+                                     durations=data['Duration'].to_numpy(dtype=float),
+                                     months=month_ordinals(data['month']),
+                                     rnpds=data['Rnpd'].values)
+                with self.metrics.timer(month, 'medians'):
+                    self.models_data[month] = self.fit_current_data_to_df()
+                self.metrics.add(month, 'model_cells', len(self.models_data[month]))
 
-        self.data[month] = data
+    def get_spill_path(self, month: str) -> str:
+        return os.path.join(self.spill_dir, f'{month}.parquet')
 
-        for m in sorted(data['M'].unique()):
-            df = data[data['M']==m]
-            if not df.empty:
-                if not m in self.classes.keys():
-                    self.classes[m] = M(m)
-                self.classes[m].update_items(df)
-                self.models_data[month] = self.fit_current_data_to_df()
+    def get_month_data(self, month: str) -> Optional[pd.DataFrame]:
+        # the raw frame of a loaded month - None when it was dropped
+        if month in self.data:
+            return self.data[month]
+        if self.raw_data == 'spill' and os.path.exists(self.get_spill_path(month)):
+            return pd.read_parquet(self.get_spill_path(month))
+        return None
 
     def fit_current_data_to_df(self)\
             -> Optional[pd.DataFrame]:
-        df = []
-        for group_index, m_class in sorted(self.classes.items()):
-            for duration_index, duration_class in sorted(m_class.durations.items()):
-                d = {'group_index': group_index,
-                     'duration_index': duration_index,
-                     'rnpd': np.median([sample.rnpd for sample in duration_class.samples])
-                     }
-                df.append(d)
-        if len(df) > 0:
-            return pd.DataFrame(df)
-        else:
-            return None
+        return self.samples.to_frame()
 
     def add_monthly_model(self, month: str):
         if not self.models_data[month].empty:
             self.models[month] = RnpdEquation(data=self.models_data[month],
-                                              month=month)
-            self.models[month].fit_polynomial_regression()
+                                              month=month,
+                                              constraints=self.constraints)
+            initial = self.get_initial_model(month)
+            self.models[month].fit_polynomial_regression(initial=initial, **self.get_solve_kwargs())
+            if initial is not None:
+                initial.solver_state = None  # only the latest fit's state is a next start
+            self.metrics.set(month, **self.models[month].solver_stats)
         else:
             print(f'Month: {month} has not data to load')
 
+    def add_monthly_models(self,
+                           months: List[str],
+                           workers: int = 1,
+                           chunks_per_worker: int = 4,
+                           store: Optional[ModelStore] = None):
+        # fit the models of already loaded months - each fit depends only on models_data[month],
+        # so months are split to consecutive chunks and solved in a process pool.
+        # results are merged in month order, failures are kept in self.errors.
+        # with a store, months whose models_data was fitted before are loaded instead of solved
+        settings = get_fit_settings(constraints=self.constraints, solve_kwargs=self.get_solve_kwargs())
+        keys = {}
+        months_data = []
+        for month in sorted(months):
+            if self.models_data.get(month) is None or self.models_data[month].empty:
+                print(f'Month: {month} has not data to load')
+                continue
+            if store is not None:
+                keys[month] = store.get_key(self.models_data[month], settings)
+                cached = store.load(keys[month], month)
+                if cached is not None:
+                    self.models[month] = cached
+                    self.metrics.set(month, from_store=True, **cached.solver_stats)
+                    continue
+            months_data.append((month, self.models_data[month]))
+        if not months_data:
+            return
+
+        if workers <= 1:
+            results = fit_monthly_models(months_data, RNPD_EQUATION_POLY_DEGREE, self.get_solve_kwargs(),
+                                         self.constraints, self.get_initial_model(months_data[0][0]))
+        else:
+            chunks = [chunk.tolist() for chunk in
+                      np.array_split(np.arange(len(months_data)), min(len(months_data), workers * chunks_per_worker))]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(fit_monthly_models,
+                                           [months_data[i] for i in chunk],
+                                           RNPD_EQUATION_POLY_DEGREE,
+                                           self.get_solve_kwargs(),
+                                           self.constraints,
+                                           self.get_initial_model(months_data[chunk[0]][0]))
+                           for chunk in chunks]
+                results = [result for future in futures for result in future.result()]
+
+        for month, result in results:
+            if isinstance(result, Exception):
+                self.errors[month] = result
+            else:
+                self.models[month] = result
+                self.metrics.set(month, from_store=False, **result.solver_stats)
+                if store is not None:
+                    store.save(keys[month], result, settings)
+
+    def get_initial_model(self, month: str) -> Optional[RnpdEquation]:
+        # the latest model before `month`, the start of its warm started fit
+        previous = [fitted for fitted in self.models if fitted < month]
+        if not self.warm_start or not previous:
+            return None
+        return self.models[max(previous)]
+
+    def get_solve_kwargs(self) -> Dict:
+        kwargs = {}
+        if self.solver is not None:
+            kwargs['solver'] = self.solver
+        if self.warm_start:
+            kwargs['warm_start'] = True
+        return kwargs
+
+    def get_solver_stats(self) -> pd.DataFrame:
+        # iterations and solve time per fitted month
+        return pd.DataFrame.from_dict({month: model.solver_stats for month, model in self.models.items()},
+                                      orient='index')
+
+    def get_metrics(self) -> pd.DataFrame:
+        # one record per month - load, fit and predict timers and counters, the solver statistics and status
+        return self.metrics.to_frame()
+
 
     def plot_monthly_model(self, month: str):
         if month in self.models:
-            self.models[month].plot_graphs()
+            self.models[month].plot_graphs(month)
         else:
             print(f'Month: {month} was not calculated for a model')
 
 
+    def get_duration_tables(self) -> DurationTables:
+        # a refit replaces its model's BoundaryTable, so the tables are current while they hold the same ones
+        months = sorted(self.models)
+        tables = [self.models[month].get_boundary_table() for month in months]
+        if self.duration_tables is None or len(tables) != len(self.duration_tables.tables) or \
+                any(table is not cached for table, cached in zip(tables, self.duration_tables.tables)):
+            self.duration_tables = DurationTables(months, tables)
+        return self.duration_tables
+
+    def get_month_tables(self, month: str) -> DurationTables:
+        # the tables of one month's model only, current while they hold its BoundaryTable
+        table = self.models[month].get_boundary_table()
+        if month not in self.month_tables or self.month_tables[month].tables[0] is not table:
+            self.month_tables[month] = DurationTables([month], [table])
+        return self.month_tables[month]
+
     def predict_class(self,
                       month: str,
                       data: pd.DataFrame):
@@ -82,9 +246,36 @@ class ModelData:
         try:
             pred_model = self.models[month]
             if pred_model:
-                return data.apply(lambda x: pred_model.get_matching_group(x['Duration'], x['Rnpd']), axis=1)
+                with self.metrics.timer(month, 'predict'):
+                    tables = self.get_month_tables(month)
+                    predicted = pd.Series(tables.classify(np.zeros(len(data), dtype=int),
+                                                          data['Duration'].to_numpy(dtype=float),
+                                                          data['Rnpd'].values),
+                                          index=data.index)
+                self.metrics.add(month, 'predicted_rows', len(data))
+                return predicted
         except KeyError:
             print(f'Month {month} was not calculated for a model')
 
-
-
+    def predict_classes(self,
+                        months: np.ndarray,
+                        data: pd.DataFrame) -> pd.Series:
+        # rows of mixed months in one call - months[i] is the model month of row i.
+        # rows of months without a model are left NaN
+        codes, uniques = pd.factorize(np.asarray(months))
+        uniques = [str(month) for month in uniques]
+        modelled_months = np.array([month in self.models for month in uniques] + [False])  # code -1 - NaN
+        modelled = modelled_months[codes]
+        predicted = pd.Series(np.nan, index=data.index)
+        if modelled.any():
+            tables = self.get_duration_tables()
+            month_index = np.array([tables.month_index.get(month, -1) for month in uniques])
+            predicted[modelled] = tables.classify(month_index[codes[modelled]],
+                                                  data['Duration'].to_numpy(dtype=float)[modelled],
+                                                  data['Rnpd'].values[modelled])
+        for code, rows in zip(*np.unique(codes, return_counts=True)):
+            if modelled_months[code]:
+                self.metrics.add(uniques[code], 'predicted_rows', int(rows))
+            else:
+                print(f'Month {uniques[code] if code >= 0 else None} was not calculated for a model')
+        return predicted
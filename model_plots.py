@@ -0,0 +1,217 @@
+"""
+Headless rendering of the monthly model curves for the review pack. The curves of every month are evaluated
+in one pass over the shared duration grid, then drawn on Agg canvases - no pyplot, no GUI event loop - with
+one figure per worker whose lines are updated month to month (see CurvesFigure). Output is one PNG or PDF
+file per month, written by a process pool, or a single multipage PDF or animated GIF. Run from the repository root:
+
+    python model_plots.py --output plots/                  # plots/<month>.png
+    python model_plots.py --output plots/ --format pdf     # plots/<month>.pdf
+    python model_plots.py --output review_pack.pdf         # one page per month
+    python model_plots.py --output curves.gif
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from PIL import Image
+
+from convex_class import RnpdEquation, constraint_grid, evaluate_polynomials
+from data_reader import read_months
+from model_class import ModelData
+from model_store import ModelStore
+
+PLOT_FORMATS = ('png', 'pdf')
+PAGE_FORMATS = ('.pdf', '.gif')
+
+
+class MonthlyCurves:
+    # every month's group curves on the shared x grid - values is (months x points x groups), nan for the
+    # groups a month has no curve for
+    def __init__(self, months: List[str], labels: np.ndarray, x: np.ndarray, values: np.ndarray):
+        self.months: List[str] = months
+        self.labels: np.ndarray = labels
+        self.x: np.ndarray = x
+        self.values: np.ndarray = values
+
+    def get_ylim(self) -> Tuple[float, float]:
+        # one scale for all the months, so the pages are comparable
+        low, high = np.nanmin(self.values), np.nanmax(self.values)
+        margin = 0.05 * (high - low) or 0.05
+        return low - margin, high + margin
+
+
+def get_curves(models: Dict[str, RnpdEquation], x: Optional[np.ndarray] = None) -> MonthlyCurves:
+    # the coefficients of all months are stacked to one matrix, padded with zero high-order terms,
+    # and evaluated with a single evaluate_polynomials call
+    x = constraint_grid() if x is None else np.asarray(x, dtype=float)
+    months = sorted(models)
+    matrices = [models[month].get_coefficient_matrix() for month in months]
+    labels = np.unique(np.concatenate([month_labels for month_labels, _ in matrices]))
+    degree = max(coefficients.shape[1] for _, coefficients in matrices)
+
+    stacked = np.zeros((len(months), len(labels), degree))
+    present = np.zeros((len(months), len(labels)), dtype=bool)
+    for i, (month_labels, coefficients) in enumerate(matrices):
+        rows = np.searchsorted(labels, month_labels)
+        stacked[i, rows, :coefficients.shape[1]] = coefficients
+        present[i, rows] = True
+
+    values = evaluate_polynomials(x, stacked.reshape(-1, degree)).reshape(len(x), len(months), len(labels))
+    values = values.transpose(1, 0, 2)
+    values[~np.broadcast_to(present[:, None, :], values.shape)] = np.nan
+    return MonthlyCurves(months, labels, x, values)
+
+
+class CurvesFigure:
+    # one figure for many months - the axes, ticks and legend are laid out once, a month only replaces the
+    # lines' y data and the title. Raster output blits the lines and title over the saved background,
+    # vector output (savefig) redraws the whole figure
+    def __init__(self, labels: np.ndarray, x: np.ndarray, ylim: Tuple[float, float], dpi: int):
+        self.figure: Figure = Figure(figsize=(10, 6), dpi=dpi)
+        self.canvas: FigureCanvasAgg = FigureCanvasAgg(self.figure)
+        self.ax: Axes = self.figure.add_subplot()
+        colors = colormaps['viridis'](np.linspace(0, 0.9, len(labels)))
+        self.lines: List[Line2D] = [self.ax.plot(x, np.full(len(x), np.nan), color=color, label=f'Group {label}')[0]
+                                    for label, color in zip(labels, colors)]
+        self.ax.set_xlim(x[0], x[-1])
+        self.ax.set_ylim(*ylim)
+        self.ax.set_ylabel('RNPD')
+        self.ax.set_xlabel('Duration Index')
+        self.ax.set_title(' ')  # keeps the title's room in the layout
+        self.ax.grid(alpha=0.3)
+        self.ax.legend(loc='upper left', bbox_to_anchor=(1, 1))
+        self.figure.tight_layout()
+        self.background = None
+
+    def draw(self, month: str, values: np.ndarray):
+        for line, curve in zip(self.lines, values.T):
+            line.set_ydata(curve)
+        self.ax.set_title(f'{month} - Polynomial Regression for Risk Groups')
+
+    def to_image(self) -> Image.Image:
+        if self.background is None:
+            # animated artists are left out of the full draw, so the background is everything else
+            for artist in [*self.lines, self.ax.title]:
+                artist.set_animated(True)
+            self.canvas.draw()
+            self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.canvas.restore_region(self.background)
+        for artist in [*self.lines, self.ax.title]:
+            self.ax.draw_artist(artist)
+        return Image.frombuffer('RGBA', self.canvas.get_width_height(), self.canvas.buffer_rgba(), 'raw', 'RGBA', 0,
+                                1).convert('RGB')
+
+
+def render_chunk(months: List[str],
+                 values: np.ndarray,
+                 labels: np.ndarray,
+                 x: np.ndarray,
+                 ylim: Tuple[float, float],
+                 directory: str,
+                 plot_format: str,
+                 dpi: int) -> List[str]:
+    # worker - one figure for the whole chunk, one file per month
+    figure = CurvesFigure(labels, x, ylim, dpi)
+    paths = []
+    for month, month_values in zip(months, values):
+        figure.draw(month, month_values)
+        paths.append(os.path.join(directory, f'{month}.{plot_format}'))
+        if plot_format == 'png':
+            # fast zlib level - the flat plot areas compress well either way
+            figure.to_image().save(paths[-1], compress_level=1)
+        else:
+            figure.figure.savefig(paths[-1], format=plot_format)
+    return paths
+
+
+def render_files(curves: MonthlyCurves,
+                 directory: str,
+                 plot_format: str = 'png',
+                 workers: int = 1,
+                 dpi: int = 100) -> List[str]:
+    # one file per month, months split to consecutive chunks over a process pool
+    if plot_format not in PLOT_FORMATS:
+        raise ValueError(f'plot_format is one of {PLOT_FORMATS}, not {plot_format}')
+    os.makedirs(directory, exist_ok=True)
+    ylim = curves.get_ylim()
+    chunks = [chunk for chunk in np.array_split(np.arange(len(curves.months)), max(min(len(curves.months), workers), 1))
+              if len(chunk)]
+    args = [([curves.months[i] for i in chunk], curves.values[chunk], curves.labels, curves.x, ylim, directory,
+             plot_format, dpi) for chunk in chunks]
+    if workers <= 1:
+        return [path for chunk_args in args for path in render_chunk(*chunk_args)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(render_chunk, *chunk_args) for chunk_args in args]
+        return [path for future in futures for path in future.result()]
+
+
+def render_pages(curves: MonthlyCurves, path: str, dpi: int = 100, fps: float = 2) -> str:
+    # every month in one file - a page of a pdf or a frame of a gif
+    figure = CurvesFigure(curves.labels, curves.x, curves.get_ylim(), dpi)
+    if path.endswith('.pdf'):
+        with PdfPages(path) as pdf:
+            for month, values in zip(curves.months, curves.values):
+                figure.draw(month, values)
+                pdf.savefig(figure.figure)
+    elif path.endswith('.gif'):
+        frames = []
+        for month, values in zip(curves.months, curves.values):
+            figure.draw(month, values)
+            frames.append(figure.to_image())
+        # the months share their colors, so one palette is quantized once instead of per frame
+        palette = frames[0].quantize(colors=255, method=Image.Quantize.MEDIANCUT)
+        frames = [frame.quantize(palette=palette, dither=Image.Dither.NONE) for frame in frames]
+        frames[0].save(path, save_all=True, append_images=frames[1:], duration=round(1000 / fps), loop=0)
+    else:
+        raise ValueError(f'path ends with one of {PAGE_FORMATS}, not {path}')
+    return path
+
+
+def render_monthly_curves(models: Dict[str, RnpdEquation],
+                          output: str,
+                          plot_format: str = 'png',
+                          workers: int = 1,
+                          dpi: int = 100) -> List[str]:
+    # a .pdf or .gif output is a single file of all the months, anything else a directory of month files
+    curves = get_curves(models)
+    if output.endswith(PAGE_FORMATS):
+        return [render_pages(curves, output, dpi)]
+    return render_files(curves, output, plot_format, workers, dpi)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', required=True, help='a directory of month files, or a .pdf / .gif of all months')
+    parser.add_argument('--format', choices=PLOT_FORMATS, default='png', help='the month files format')
+    parser.add_argument('--data', help='fit the months of this golden distribution instead of using the model store')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--dpi', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    if args.data:
+        model = ModelData(raw_data='drop')
+        for month, month_data in read_months(args.data):
+            model.load_month(data=month_data, month=month)
+        model.add_monthly_models(months=list(model.models_data), workers=args.workers, store=ModelStore())
+    else:
+        model = ModelData.from_store(ModelStore())
+    if not model.models:
+        print('no monthly models to render')
+        return
+
+    start = time.perf_counter()
+    paths = render_monthly_curves(model.models, args.output, args.format, args.workers, args.dpi)
+    print(f'{len(model.models)} months rendered to {len(paths)} files in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from const import (RNPD_EQUATION_POLY_DEGREE, CONVEX_EPSILON_BETWEEN_GROUPS, LAMBDA_REG,
+                   CONVEX_DURATION_RANGE, CONVEX_GRID_POINTS, MODEL_STORE_DIR, MODEL_STORE_MAX_BYTES,
+                   CONSTRAINT_MODE, CUTTING_PLANE_COARSE_POINTS, CUTTING_PLANE_FINE_POINTS, CUTTING_PLANE_TOLERANCE,
+                   CUTTING_PLANE_MAX_ROUNDS)
+from convex_class import RnpdEquation
+
+MODELS_DATA_COLUMNS = ['group_index', 'duration_index', 'rnpd']
+
+
+def get_fit_settings(poly_degree: int = RNPD_EQUATION_POLY_DEGREE,
+                     epsilon: float = CONVEX_EPSILON_BETWEEN_GROUPS,
+                     lambda_reg: float = LAMBDA_REG,
+                     constraints: str = CONSTRAINT_MODE,
+                     solve_kwargs: Optional[Dict] = None) -> Dict:
+    # everything besides models_data that changes the fitted coefficients - solve_kwargs are the
+    # cvx.Problem.solve arguments (solver, warm_start) of ModelData.get_solve_kwargs
+    settings = {'poly_degree': poly_degree,
+                'epsilon': epsilon,
+                'lambda_reg': lambda_reg,
+                'duration_range': list(CONVEX_DURATION_RANGE),
+                'grid_points': CONVEX_GRID_POINTS}
+    if constraints != 'grid':
+        # grid settings keep their key, so the entries stored before the constraint modes still load
+        settings.update(constraints=constraints,
+                        coarse_points=CUTTING_PLANE_COARSE_POINTS,
+                        fine_points=CUTTING_PLANE_FINE_POINTS,
+                        tolerance=CUTTING_PLANE_TOLERANCE,
+                        max_rounds=CUTTING_PLANE_MAX_ROUNDS)
+    if solve_kwargs:
+        # the default solver keeps its key, a fit from another solver or a warm start is stored apart
+        settings['solve_kwargs'] = solve_kwargs
+    return settings
+
+
+class ModelStore:
+    """
+    On-disk cache of monthly RnpdEquation fits, one compressed npz file per entry holding the
+    coefficients, the models_data table they were fitted on, the fit settings and the solver stats.
+    Entries are keyed by a hash of models_data and the settings, so a month whose inputs did not change
+    is loaded instead of refitted. index.json maps every month to the key of its latest fit, and the
+    least recently used entries are evicted once the store grows over max_bytes.
+    """
+
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, path: str = MODEL_STORE_DIR, max_bytes: int = MODEL_STORE_MAX_BYTES):
+        self.path: str = path
+        self.max_bytes: int = max_bytes
+        os.makedirs(path, exist_ok=True)
+        self.index: Dict[str, str] = self.read_index()
+
+    @staticmethod
+    def get_key(models_data: pd.DataFrame, settings: Dict) -> str:
+        digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+        digest.update(np.ascontiguousarray(models_data[MODELS_DATA_COLUMNS].to_numpy(dtype=float)).tobytes())
+        return digest.hexdigest()
+
+    def get_entry_path(self, key: str) -> str:
+        return os.path.join(self.path, f'{key}.npz')
+
+    def read_index(self) -> Dict[str, str]:
+        index_path = os.path.join(self.path, self.INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                return json.load(f)
+        return {}
+
+    def get_index_mtime(self) -> Optional[int]:
+        # every save rewrites the index, so its modification time changes with each new fit
+        index_path = os.path.join(self.path, self.INDEX_FILE)
+        return os.stat(index_path).st_mtime_ns if os.path.exists(index_path) else None
+
+    def replace_file(self, path: str, write, mode: str = 'wb'):
+        # write(f) to a temporary file of its own, then move it over path - concurrent writers sharing the
+        # store (backtest and sweep workers) never write to the same temporary file
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, mode) as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def write_index(self):
+        self.replace_file(os.path.join(self.path, self.INDEX_FILE),
+                          lambda f: json.dump(self.index, f, indent=1, sort_keys=True),
+                          mode='w')
+
+    def load(self, key: str, month: str) -> Optional[RnpdEquation]:
+        entry_path = self.get_entry_path(key)
+        if not os.path.exists(entry_path):
+            return None
+        with np.load(entry_path) as entry:
+            settings = json.loads(str(entry['settings']))
+            models_data = pd.DataFrame(entry['models_data'], columns=MODELS_DATA_COLUMNS)
+            equation = RnpdEquation(data=models_data, month=month, poly_degree=settings['poly_degree'],
+                                    constraints=settings.get('constraints', 'grid'))
+            equation.coeffs = {int(group): coeffs for group, coeffs in zip(entry['labels'], entry['coefficients'])}
+            equation.solver_stats = json.loads(str(entry['solver_stats']))
+        os.utime(entry_path)  # mark as recently used for the eviction
+        return equation
+
+    def save(self, key: str, equation: RnpdEquation, settings: Dict):
+        labels, coefficients = equation.get_coefficient_matrix()
+
+        def write_entry(f):
+            np.savez_compressed(f,
+                                labels=labels,
+                                coefficients=coefficients,
+                                models_data=equation.data[MODELS_DATA_COLUMNS].to_numpy(dtype=float),
+                                settings=json.dumps(settings),
+                                solver_stats=json.dumps(equation.solver_stats, default=lambda x: x.item()))
+
+        self.replace_file(self.get_entry_path(key), write_entry)
+        self.index[equation.month] = key
+        self.evict()
+        self.write_index()
+
+    def get_size(self) -> int:
+        return sum(os.path.getsize(self.get_entry_path(key)) for key in self.get_keys())
+
+    def get_keys(self):
+        return [name[:-len('.npz')] for name in os.listdir(self.path) if name.endswith('.npz')]
+
+    def evict(self):
+        # drop least recently used entries until the store fits in max_bytes
+        entries = sorted((os.path.getmtime(self.get_entry_path(key)), key) for key in self.get_keys())
+        size = sum(os.path.getsize(self.get_entry_path(key)) for _, key in entries)
+        for _, key in entries:
+            if size <= self.max_bytes:
+                break
+            size -= os.path.getsize(self.get_entry_path(key))
+            os.remove(self.get_entry_path(key))
+        keys = set(self.get_keys())
+        self.index = {month: key for month, key in self.index.items() if key in keys}
@@ -0,0 +1,147 @@
+"""
+Sweep of the fit parameters - CONVEX_EPSILON_BETWEEN_GROUPS, LAMBDA_REG and RNPD_EQUATION_POLY_DEGREE -
+scored out of sample: every month's fit predicts the next month's M. The sample windows and the median
+tables are built once, every scenario is one solve per month: epsilon and lambda are cvx.Parameters of
+the cached RnpdProblem, so a layout is compiled once per degree. Months are split over a process pool.
+Run from the repository root:
+
+    python parameter_sweep.py --epsilons 0.01 0.02 0.03 --lambdas 0.5 1 1.5 2 --degrees 2 3 --output sweep.csv
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from const import CONSTRAINT_MODE, CONVEX_EPSILON_BETWEEN_GROUPS, LAMBDA_REG, RNPD_EQUATION_POLY_DEGREE
+from convex_class import RnpdEquation
+from data_reader import MonthlyData, iter_months, read_months
+from model_class import ModelData
+
+# (poly_degree, epsilon, lambda_reg)
+Scenario = Tuple[int, float, float]
+# (month, models_data, next month's Duration, Rnpd and M)
+SweepMonth = Tuple[str, pd.DataFrame, Tuple[np.ndarray, np.ndarray, np.ndarray]]
+
+
+def get_scenarios(degrees: List[int], epsilons: List[float], lambdas: List[float]) -> List[Scenario]:
+    # grouped by degree, so each worker solves all the epsilons and lambdas of a compiled problem in a row
+    return list(itertools.product(degrees, epsilons, lambdas))
+
+
+def get_sweep_months(model: ModelData, test_data: MonthlyData) -> List[SweepMonth]:
+    # every fitted month with the labelled rows of the month after it
+    tests = {}
+    for month, frame in iter_months(test_data):
+        frame = frame[frame['M'].notna()]
+        tests[month] = (frame['Duration'].to_numpy(dtype=float), frame['Rnpd'].to_numpy(dtype=float),
+                        frame['M'].to_numpy(dtype=float))
+    sweep_months = []
+    for month in sorted(model.models_data):
+        next_month = str(pd.Period(month, freq='M') + 1)
+        if not model.models_data[month].empty and next_month in tests:
+            sweep_months.append((month, model.models_data[month], tests[next_month]))
+    return sweep_months
+
+
+def fit_sweep_months(months: List[SweepMonth],
+                     scenarios: List[Scenario],
+                     constraints: str = CONSTRAINT_MODE) -> List[Dict]:
+    # one record per month and scenario - the solve and the next month's accuracy
+    records = []
+    for month, models_data, (durations, rnpds, groups) in months:
+        for poly_degree, epsilon, lambda_reg in scenarios:
+            record = {'month': month, 'poly_degree': poly_degree, 'epsilon': epsilon, 'lambda_reg': lambda_reg}
+            try:
+                equation = RnpdEquation(data=models_data, month=month, poly_degree=poly_degree,
+                                        constraints=constraints)
+                equation.fit_polynomial_regression(epsilon=epsilon, lambda_reg=lambda_reg)
+                predicted = equation.get_boundary_table().classify(durations, rnpds)
+                record.update(status=equation.solver_stats['status'],
+                              solve_time=equation.solver_stats['solve_time'],
+                              rows=len(groups),
+                              accuracy=np.mean(predicted == groups) if len(groups) else np.nan,
+                              within_one=np.mean(np.abs(predicted - groups) <= 1) if len(groups) else np.nan)
+            except Exception as E:
+                record.update(status=f'error: {E}')
+            records.append(record)
+    return records
+
+
+def run_sweep(model: ModelData,
+              test_data: MonthlyData,
+              scenarios: List[Scenario],
+              workers: int = 1,
+              constraints: str = CONSTRAINT_MODE) -> pd.DataFrame:
+    # one row per month and scenario, in compact dtypes
+    sweep_months = get_sweep_months(model, test_data)
+    if workers <= 1:
+        records = fit_sweep_months(sweep_months, scenarios, constraints)
+    else:
+        chunks = np.array_split(np.arange(len(sweep_months)), min(len(sweep_months), workers))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(fit_sweep_months, [sweep_months[i] for i in chunk], scenarios, constraints)
+                       for chunk in chunks]
+            records = [record for future in futures for record in future.result()]
+
+    results = pd.DataFrame.from_records(records, columns=['month', 'poly_degree', 'epsilon', 'lambda_reg', 'status',
+                                                          'solve_time', 'rows', 'accuracy', 'within_one'])
+    return results.astype({'month': 'category', 'poly_degree': 'int8', 'epsilon': 'float32', 'lambda_reg': 'float32',
+                           'status': 'category', 'solve_time': 'float32', 'rows': 'Int32', 'accuracy': 'float32',
+                           'within_one': 'float32'})
+
+
+def summarize_sweep(results: pd.DataFrame) -> pd.DataFrame:
+    # one row per scenario - accuracies weighted by the scored rows, best first
+    results = results.assign(hits=results['accuracy'] * results['rows'],
+                             near=results['within_one'] * results['rows'],
+                             not_optimal=results['status'] != 'optimal')
+    summary = results.groupby(['poly_degree', 'epsilon', 'lambda_reg'], observed=True).agg(
+        months=('month', 'size'), rows=('rows', 'sum'), hits=('hits', 'sum'), near=('near', 'sum'),
+        not_optimal=('not_optimal', 'sum'), solve_time=('solve_time', 'sum'))
+    summary['accuracy'] = summary.pop('hits') / summary['rows']
+    summary['within_one'] = summary.pop('near') / summary['rows']
+    return summary.sort_values('accuracy', ascending=False)
+
+
+def load_models_data(data: MonthlyData) -> ModelData:
+    # the sample windows and median tables of every month, without fitting
+    model = ModelData(raw_data='drop')
+    for month, month_data in iter_months(data):
+        model.load_month(data=month_data, month=month)
+    return model
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data', default='data/preprocessed/data_for_convex.csv', help='golden distribution')
+    parser.add_argument('--test-data', default='data/preprocessed/full_data_for_convex.csv',
+                        help='scored with the previous month\'s fit')
+    parser.add_argument('--epsilons', type=float, nargs='+', default=[CONVEX_EPSILON_BETWEEN_GROUPS])
+    parser.add_argument('--lambdas', type=float, nargs='+', default=[LAMBDA_REG])
+    parser.add_argument('--degrees', type=int, nargs='+', default=[RNPD_EQUATION_POLY_DEGREE])
+    parser.add_argument('--constraints', choices=['grid', 'adaptive'], default=CONSTRAINT_MODE)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', help='keep the per month results in this csv file')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    model = load_models_data(read_months(args.data))
+    print(f'{len(model.models_data)} months loaded in {time.perf_counter() - start:.1f}s')
+
+    scenarios = get_scenarios(args.degrees, args.epsilons, args.lambdas)
+    start = time.perf_counter()
+    results = run_sweep(model, read_months(args.test_data), scenarios, args.workers, args.constraints)
+    print(f'{len(scenarios)} scenarios, {len(results)} solves in {time.perf_counter() - start:.1f}s')
+    if args.output:
+        results.to_csv(args.output, index=False)
+    pd.set_option('display.width', 200)
+    print(summarize_sweep(results).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import os
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data_classes import month_ordinals
+
+HISTORY_COLUMNS = ['SecurityID', 'month', 'RankID', 'M', 'M_pred']
+
+
+class PredictionHistory:
+    """
+    Columnar history of the monthly predictions, one row per security and month, in growable arrays.
+    Rows are appended a month at a time in month order. Every row links to the previous row of its
+    security, and each security keeps its last row - so a month is appended, and checked for alerts,
+    in O(its rows) whatever the length of the history.
+    Alerts are the rows whose M_pred changed since the security's last prediction, or that diverged from
+    the security's rated group M while the last prediction did not.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.size: int = 0
+        self.columns: Dict[str, np.ndarray] = {
+            'SecurityID': np.empty(capacity, dtype=np.int64),
+            'month': np.empty(capacity, dtype=np.int64),  # monthly period ordinal
+            'RankID': np.empty(capacity, dtype=np.float32),
+            'M': np.empty(capacity, dtype=np.float32),
+            'M_pred': np.empty(capacity, dtype=np.float32),
+            'previous': np.empty(capacity, dtype=np.int64),  # the security's previous row, -1 for its first
+        }
+        # month -> (start, stop) rows
+        self.months: Dict[str, Tuple[int, int]] = {}
+        # SecurityID -> slot of the per security state
+        self.slots: Dict[int, int] = {}
+        self.last_row: np.ndarray = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def reserve(self, rows: int):
+        # capacity doubles, so appends are amortized O(new rows)
+        capacity = len(self.columns['month'])
+        if self.size + rows > capacity:
+            capacity = max(2 * capacity, self.size + rows)
+            for name, column in self.columns.items():
+                self.columns[name] = np.resize(column, capacity)
+
+    def get_slots(self, security_ids: np.ndarray) -> np.ndarray:
+        # new securities get the next free slot
+        slots = np.fromiter((self.slots.setdefault(security_id, len(self.slots))
+                             for security_id in security_ids.tolist()), dtype=np.int64, count=len(security_ids))
+        if len(self.slots) > len(self.last_row):
+            grown = np.full(max(len(self.slots), 2 * len(self.last_row)), -1, dtype=np.int64)
+            grown[:len(self.last_row)] = self.last_row
+            self.last_row = grown
+        return slots
+
+    def append(self, month: str, predictions: pd.DataFrame) -> pd.DataFrame:
+        # predictions - one month of iter_predictions' output (SecurityID, RankID, M, M_pred).
+        # returns the alerts of the month
+        if self.months and month <= max(self.months):
+            raise ValueError(f'Month {month} is not after the last month of the history {max(self.months)}')
+        # a security predicted twice in a month (a resampled gov bond) keeps its last row
+        predictions = predictions.drop_duplicates('SecurityID', keep='last')
+        rows = len(predictions)
+        self.reserve(rows)
+        start, stop = self.size, self.size + rows
+
+        slots = self.get_slots(predictions['SecurityID'].to_numpy(dtype=np.int64))
+        previous = self.last_row[slots]
+        columns = self.columns
+        columns['SecurityID'][start:stop] = predictions['SecurityID'].to_numpy(dtype=np.int64)
+        columns['month'][start:stop] = month_ordinals([month])[0]
+        for name in ['RankID', 'M', 'M_pred']:
+            columns[name][start:stop] = predictions[name].to_numpy(dtype=np.float32)
+        columns['previous'][start:stop] = previous
+        self.last_row[slots] = np.arange(start, stop)
+        self.months[month] = (start, stop)
+        self.size = stop
+
+        return self.get_alerts(start, stop)
+
+    def get_alerts(self, start: int, stop: int) -> pd.DataFrame:
+        # rows [start, stop) against their securities' previous rows
+        columns = self.columns
+        previous = columns['previous'][start:stop]
+        has_previous = previous >= 0
+        m_pred = columns['M_pred'][start:stop]
+        previous_m_pred = np.where(has_previous, columns['M_pred'][previous], np.nan)
+        diverged = self.is_diverged(np.arange(start, stop))
+        was_diverged = has_previous & self.is_diverged(np.where(has_previous, previous, start))
+
+        changed = has_previous & ~np.isnan(m_pred) & ~np.isnan(previous_m_pred) & (m_pred != previous_m_pred)
+        alerted = changed | (diverged & ~was_diverged)
+        rows = np.arange(start, stop)[alerted]
+        alerts = self.get_rows(rows)
+        alerts['previous_M_pred'] = previous_m_pred[alerted]
+        alerts['changed'] = changed[alerted]
+        alerts['diverged'] = diverged[alerted]
+        return alerts
+
+    def is_diverged(self, rows: np.ndarray) -> np.ndarray:
+        # predicted out of the rated group, rows without a prediction or a rating are not diverged
+        m, m_pred = self.columns['M'][rows], self.columns['M_pred'][rows]
+        return ~np.isnan(m) & ~np.isnan(m_pred) & (m != m_pred)
+
+    def get_rows(self, rows: np.ndarray) -> pd.DataFrame:
+        frame = pd.DataFrame({name: self.columns[name][rows] for name in HISTORY_COLUMNS})
+        frame['month'] = pd.PeriodIndex.from_ordinals(frame['month'], freq='M').astype(str)
+        return frame
+
+    def get_month(self, month: str) -> pd.DataFrame:
+        start, stop = self.months.get(month, (0, 0))
+        return self.get_rows(np.arange(start, stop))
+
+    def get_security(self, security_id: int) -> pd.DataFrame:
+        # the security's rows in month order, following the links back from its last row
+        rows = []
+        row = self.last_row[self.slots[security_id]] if security_id in self.slots else -1
+        while row >= 0:
+            rows.append(row)
+            row = self.columns['previous'][row]
+        return self.get_rows(np.array(rows[::-1], dtype=np.int64))
+
+    def to_frame(self) -> pd.DataFrame:
+        return self.get_rows(np.arange(self.size))
+
+    def save(self, path: str):
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f,
+                     months=np.array(list(self.months)),
+                     bounds=np.array(list(self.months.values()), dtype=np.int64).reshape(-1, 2),
+                     security_ids=np.array(list(self.slots), dtype=np.int64),
+                     last_row=self.last_row[:len(self.slots)],
+                     **{name: column[:self.size] for name, column in self.columns.items()})
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path: str) -> 'PredictionHistory':
+        with np.load(path) as saved:
+            history = cls(capacity=max(len(saved['month']), 1024))
+            history.size = len(saved['month'])
+            for name, column in history.columns.items():
+                column[:history.size] = saved[name]
+            history.months = {str(month): tuple(bounds)
+                              for month, bounds in zip(saved['months'], saved['bounds'].tolist())}
+            history.slots = {security_id: slot for slot, security_id in enumerate(saved['security_ids'].tolist())}
+            history.last_row = saved['last_row'].copy()
+        return history
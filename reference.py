@@ -0,0 +1,114 @@
+"""
+Reference implementations the vectorized code is checked and benchmarked against - the Sample / Duration / M
+sample windows ModelData used before the SampleStore, and the row-wise RNPD and per-group liquidity premium
+of the Loader - with the random frames they are compared on. Shared by the tests and the benchmarks.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from const import REQUIRED_SAMPLES
+from data.const import AMIHOOD_LIQUIDITY_COLUMN, HAZARD_RATE_COL
+from data.data_loader import Loader
+
+
+class Sample:
+    def __init__(self, month: datetime.date, group: int, rnpd: float, duration: int):
+        self.month = month
+        self.group = group # ranging between 1-12 possible groups(M)
+        self.rnpd = rnpd  #  rnpd calculated before in the pipeline
+        self.duration = duration  # rounded monthly value of DurationBruto
+
+
+class Duration:
+    def __init__(self, group:int, duration: int, samples: List[Sample]):
+        self.group = group
+        self.duration = duration
+        self.samples = []
+        self.set_multiple_samples(samples)
+
+    def get_oldest_sample(self) -> Optional[Sample]:
+        return min(self.samples, key=lambda sample: sample.month) if self.samples else None
+
+    def set_new_sample(self, sample: Sample):
+        if len(self.samples) < REQUIRED_SAMPLES[self.group]:
+            self.samples.append(sample)
+        else:
+            oldest_sample : Optional[Sample] = self.get_oldest_sample()
+            self.samples.remove(oldest_sample)
+            self.samples.append(sample)
+
+    def set_multiple_samples(self, samples: List[Sample]):
+        for sam in samples:
+            if sam.group == self.group and sam.duration == self.duration:
+                self.set_new_sample(sam)
+
+    def get_list_len(self):
+        return len(self.samples)
+
+
+class M:
+    def __init__(self, group: int):
+        self.group = group
+        self.durations: Optional[dict[int, Duration]] = {}
+
+    def update_items(self, data: pd.DataFrame):
+        # Filter rows where column M matches the current group.
+        df = data[data['M'] == self.group].copy()
+
+        # Group the DataFrame by duration (x) and create Sample objects for each group.
+        samples = df.groupby('Duration').apply(
+                        lambda group: [Sample(row['month'], row['M'], row['Rnpd'], row['Duration'])
+                        for index, row in group.iterrows()])
+        if not df.empty:
+            for duration_index in sorted(df['Duration'].unique()):
+                if not duration_index in self.durations.keys():
+                    self.durations[duration_index] = Duration(self.group, duration_index, samples.loc[duration_index])
+                else:
+                    self.durations[duration_index].set_multiple_samples(samples.loc[duration_index])
+
+
+def make_full_dataset(rows=3000, securities=200, seed=0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'SecurityID': rng.integers(0, securities, rows),
+        'month': pd.period_range('2016-01', periods=24, freq='M')[rng.integers(0, 24, rows)],
+        'RankID': rng.integers(1, 29, rows),
+        'Net Hazard Rate': rng.normal(2, 1.5, rows),
+    })
+
+
+def calculate_rnpd_rowwise(full_dataset: pd.DataFrame) -> pd.DataFrame:
+    # the former groupby.apply / row-wise dictionary lookup implementation
+    full_dataset = full_dataset.copy()
+    full_dataset['M'] = np.where(full_dataset['RankID'].between(12, 23), 11,
+                                 np.where(full_dataset['RankID'] >= 24, 12, full_dataset['RankID']))
+    rnpd_dictionary = full_dataset.groupby(['SecurityID', 'month']).apply(
+        lambda x: 1 - np.exp(-x['Net Hazard Rate'].mean() / 10), include_groups=False)
+    full_dataset['RNPD'] = full_dataset.apply(lambda x: rnpd_dictionary[(x.SecurityID, x.month)], axis=1)
+    full_dataset.loc[full_dataset['RankID'] == 1, 'RNPD'] = 0
+    full_dataset.loc[full_dataset['RankID'] >= 24, 'RNPD'] = 1
+    return full_dataset
+
+
+def make_secs(rows=4000, securities=300, seed=0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'ReportDate': pd.to_datetime('2016-01-01') + pd.to_timedelta(rng.integers(0, 30 * 36, rows), unit='D'),
+        'SecurityID': rng.integers(0, securities, rows),
+        'RankID': rng.integers(1, 29, rows),
+        'YieldBruto': rng.normal(2, 1, rows),
+        'DurationBruto': rng.uniform(0, 10, rows),
+        AMIHOOD_LIQUIDITY_COLUMN: rng.lognormal(0, 1, rows),
+        HAZARD_RATE_COL: rng.normal(3, 1, rows),
+    })
+
+
+def get_ami_means_per_group(df: pd.DataFrame) -> pd.Series:
+    # the former groupby.apply implementation
+    df = df[df[AMIHOOD_LIQUIDITY_COLUMN] < df[AMIHOOD_LIQUIDITY_COLUMN].quantile(0.99)].copy()
+    df.drop_duplicates(subset=['month', 'SecurityID'], keep='first', inplace=True)
+    return df.groupby(['RankGroup', 'month']).apply(lambda x: Loader.get_monthly_mean_yield(x),
+                                                       include_groups=False)
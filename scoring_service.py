@@ -0,0 +1,184 @@
+import argparse
+import asyncio
+import json
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from convex_class import BoundaryTable, RnpdEquation
+from model_class import ModelData
+from model_store import ModelStore
+from const import SCORING_HOST, SCORING_PORT, SCORING_RELOAD_INTERVAL
+
+HTTP_STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 503: 'Service Unavailable'}
+
+
+class ScoringModel:
+    # one monthly model as the service scores with it - the boundary table is built before it is swapped in
+
+    def __init__(self, equation: RnpdEquation):
+        self.month: str = equation.month
+        self.table: BoundaryTable = equation.get_boundary_table()
+
+    def score(self, durations: np.ndarray, rnpds: np.ndarray) -> np.ndarray:
+        return self.table.classify(durations, rnpds)
+
+
+class ScoringService:
+    """
+    Scores micro-batches of (SecurityID, Duration, Rnpd) with the latest monthly model, over HTTP on
+    localhost or a Unix socket:
+
+        POST /predict  {"SecurityID": [...], "Duration": [...], "Rnpd": [...]} -> {"month": ..., "M_pred": [...]}
+        POST /reload   swap to the newest month of the model store now
+        GET  /health   month served and requests scored
+
+    While serving, the model store index is polled (see watch) and a newly fitted month is swapped in
+    without a /reload. A swap replaces self.model in one assignment, each batch reads it once - a batch is
+    scored wholly by the old or the new model and no request waits on it. Reloads from the store run off
+    the event loop.
+    """
+
+    def __init__(self, model: Optional[ScoringModel] = None, store: Optional[ModelStore] = None):
+        self.model: Optional[ScoringModel] = model
+        self.store: Optional[ModelStore] = store
+        self.requests: int = 0
+        # modification time of the store index at the last reload
+        self.index_mtime: Optional[int] = None
+
+    @classmethod
+    def from_model_data(cls, model_data: ModelData, month: Optional[str] = None,
+                        store: Optional[ModelStore] = None) -> 'ScoringService':
+        # serves `month`, by default the latest fitted one
+        service = cls(store=store)
+        if model_data.models:
+            service.swap(model_data.models[month or max(model_data.models)])
+        return service
+
+    def swap(self, equation: RnpdEquation) -> str:
+        model = ScoringModel(equation)
+        self.model = model
+        return model.month
+
+    def reload(self) -> Optional[str]:
+        # the newest month of the store, if it is not the one served already
+        if self.store is None:
+            raise Exception('The service has no model store to reload from')
+        self.index_mtime = self.store.get_index_mtime()
+        self.store.index = self.store.read_index()
+        if not self.store.index:
+            return None
+        month = max(self.store.index)
+        if self.model is not None and self.model.month == month:
+            return month
+        equation = self.store.load(self.store.index[month], month)
+        return None if equation is None else self.swap(equation)
+
+    async def watch(self, interval: float = SCORING_RELOAD_INTERVAL):
+        # reloads whenever the store index changed since the last reload, off the event loop
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            if self.store.get_index_mtime() != self.index_mtime:
+                try:
+                    month = await loop.run_in_executor(None, self.reload)
+                    print(f'store index changed, serving month {month}', flush=True)
+                except Exception as E:
+                    print(f'Exception during model reload: {E!r}', flush=True)
+
+    def score(self, request: Dict) -> Dict:
+        model = self.model
+        if model is None:
+            raise LookupError('No model loaded')
+        durations = np.asarray(request['Duration'], dtype=float)
+        rnpds = np.asarray(request['Rnpd'], dtype=float)
+        if durations.shape != rnpds.shape or durations.ndim != 1:
+            raise ValueError('Duration and Rnpd have to be lists of the same length')
+        self.requests += 1
+        return {'month': model.month,
+                'SecurityID': request.get('SecurityID'),
+                'M_pred': model.score(durations, rnpds).tolist()}
+
+    async def route(self, method: str, path: str, body: bytes) -> Tuple[int, Dict]:
+        try:
+            if method == 'POST' and path == '/predict':
+                return 200, self.score(json.loads(body))
+            if method == 'POST' and path == '/reload':
+                month = await asyncio.get_running_loop().run_in_executor(None, self.reload)
+                return 200, {'month': month}
+            if method == 'GET' and path == '/health':
+                return 200, {'month': None if self.model is None else self.model.month, 'requests': self.requests}
+            return 404, {'error': f'No route {method} {path}'}
+        except LookupError as E:
+            return 503, {'error': str(E)}
+        except Exception as E:
+            return 400, {'error': repr(E)}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # HTTP/1.1 with keep-alive, one request at a time per connection
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode().partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                status, response = await self.route(method, path, body)
+                payload = json.dumps(response).encode()
+                writer.write(f'HTTP/1.1 {status} {HTTP_STATUS[status]}\r\n'
+                             f'Content-Type: application/json\r\n'
+                             f'Content-Length: {len(payload)}\r\n\r\n'.encode() + payload)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = SCORING_HOST, port: int = SCORING_PORT,
+                    path: Optional[str] = None) -> asyncio.AbstractServer:
+        # a Unix socket at `path`, else TCP on host:port
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path=path)
+        return await asyncio.start_server(self.handle, host=host, port=port)
+
+    async def serve(self, host: str = SCORING_HOST, port: int = SCORING_PORT, path: Optional[str] = None,
+                    reload_interval: float = SCORING_RELOAD_INTERVAL):
+        # the store is watched while serving, unless there is none or reload_interval is 0
+        async with await self.start(host, port, path) as server:
+            watcher = asyncio.create_task(self.watch(reload_interval)) if self.store is not None and reload_interval \
+                else None
+            try:
+                await server.serve_forever()
+            finally:
+                if watcher is not None:
+                    watcher.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default=SCORING_HOST)
+    parser.add_argument('--port', type=int, default=SCORING_PORT)
+    parser.add_argument('--socket', help='serve on this Unix socket instead of TCP')
+    parser.add_argument('--store', help='model store directory, defaults to const.MODEL_STORE_DIR')
+    parser.add_argument('--reload-interval', type=float, default=SCORING_RELOAD_INTERVAL,
+                        help='seconds between checks of the store for a newly fitted month, 0 to only reload on '
+                             'POST /reload')
+    args = parser.parse_args()
+
+    service = ScoringService(store=ModelStore(args.store) if args.store else ModelStore())
+    print(f'serving month {service.reload()} on {args.socket or f"{args.host}:{args.port}"}', flush=True)
+    asyncio.run(service.serve(args.host, args.port, args.socket, args.reload_interval))
+
+
+if __name__ == '__main__':
+    main()
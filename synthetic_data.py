@@ -0,0 +1,99 @@
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from const import EXPECTED_DATA_COLUMNS
+from data.const import RANKED_FILE_COLUMNS, RANK_COLUMN, HAZARD_RATE_COL, AMIHOOD_LIQUIDITY_COLUMN, PROSPECTUS_COLUMNS
+
+# the universe of data_for_convex.csv - about 400 securities over 95 months, 12 groups, durations 0-8
+MONTHS = 95
+SECURITIES = 400
+GROUPS = 12
+DURATIONS = 9
+
+
+def get_true_curves(groups: int = GROUPS, durations: int = DURATIONS) -> np.ndarray:
+    # (groups x durations) mean rnpd - ordered, convex and within [0, 1], so the fit constraints hold
+    spacing = min(0.045, 0.5 / groups)
+    d = np.arange(durations)
+    return 0.02 + spacing * np.arange(groups)[:, None] + 0.004 * d + 0.0003 * d ** 2
+
+
+def make_convex_data(months: int = MONTHS,
+                     securities: int = SECURITIES,
+                     groups: int = GROUPS,
+                     durations: int = DURATIONS,
+                     start: str = '2016-01',
+                     noise: float = 0.01,
+                     seed: int = 0) -> pd.DataFrame:
+    """
+    A data_for_convex.csv like frame with the EXPECTED_DATA_COLUMNS: one row per security and month.
+    Securities keep their group but for rare one step moves, their duration shortens by a month every
+    month and they are reissued at the longest duration. Rnpd is the group's curve at the duration plus noise.
+    """
+    rng = np.random.default_rng(seed)
+    curves = get_true_curves(groups, durations)
+    group = rng.integers(1, groups + 1, securities)
+    duration = rng.uniform(0, durations - 1, securities)
+
+    frames = []
+    for month in pd.period_range(start, periods=months, freq='M').astype(str):
+        moves = rng.random(securities) < 0.02
+        group = np.clip(group + moves * rng.choice([-1, 1], securities), 1, groups)
+        duration = np.where(duration < 1 / 12, durations - 1, duration - 1 / 12)
+        rounded = np.rint(duration).astype(int)
+        rnpd = np.clip(curves[group - 1, rounded] + rng.normal(0, noise, securities), 0.001, 0.999)
+        yield_bruto = 1 + 10 * rnpd + rng.normal(0, 0.1, securities)
+        frames.append(pd.DataFrame({
+            'month': month,
+            'M': group.astype(float),
+            'YieldBruto': yield_bruto,
+            'Net Hazard Rate AMI': -10 * np.log(1 - rnpd),
+            'ZSpread': yield_bruto - 0.5,
+            'SecurityID': 1000000 + np.arange(securities),
+            'Duration': rounded,
+            'RankID': np.where(group == groups, 24, group).astype(float),
+            'Rnpd': rnpd,
+        }))
+    return pd.concat(frames, ignore_index=True)[EXPECTED_DATA_COLUMNS]
+
+
+def make_ranked_data(months: int = MONTHS,
+                     securities: int = SECURITIES,
+                     start: str = '2016-01',
+                     seed: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Raw Loader inputs: (secs, gov, prospectus) frames as read from the CorpCPI, GOV and prospectus
+    workbooks - one month-end row per security, gov bonds a tenth of the securities, a few missing values.
+    """
+    rng = np.random.default_rng(seed)
+
+    def ranked_rows(ids: np.ndarray, ranked: bool) -> pd.DataFrame:
+        dates = pd.period_range(start, periods=months, freq='M').to_timestamp(how='end').normalize()
+        rows = len(ids) * months
+        df = pd.DataFrame({
+            'ReportDate': np.repeat(dates, len(ids)),
+            'SecurityID': np.tile(ids, months),
+            'IssuerName': np.tile([f'issuer_{i % 50}' for i in ids], months),
+            'IssuerSuperSectorName': np.tile([f'sector_{i % 8}' for i in ids], months),
+            'PriceClose': rng.normal(100, 5, rows),
+            'YieldBruto': rng.normal(2, 1, rows),
+            'DurationBruto': rng.uniform(0, 10, rows),
+            'ZSpread': rng.normal(1.5, 0.5, rows),
+            RANK_COLUMN: rng.integers(1, 29, rows).astype(float) if ranked else np.nan,
+            AMIHOOD_LIQUIDITY_COLUMN: rng.lognormal(0, 1, rows),
+            HAZARD_RATE_COL: rng.uniform(0, 5, rows),
+        })
+        for column in [RANK_COLUMN, AMIHOOD_LIQUIDITY_COLUMN, HAZARD_RATE_COL] if ranked else []:
+            df.loc[rng.random(rows) < 0.02, column] = np.nan
+        return df[RANKED_FILE_COLUMNS]
+
+    ids = 1000000 + np.arange(securities)
+    prospectus = pd.DataFrame({'SecurityID': ids,
+                               'GuaranteeID': rng.integers(0, 2, securities).astype(float),
+                               'NegativePledgeID': rng.integers(0, 2, securities).astype(float),
+                               'SeniorityID': rng.integers(1, 3, securities).astype(float)})
+    prospectus.loc[rng.random(securities) < 0.05, 'GuaranteeID'] = np.nan
+    return ranked_rows(ids, True), ranked_rows(np.arange(1, max(securities // 10, 1) + 1), False), \
+        prospectus[PROSPECTUS_COLUMNS]
@@ -0,0 +1,37 @@
+import numpy as np
+
+from backtest import LeadTimes, run_backtest
+from convex_handler import load, predict
+from model_store import ModelStore
+from synthetic_data import make_convex_data
+
+
+def test_backtest_matches_the_walk_forward_predictions(tmp_path):
+    data = make_convex_data(months=6, securities=300, groups=5, durations=6)
+    data.to_csv(tmp_path / 'data.csv', index=False)
+    predictions = predict(load(data), data)
+    hits = (predictions['M_pred'] == predictions['M']).groupby(predictions['month']).sum()
+
+    store = ModelStore(str(tmp_path / 'store'))
+    for workers in (1, 2):
+        result = run_backtest(data, str(tmp_path / 'data.csv'), workers=workers, chunk_months=2, store=store)
+        months = result.get_months()
+        assert list(months.index) == list(hits.index) and (months['hits'] == hits).all()
+        assert (months['rows'] == 300).all() and not result.errors
+        assert result.get_confusion().to_numpy().sum() == 5 * 300
+    # the second run loaded the 5 fits the first one saved
+    assert len(store.index) == 5
+
+
+def test_lead_time_counts_the_months_the_move_was_predicted():
+    lead_times = LeadTimes()
+    ids = np.array([1, 2])
+    for month, rated, predicted in [('2020-01', [3, 3], [3, 3]),
+                                    ('2020-02', [3, 3], [4, 3]),
+                                    ('2020-03', [3, 3], [4, 2]),
+                                    ('2020-04', [4, 2], [4, 2])]:
+        lead_times.update(month, ids, np.array(rated), np.array(predicted))
+    frame = lead_times.to_frame()
+    # security 1 was predicted a group up 2 months ahead, security 2 a group down 1 month ahead
+    assert frame.loc[3, 'rating_changes'] == 2 and frame.loc[3, 'anticipated'] == 2
+    assert frame.loc[3, 'max_lead'] == 2 and frame.loc[3, 'mean_lead'] == 1.5
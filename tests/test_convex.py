@@ -1,7 +1,7 @@
 from model_class import ModelData
+from model_plots import render_monthly_curves
 import pandas as pd
 import matplotlib.pyplot as plt
-import numpy as np
 
 def test_checking_pipe(data: pd.DataFrame):
     model = ModelData()
@@ -33,80 +33,22 @@ def test_loading_to_convex(data: pd.DataFrame):
             model.models[month].plot_graphs(month)
             break
 
-def test_plot_all_months(data: pd.DataFrame):
-    plt.ion()
-    fig, ax = plt.subplots()
-
-    model = ModelData()
-    months = sorted(data.month.unique())
-    x_vals = np.linspace(0, 10, 100)
-
-    for month in months:
-        model.load_month(data[data.month == month], month)
-        model.add_monthly_model(month)
-        ax.clear()
-        for group in sorted(model.models[month].groups.keys()):
-            poly_vals = sum([model.models[month].coeffs[group][i] * x_vals ** i for i in range(model.models[month].poly_degree + 1)])
-            ax.plot(x_vals, poly_vals, label=f'Group {group}')
-        ax.set_ylabel('RNPD')
-        ax.set_xlabel('Duration Index')
-        ax.set_title(f'{month} - Polynomial Regression for Risk Groups')
-        ax.legend(loc='upper left', bbox_to_anchor=(1, 0.5))
-        plt.draw()
-        plt.pause(0.01)
-    plt.ioff()
-    plt.show()
-
-
-import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
-import pandas as pd
-
-
-def test_plot_all_months_animation(data: pd.DataFrame, output_file="my_animation.gif"):
-    plt.ioff()
-    fig, ax = plt.subplots(figsize=(6, 4))
+def fit_all_months(data: pd.DataFrame) -> ModelData:
     model = ModelData()
-    months = sorted(data['month'].unique())
-    x_vals = np.linspace(0, 10, 100)
-
-    def init_func():
-        ax.clear()
-        ax.set_xlim(0, 10)
-        ax.set_ylim(0, 1)
-        return []
-
-    def update(frame):
-        ax.clear()
-        month = months[frame]
+    for month in sorted(data['month'].unique()):
         model.load_month(data[data['month'] == month], month)
-        model.add_monthly_model(month)
-
-        for group in sorted(model.models[month].groups.keys()):
-            coeffs = model.models[month].coeffs[group]
-            degree = model.models[month].poly_degree
-            # Evaluate polynomial at x_vals
-            poly_vals = sum(coeffs[i] * x_vals ** i for i in range(degree + 1))
-            ax.plot(x_vals, poly_vals, label=f'Group {group}')
+    model.add_monthly_models(months=list(model.models_data))
+    return model
 
-        ax.set_ylabel('RNPD')
-        ax.set_xlabel('Duration Index')
-        ax.set_title(f'{month} - Polynomial Regression for Risk Groups')
 
-        ax.legend(loc='upper left', bbox_to_anchor=(1, 0.5))
-        return []
+def test_plot_all_months(data: pd.DataFrame, output_dir="monthly_curves"):
+    # one png per month, rendered headless (see model_plots.py)
+    paths = render_monthly_curves(fit_all_months(data).models, output_dir)
+    print(f"{len(paths)} months saved to {output_dir}")
 
-    ani = animation.FuncAnimation(
-        fig, update,
-        init_func=init_func,
-        frames=len(months),
-        interval=1000,
-        blit=False
-    )
-
-    ani.save(output_file, writer='imagemagick', fps=2)
 
+def test_plot_all_months_animation(data: pd.DataFrame, output_file="my_animation.gif"):
+    render_monthly_curves(fit_all_months(data).models, output_file)
     print(f"Animation saved to {output_file}")
 
 
@@ -0,0 +1,137 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from const import LAMBDA_REG, CONVEX_EPSILON_BETWEEN_GROUPS
+from convex_class import RnpdEquation, RnpdProblem, evaluate_polynomials, get_violated_points
+from data_classes import SampleStore, month_ordinals
+from synthetic_data import make_convex_data
+
+
+def make_models_data(groups=(1, 2, 3, 4), durations=range(0, 8), seed=0) -> pd.DataFrame:
+    # medians rising with group and duration, one row per (group, duration) cell
+    rng = np.random.default_rng(seed)
+    rows = [{'group_index': group,
+             'duration_index': duration,
+             'rnpd': min(0.05 * group + 0.01 * duration + rng.normal(0, 0.01), 1)}
+            for group in groups for duration in durations]
+    return pd.DataFrame(rows)
+
+
+def objective(equation: RnpdEquation) -> float:
+    data = equation.data
+    coeffs = np.array([equation.coeffs[int(group)] for group in data['group_index']])
+    fitted = (coeffs * np.vander(data['duration_index'], coeffs.shape[1], increasing=True)).sum(axis=1)
+    return np.abs(data['rnpd'] - fitted).sum() + LAMBDA_REG * sum(np.abs(c).sum() for c in equation.coeffs.values())
+
+
+def test_matrix_formulation_matches_scalar():
+    data = make_models_data()
+    scalar = RnpdEquation(data=data, month='2020-01')
+    scalar.fit_polynomial_regression_scalar()
+    matrix = RnpdEquation(data=data, month='2020-01')
+    matrix.fit_polynomial_regression()
+
+    assert scalar.coeffs.keys() == matrix.coeffs.keys()
+    for group in scalar.coeffs:
+        np.testing.assert_allclose(matrix.coeffs[group], scalar.coeffs[group], atol=1e-4)
+
+
+def test_missing_cells_match_scalar():
+    data = make_models_data(groups=(2, 3, 5))
+    data = data[~((data.group_index == 3) & (data.duration_index > 4))]
+    scalar = RnpdEquation(data=data, month='2020-01')
+    scalar.fit_polynomial_regression_scalar()
+    matrix = RnpdEquation(data=data, month='2020-01')
+    matrix.fit_polynomial_regression()
+
+    for group in scalar.coeffs:
+        np.testing.assert_allclose(matrix.coeffs[group], scalar.coeffs[group], atol=1e-4)
+
+
+def test_problem_is_reused_across_months():
+    first = RnpdEquation(data=make_models_data(seed=1), month='2020-01')
+    first.fit_polynomial_regression()
+    second = RnpdEquation(data=make_models_data(seed=2), month='2020-02')
+    second.fit_polynomial_regression()
+
+    groups, durations, _ = first.get_median_matrix()
+    assert len([key for key in RnpdProblem._cache if key[:2] == (groups, durations)]) == 1
+    assert not all(np.allclose(first.coeffs[g], second.coeffs[g]) for g in first.coeffs)
+
+
+def test_warm_start_matches_cold_fit():
+    cold = RnpdEquation(data=make_models_data(seed=3), month='2020-03')
+    cold.fit_polynomial_regression()
+    for month, seed in [('2020-02', 4), ('2020-03', 3)]:
+        warm = RnpdEquation(data=make_models_data(seed=seed), month=month)
+        warm.fit_polynomial_regression(solver='SCS', warm_start=True)
+
+    assert warm.solver_stats['solver'] == 'SCS'
+    assert warm.solver_stats['iterations'] > 0
+    # the L1 fit can have several optimal coefficient sets - compare the objective instead
+    assert abs(objective(warm) - objective(cold)) < 1e-3
+
+
+def test_warm_start_from_previous_month_takes_fewer_iterations(monkeypatch):
+    # consecutive months of one layout, each on a problem not solved before (a fresh worker process or an
+    # evicted cache entry) - a warm start only has the previous month's fit to start from
+    data = make_convex_data(months=4, securities=120, groups=4, durations=6, seed=2)
+    store, iterations, previous = SampleStore(), {'cold': 0, 'warm': 0}, None
+    for month, frame in data.groupby('month'):
+        store.add(frame['M'].values, frame['Duration'].to_numpy(dtype=float), month_ordinals(frame['month']),
+                  frame['Rnpd'].values)
+        fits = {}
+        for mode in iterations:
+            monkeypatch.setattr(RnpdProblem, '_cache', OrderedDict())
+            fits[mode] = RnpdEquation(data=store.to_frame(), month=month)
+            fits[mode].fit_polynomial_regression(initial=previous if mode == 'warm' else None,
+                                                 solver='SCS', warm_start=mode == 'warm')
+            iterations[mode] += fits[mode].solver_stats['iterations']
+        assert abs(objective(fits['warm']) - objective(fits['cold'])) < 1e-3
+        previous = fits['warm']
+
+    assert iterations['warm'] < 0.5 * iterations['cold']
+
+
+def worst_violation(equation: RnpdEquation) -> float:
+    # largest violation of the bounds and the group gaps on a fine grid of the duration range
+    curves = evaluate_polynomials(np.linspace(0, 10, 20001),
+                                  np.vstack([equation.coeffs[group] for group in sorted(equation.coeffs)]))
+    return max((-curves).max(), (curves - 1).max(), (CONVEX_EPSILON_BETWEEN_GROUPS - np.diff(curves, axis=1)).max())
+
+
+def test_adaptive_constraints_hold_between_grid_points():
+    # a steep last group pushes the gap constraints to bind
+    data = make_models_data(groups=(1, 2, 3), seed=5)
+    data.loc[data.group_index == 3, 'rnpd'] = 0.11 + 0.002 * data.loc[data.group_index == 3, 'duration_index'] ** 2
+    for degree in (2, 3):
+        grid = RnpdEquation(data=data, month='2020-01', poly_degree=degree)
+        grid.fit_polynomial_regression()
+        adaptive = RnpdEquation(data=data, month='2020-01', poly_degree=degree, constraints='adaptive')
+        adaptive.fit_polynomial_regression()
+
+        assert adaptive.solver_stats['status'] == 'optimal'
+        assert worst_violation(adaptive) < 1e-6
+        assert not len(get_violated_points(np.vstack([adaptive.coeffs[g] for g in sorted(adaptive.coeffs)]),
+                                           np.linspace(0, 10, 1001), CONVEX_EPSILON_BETWEEN_GROUPS, 1e-6))
+        # stricter than the grid, by little
+        assert objective(grid) - 1e-4 <= objective(adaptive) <= objective(grid) + 1e-2
+    assert adaptive.solver_stats['cutting_plane_rounds'] >= 1
+
+
+def test_problem_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr('convex_class.PROBLEM_CACHE_SIZE', 2)
+    monkeypatch.setattr(RnpdProblem, '_cache', OrderedDict())
+    equations = [RnpdEquation(data=make_models_data(durations=range(0, 5 + i)), month=f'2020-0{i + 1}')
+                 for i in range(3)]
+    for equation in equations:
+        equation.fit_polynomial_regression()
+        assert not equation.solver_stats['problem_reused']
+    assert len(RnpdProblem._cache) == 2
+    # the first layout was evicted, the last one is still compiled
+    for equation, reused in [(equations[2], True), (equations[0], False)]:
+        equation.fit_polynomial_regression()
+        assert equation.solver_stats['problem_reused'] == reused
+    assert len(RnpdProblem._cache) == 2
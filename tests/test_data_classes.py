@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+import reference
+from data_classes import SampleStore, month_ordinals
+
+
+def test_sample_store_keeps_duration_retention(monkeypatch):
+    required_samples = {1: 3, 2: 5, 3: 4}
+    monkeypatch.setattr(reference, 'REQUIRED_SAMPLES', required_samples)
+    rng = np.random.default_rng(0)
+    store = SampleStore(required_samples)
+    sorted_store = SampleStore(required_samples, order_statistics=True)
+    cells = {}
+    for month in pd.period_range('2020-01', periods=12, freq='M').astype(str):
+        n = rng.integers(0, 15)
+        groups, durations, rnpds = rng.integers(1, 4, n), rng.integers(0, 4, n), rng.uniform(0, 1, n)
+        store.add(groups, durations, month_ordinals([month] * n), rnpds)
+        sorted_store.add(groups, durations, month_ordinals([month] * n), rnpds)
+        for group, duration, rnpd in zip(groups, durations, rnpds):
+            sample = reference.Sample(month, group, rnpd, duration)
+            if (group, duration) not in cells:
+                cells[(group, duration)] = reference.Duration(group, duration, [sample])
+            else:
+                cells[(group, duration)].set_new_sample(sample)
+
+        expected = pd.DataFrame([{'group_index': float(group), 'duration_index': float(duration),
+                                  'rnpd': np.median([sample.rnpd for sample in cell.samples])}
+                                 for (group, duration), cell in sorted(cells.items())])
+        if cells:
+            pd.testing.assert_frame_equal(store.to_frame(), expected)
+            pd.testing.assert_frame_equal(sorted_store.to_frame(), expected)
+    assert store.counts.max() == 5
+
+
+def test_sample_store_skips_rows_without_group():
+    store = SampleStore()
+    store.add([1, np.nan], [2, 3], month_ordinals(['2020-01', '2020-01']), [0.1, 0.2])
+    assert list(store.to_frame().itertuples(index=False)) == [(1.0, 2.0, 0.1)]
+
+
+def test_m_update_items_matches_sample_store():
+    rng = np.random.default_rng(1)
+    store, classes = SampleStore(), {}
+    for month in ['2020-01', '2020-02', '2020-03']:
+        n = 200
+        data = pd.DataFrame({'month': month, 'M': rng.integers(1, 4, n).astype(float),
+                             'Duration': rng.integers(0, 5, n), 'Rnpd': rng.uniform(0, 1, n)})
+        store.add(data['M'].values, data['Duration'].values, month_ordinals(data['month']), data['Rnpd'].values)
+        for m in sorted(data['M'].unique()):
+            classes.setdefault(m, reference.M(m)).update_items(data)
+
+    medians = store.to_frame().set_index(['group_index', 'duration_index'])['rnpd']
+    for m, m_class in classes.items():
+        for duration_index, duration_class in m_class.durations.items():
+            assert medians[(m, duration_index)] == np.median([sample.rnpd for sample in duration_class.samples])
+
+
+def test_only_touched_cells_are_recomputed():
+    store = SampleStore()
+    store.add([1, 1, 2], [0, 1, 0], month_ordinals(['2020-01'] * 3), [0.1, 0.2, 0.3])
+    medians = store.get_medians()
+    store.add([2], [0], month_ordinals(['2020-02']), [0.5])
+    assert store.dirty.sum() == 1
+    assert store.get_medians() is medians
+    assert medians[1, 0] == 0.4 and not store.dirty.any()
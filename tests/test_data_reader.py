@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from convex_handler import load, predict
+from data_reader import read_months, get_partitions_dir
+from synthetic_data import make_convex_data
+
+
+def write_csv(path, months):
+    rng = np.random.default_rng(0)
+    n = len(months)
+    pd.DataFrame({'month': months, 'M': rng.integers(1, 13, n).astype(float),
+                  'YieldBruto': rng.uniform(0, 5, n), 'Net Hazard Rate AMI': rng.uniform(0, 5, n),
+                  'ZSpread': rng.uniform(0, 5, n), 'SecurityID': rng.integers(1e6, 2e6, n),
+                  'Rnpd': rng.uniform(0, 1, n), 'RankID1': rng.integers(1, 25, n).astype(float),
+                  'Duration': np.where(np.arange(n) == 0, np.nan, rng.integers(0, 10, n)), 'DurationBruto': rng.uniform(0, 10, n)}).to_csv(path)
+
+
+def test_read_months_streams_unsorted_csv_by_month(tmp_path):
+    path = str(tmp_path / 'data.csv')
+    write_csv(path, ['2020-03', '2020-01', '2020-02', '2020-01', '2020-03', '2020-01'])
+    source = pd.read_csv(path).rename(columns={'RankID1': 'RankID'})
+
+    months = list(read_months(path, chunksize=2))
+    assert [month for month, _ in months] == ['2020-01', '2020-02', '2020-03']
+    for month, frame in months:
+        assert 'DurationBruto' not in frame and 'Unnamed: 0' not in frame
+        assert frame['Duration'].dtype == 'Int16' and frame['M'].dtype == 'Int16'
+        assert frame['Duration'].isna().sum() == (month == source['month'][0])
+        assert frame['Rnpd'].dtype == np.float64 and frame['YieldBruto'].dtype == np.float64
+        expected = source[source.month == month]
+        np.testing.assert_array_equal(frame['Rnpd'].values, expected['Rnpd'].values)
+        np.testing.assert_array_equal(frame['RankID'].values, expected['RankID'].values)
+
+
+def test_partitions_are_rebuilt_when_csv_changes(tmp_path):
+    path = str(tmp_path / 'data.csv')
+    write_csv(path, ['2020-01', '2020-02'])
+    assert len(list(read_months(path))) == 2
+
+    write_csv(path, ['2020-01', '2020-02', '2020-04'])
+    os.utime(path, (os.path.getmtime(get_partitions_dir(path)) + 1,) * 2)
+    assert [month for month, _ in read_months(path)] == ['2020-01', '2020-02', '2020-04']
+
+
+def test_all_columns_and_row_positions_are_kept_for_prediction(tmp_path):
+    # the pass-through columns are written back as the former whole-csv read writes them, under their own names
+    data = make_convex_data(months=3, securities=300, groups=5, durations=6)
+    data = data.rename(columns={'RankID': 'RankID1'}).assign(M=data['M'].astype(int),
+                                                             DurationBruto=data['Duration'] + 0.25)
+    data = data.sample(frac=1, random_state=0).reset_index(drop=True)
+    path = str(tmp_path / 'data.csv')
+    data.to_csv(path)
+
+    predictions = predict(load(read_months(path)), read_months(path, columns=None))
+    assert predictions['M_pred'].notna().all()
+    expected = pd.read_csv(path).drop('Unnamed: 0', axis=1)
+    expected = expected[expected['month'] != expected['month'].min()]
+    assert predictions.drop(columns='M_pred').sort_index().to_csv() == expected.to_csv()
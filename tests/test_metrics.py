@@ -0,0 +1,46 @@
+import json
+
+import pandas as pd
+
+from convex_handler import load, predict
+from metrics import Metrics, profiled
+from synthetic_data import make_convex_data
+
+
+def test_monthly_metrics_record_load_fit_and_predict(tmp_path):
+    data = make_convex_data(months=4, securities=300, groups=5, durations=6)
+    model = load(data)
+    predict(model, data)
+
+    metrics = model.get_metrics()
+    assert list(metrics.index) == sorted(data['month'].unique())
+    assert (metrics['rows'] == 300).all() and (metrics['load_month_time'] >= metrics['samples_add_time']).all()
+    assert metrics['medians_time'].notna().all() and (metrics['model_cells'] == 30).all()
+    assert metrics['status'].isin(['optimal', 'optimal_inaccurate']).all()
+    assert (metrics['constraints'] == 4).all() and (metrics['constraint_rows'] > metrics['variables']).all()
+    assert metrics[['solve_time', 'compilation_time', 'fit_time', 'iterations']].notna().all().all()
+    # months 2-4 are scored with the previous month's model
+    assert metrics['predicted_rows'].iloc[:3].eq(300).all() and pd.isna(metrics['predicted_rows'].iloc[3])
+
+    model.metrics.dump(str(tmp_path / 'metrics.json'))
+    model.metrics.dump(str(tmp_path / 'metrics.csv'))
+    with open(tmp_path / 'metrics.json') as f:
+        assert json.load(f)[metrics.index[0]]['status'] == metrics['status'].iloc[0]
+    assert list(pd.read_csv(tmp_path / 'metrics.csv', index_col='month').index) == list(metrics.index)
+
+
+def test_timers_and_counters_add_up():
+    metrics = Metrics()
+    for _ in range(2):
+        with metrics.timer('2020-01', 'load_month'):
+            metrics.add('2020-01', 'rows', 10)
+    assert metrics.records['2020-01']['rows'] == 20 and metrics.records['2020-01']['load_month_time'] > 0
+
+
+def test_profiled_run_keeps_the_raw_output(tmp_path, capsys):
+    with profiled('cprofile', str(tmp_path / 'run.pstats')):
+        make_convex_data(months=2, securities=10)
+    with profiled('tracemalloc', str(tmp_path / 'run.snapshot')):
+        make_convex_data(months=2, securities=10)
+    assert (tmp_path / 'run.pstats').exists() and (tmp_path / 'run.snapshot').exists()
+    assert 'peak traced memory' in capsys.readouterr().out
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_reader import iter_months
+from convex_handler import load
+from model_class import ModelData
+from synthetic_data import make_convex_data
+from test_convex_formulation import make_models_data
+
+
+def test_parallel_fit_matches_sequential_and_keeps_errors():
+    months = ['2020-01', '2020-02', '2020-03', '2020-04']
+    models = {}
+    for workers in [1, 2]:
+        model = ModelData()
+        model.models_data = {month: make_models_data(seed=i) for i, month in enumerate(months)}
+        model.models_data['2020-03'] = model.models_data['2020-03'].drop(columns='rnpd')
+        model.add_monthly_models(months=months, workers=workers)
+        models[workers] = model
+
+    for model in models.values():
+        assert list(model.models) == ['2020-01', '2020-02', '2020-04']
+        assert list(model.errors) == ['2020-03']
+    for month in models[1].models:
+        for group, coeffs in models[1].models[month].coeffs.items():
+            np.testing.assert_allclose(models[2].models[month].coeffs[group], coeffs, atol=1e-9)
+
+
+def test_dropped_and_spilled_months_keep_the_same_models_data(tmp_path):
+    data = make_convex_data(months=3, securities=300, groups=5, durations=6)
+    models = {}
+    for raw_data in ['keep', 'drop', 'spill']:
+        model = ModelData(raw_data=raw_data, spill_dir=str(tmp_path))
+        for month, month_data in iter_months(data):
+            model.load_month(data=month_data, month=month)
+        models[raw_data] = model
+
+    month = max(models['keep'].data)
+    assert not models['drop'].data and not models['spill'].data
+    assert models['drop'].get_month_data(month) is None
+    pd.testing.assert_frame_equal(models['spill'].get_month_data(month), models['keep'].get_month_data(month))
+    for model in [models['drop'], models['spill']]:
+        pd.testing.assert_frame_equal(model.models_data[month], models['keep'].models_data[month])
+    with pytest.raises(ValueError):
+        ModelData(raw_data='discard')
+
+
+def test_malformed_month_is_kept_as_an_error():
+    data = make_convex_data(months=3, securities=300, groups=5, durations=6)
+    months = [(month, frame.assign(Other=0) if i == 1 else frame) for i, (month, frame) in enumerate(iter_months(data))]
+    model = load(months)
+    assert list(model.models) == [months[0][0], months[2][0]]
+    assert isinstance(model.errors[months[1][0]], ValueError)
@@ -0,0 +1,47 @@
+import numpy as np
+from PIL import Image
+
+from convex_class import RnpdEquation, constraint_grid
+from model_plots import get_curves, render_monthly_curves
+from test_convex_formulation import make_models_data
+
+
+def make_models():
+    # the third month has no group 4 curve
+    models = {}
+    for i, month in enumerate(['2020-01', '2020-02', '2020-03']):
+        groups = (1, 2, 3) if i == 2 else (1, 2, 3, 4)
+        models[month] = RnpdEquation(data=make_models_data(groups=groups, seed=i), month=month, poly_degree=2 + i % 2)
+        models[month].fit_polynomial_regression()
+    return models
+
+
+def test_curves_are_evaluated_on_the_shared_grid():
+    models = make_models()
+    curves = get_curves(models)
+    x = constraint_grid()
+    assert curves.values.shape == (3, len(x), 4) and list(curves.labels) == [1, 2, 3, 4]
+    for month, values in zip(curves.months, curves.values):
+        for group, curve in zip(curves.labels, values.T):
+            if group in models[month].coeffs:
+                expected = np.polynomial.polynomial.polyval(x, models[month].coeffs[group])
+                np.testing.assert_allclose(curve, expected, atol=1e-12)
+            else:
+                assert np.isnan(curve).all()
+
+
+def test_months_are_rendered_to_files_and_pages(tmp_path):
+    models = make_models()
+    for workers in (1, 2):
+        paths = render_monthly_curves(models, str(tmp_path / f'png_{workers}'), workers=workers)
+        assert [path[-11:] for path in paths] == ['2020-01.png', '2020-02.png', '2020-03.png']
+        assert Image.open(paths[0]).size == (1000, 600)
+    # the lines and title of each month are drawn over the same background
+    first, second = (np.asarray(Image.open(path)) for path in paths[:2])
+    assert (first != second).any()
+
+    [gif] = render_monthly_curves(models, str(tmp_path / 'curves.gif'))
+    assert Image.open(gif).n_frames == 3
+    [pdf] = render_monthly_curves(models, str(tmp_path / 'pack.pdf'))
+    with open(pdf, 'rb') as f:
+        assert b'/Count 3 ' in f.read()
@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+
+import model_store
+
+from convex_class import RnpdEquation
+from model_class import ModelData
+from model_store import ModelStore, get_fit_settings
+from test_convex_formulation import make_models_data
+
+MONTHS = ['2020-01', '2020-02', '2020-03']
+
+
+def make_model(seeds=(0, 1, 2)) -> ModelData:
+    model = ModelData()
+    model.models_data = {month: make_models_data(seed=seed) for month, seed in zip(MONTHS, seeds)}
+    return model
+
+
+def count_fits(monkeypatch) -> list:
+    fits = []
+    fit = RnpdEquation.fit_polynomial_regression
+    monkeypatch.setattr(RnpdEquation, 'fit_polynomial_regression',
+                        lambda self, **kwargs: fits.append(self.month) or fit(self, **kwargs))
+    return fits
+
+
+def test_unchanged_months_are_loaded_not_refitted(tmp_path, monkeypatch):
+    fits = count_fits(monkeypatch)
+    first = make_model()
+    first.add_monthly_models(MONTHS, store=ModelStore(str(tmp_path)))
+    assert fits == MONTHS
+
+    second = make_model(seeds=(0, 1, 7))
+    second.add_monthly_models(MONTHS, store=ModelStore(str(tmp_path)))
+    assert fits == MONTHS + ['2020-03']
+    for month in MONTHS[:2]:
+        for group, coeffs in first.models[month].coeffs.items():
+            np.testing.assert_array_equal(second.models[month].coeffs[group], coeffs)
+
+    restored = ModelData.from_store(ModelStore(str(tmp_path)))
+    assert list(restored.models) == MONTHS
+    for group, coeffs in second.models['2020-03'].coeffs.items():
+        np.testing.assert_array_equal(restored.models['2020-03'].coeffs[group], coeffs)
+    assert restored.models['2020-03'].solver_stats == second.models['2020-03'].solver_stats
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    store = ModelStore(str(tmp_path))
+    make_model().add_monthly_models(MONTHS, store=store)
+    entry_size = max(os.path.getsize(store.get_entry_path(key)) for key in store.get_keys())
+    for age, month in enumerate(MONTHS):
+        os.utime(store.get_entry_path(store.index[month]), (age, age))
+
+    store.max_bytes = 2 * entry_size
+    store.evict()
+    assert sorted(store.index) == ['2020-02', '2020-03']
+    assert store.get_size() <= store.max_bytes
+
+
+def test_fits_of_other_solver_settings_are_not_served(tmp_path, monkeypatch):
+    fits = count_fits(monkeypatch)
+    make_model().add_monthly_models(MONTHS, store=ModelStore(str(tmp_path)))
+    warm = make_model()
+    warm.warm_start, warm.solver = True, 'SCS'
+    warm.add_monthly_models(MONTHS, store=ModelStore(str(tmp_path)))
+    make_model().add_monthly_models(MONTHS, store=ModelStore(str(tmp_path)))
+    # the default solver fits were loaded back, the warm started ones were stored apart
+    assert fits == MONTHS + MONTHS
+    assert len(ModelStore(str(tmp_path)).get_keys()) == 2 * len(MONTHS)
+
+
+def test_cutting_plane_settings_are_in_the_key(monkeypatch):
+    settings = get_fit_settings(constraints='adaptive')
+    for name, value in [('CUTTING_PLANE_MAX_ROUNDS', 5), ('CUTTING_PLANE_COARSE_POINTS', 21),
+                        ('CUTTING_PLANE_TOLERANCE', 1e-5)]:
+        with monkeypatch.context() as patch:
+            patch.setattr(model_store, name, value)
+            assert get_fit_settings(constraints='adaptive') != settings
+    assert get_fit_settings() == get_fit_settings(constraints='grid')
+
+
+def test_writes_leave_no_temporary_files(tmp_path):
+    store = ModelStore(str(tmp_path))
+    make_model().add_monthly_models(MONTHS, store=store)
+    assert sorted(os.listdir(tmp_path)) == sorted([ModelStore.INDEX_FILE] +
+                                                  [f'{store.index[month]}.npz' for month in MONTHS])
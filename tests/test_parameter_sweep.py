@@ -0,0 +1,29 @@
+from collections import OrderedDict
+
+import pandas as pd
+
+from convex_class import RnpdProblem
+from parameter_sweep import get_scenarios, load_models_data, run_sweep, summarize_sweep
+from synthetic_data import make_convex_data
+
+
+def test_sweep_solves_each_scenario_once_per_month(monkeypatch):
+    data = make_convex_data(months=4, securities=300, groups=5, durations=6)
+    model = load_models_data(data)
+    scenarios = get_scenarios([2, 3], [0.01, 0.02], [0.5, 1.5])
+
+    # an empty cache, so every problem the sweep compiles is counted
+    monkeypatch.setattr(RnpdProblem, '_cache', OrderedDict())
+    results = run_sweep(model, data, scenarios)
+    # the last month has no next month to score
+    assert len(results) == 3 * len(scenarios) and set(results['status']) == {'optimal'}
+    # one compiled problem per degree, epsilon and lambda are parameters
+    assert len(RnpdProblem._cache) == 2
+    assert (results['rows'] == 300).all() and results['accuracy'].between(0.5, 1).all()
+
+    summary = summarize_sweep(results)
+    assert len(summary) == len(scenarios) and (summary['months'] == 3).all()
+    assert summary['accuracy'].is_monotonic_decreasing
+
+    parallel = run_sweep(model, data, scenarios, workers=2)
+    pd.testing.assert_series_equal(parallel['accuracy'], results['accuracy'])
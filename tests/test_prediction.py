@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+from convex_class import RnpdEquation
+from model_class import ModelData
+from test_convex_formulation import make_models_data
+
+
+def fitted_equation(groups=(2, 3, 5, 8)) -> RnpdEquation:
+    equation = RnpdEquation(data=make_models_data(groups=groups), month='2020-01')
+    equation.fit_polynomial_regression()
+    return equation
+
+
+def rowwise_group(equation: RnpdEquation, duration: float, rnpd: float) -> int:
+    closest_group = {group: abs(np.polyval(coeffs[::-1], duration) - rnpd) for group, coeffs in equation.coeffs.items()}
+    return min(closest_group, key=closest_group.get)
+
+
+def test_batch_prediction_matches_rowwise_and_maps_labels():
+    equation = fitted_equation()
+    rng = np.random.default_rng(0)
+    durations, rnpds = rng.integers(0, 11, 500), rng.uniform(0, 0.6, 500)
+
+    predicted = equation.get_matching_groups(durations, rnpds)
+    assert set(predicted) <= {2, 3, 5, 8}
+    assert list(predicted) == [rowwise_group(equation, d, r) for d, r in zip(durations, rnpds)]
+    assert equation.get_matching_group(durations[0], rnpds[0]) == predicted[0]
+
+
+def test_predict_class_keeps_index():
+    model = ModelData()
+    model.models['2020-01'] = fitted_equation()
+    data = pd.DataFrame({'Duration': [1, 4, 7], 'Rnpd': [0.1, 0.2, 0.45]}, index=[10, 20, 30])
+    predicted = model.predict_class(month='2020-01', data=data)
+    assert list(predicted.index) == [10, 20, 30]
+
+
+def test_boundary_table_matches_full_evaluation():
+    equation = fitted_equation(groups=(1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12))
+    table = equation.get_boundary_table()
+    rng = np.random.default_rng(1)
+    durations = np.concatenate([rng.integers(0, 11, 2000),        # on the grid
+                                rng.uniform(0, 10, 2000),         # in range, between grid points
+                                rng.uniform(-5, 20, 2000),        # partly outside the constrained range
+                                [np.nan, 3, 3]])
+    rnpds = np.concatenate([rng.uniform(-0.2, 1.2, 6000), [0.3, np.nan, 0.3]])
+    # exact ties between two adjacent curves go to the lower group, as argmin does
+    curves = equation.get_coefficient_matrix()[1] @ np.array([1, 4, 16])
+    durations, rnpds = np.append(durations, 4), np.append(rnpds, (curves[2] + curves[3]) / 2)
+
+    assert table.ordered_polynomials and table.ordered_grid.all()
+    np.testing.assert_array_equal(table.classify(durations, rnpds), equation.get_matching_groups(durations, rnpds))
+
+
+def test_duration_tables_score_mixed_months_like_each_months_model():
+    model = ModelData()
+    model.models['2020-01'] = fitted_equation(groups=(1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12))
+    model.models['2020-02'] = fitted_equation(groups=(2, 3, 5))
+    rng = np.random.default_rng(2)
+    durations = np.concatenate([rng.integers(0, 11, 3000).astype(float), rng.uniform(-2, 12, 1000), [np.nan, 3]])
+    rnpds = np.concatenate([rng.uniform(-0.2, 1.2, 4000), [0.3, np.nan]])
+    months = rng.choice(['2020-01', '2020-02', '2019-12'], len(durations))
+    data = pd.DataFrame({'Duration': durations, 'Rnpd': rnpds}, index=np.arange(len(durations)) * 2)
+
+    predicted = model.predict_classes(months, data)
+    assert list(predicted.index) == list(data.index) and predicted[months == '2019-12'].isna().all()
+    for month in ['2020-01', '2020-02']:
+        rows = months == month
+        np.testing.assert_array_equal(predicted[rows].to_numpy(dtype=int),
+                                      model.models[month].get_matching_groups(durations[rows], rnpds[rows]))
+        np.testing.assert_array_equal(model.predict_class(month, data[rows]).values, predicted[rows].values)
+
+    # a refit replaces the month's tables
+    tables = model.get_duration_tables()
+    model.models['2020-02'].fit_polynomial_regression(lambda_reg=0.1)
+    assert model.get_duration_tables() is not tables
+
+
+def test_single_month_prediction_builds_only_its_tables():
+    model = ModelData()
+    for month, groups in [('2020-01', (1, 2, 3)), ('2020-02', (2, 3, 5)), ('2020-03', (1, 4))]:
+        model.models[month] = fitted_equation(groups=groups)
+    data = pd.DataFrame({'Duration': [0., 3., 7.5], 'Rnpd': [0.1, 0.3, 0.6]})
+
+    predicted = model.predict_class('2020-02', data)
+    np.testing.assert_array_equal(predicted.values, model.models['2020-02'].get_matching_groups(
+        data['Duration'].values, data['Rnpd'].values))
+    assert list(model.month_tables) == ['2020-02'] and model.duration_tables is None
+    assert [month for month, equation in model.models.items() if equation.boundary_table is not None] == ['2020-02']
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from prediction_history import PredictionHistory
+
+
+def make_predictions(m_pred, m=(1, 2, 3), security_ids=(10, 20, 30)) -> pd.DataFrame:
+    return pd.DataFrame({'SecurityID': security_ids, 'RankID': m, 'M': m, 'M_pred': m_pred})
+
+
+def test_alerts_are_changes_and_new_divergences(tmp_path):
+    history = PredictionHistory(capacity=2)
+    first = history.append('2020-01', make_predictions([1, 3, 3]))
+    # security 20 is predicted out of its rated group from its first month
+    assert first['SecurityID'].tolist() == [20] and not first['changed'].any()
+
+    # 20 stays diverged with the same prediction, 10 moves to group 2, 30 to group 2, 40 is new and diverged
+    second = history.append('2020-02', make_predictions([2, 3, 2, 1], m=(1, 2, 3, 2), security_ids=(10, 20, 30, 40)))
+    assert second['SecurityID'].tolist() == [10, 30, 40]
+    assert second['changed'].tolist() == [True, True, False]
+    assert second['previous_M_pred'].iloc[:2].tolist() == [1, 3] and np.isnan(second['previous_M_pred'].iloc[2])
+
+    assert history.get_security(30)['M_pred'].tolist() == [3, 2]
+    assert history.get_month('2020-02')['SecurityID'].tolist() == [10, 20, 30, 40]
+    with pytest.raises(ValueError):
+        history.append('2020-02', make_predictions([1, 2, 3]))
+
+    history.save(str(tmp_path / 'history.npz'))
+    loaded = PredictionHistory.load(str(tmp_path / 'history.npz'))
+    pd.testing.assert_frame_equal(loaded.to_frame(), history.to_frame())
+    third = loaded.append('2020-03', make_predictions([2, 3, 3], security_ids=(10, 20, 30)))
+    assert third['SecurityID'].tolist() == [30] and loaded.get_security(10)['month'].tolist() == [
+        '2020-01', '2020-02', '2020-03']
@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import numpy as np
+
+from model_store import ModelStore, get_fit_settings
+from scoring_service import ScoringService
+from test_prediction import fitted_equation
+
+
+async def send(reader, writer, method: str, path: str, body=None):
+    payload = b'' if body is None else json.dumps(body).encode()
+    writer.write(f'{method} {path} HTTP/1.1\r\nContent-Length: {len(payload)}\r\n\r\n'.encode() + payload)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) != b'\r\n':
+        name, _, value = line.decode().partition(':')
+        headers[name.lower()] = value.strip()
+    return status, json.loads(await reader.readexactly(int(headers['content-length'])))
+
+
+def test_service_scores_batches_and_swaps_models(tmp_path):
+    first, second = fitted_equation(), fitted_equation(groups=(1, 4, 6, 9, 11))
+    second.month = '2020-02'
+    store = ModelStore(str(tmp_path))
+    service = ScoringService(store=store)
+    service.swap(first)
+
+    rng = np.random.default_rng(0)
+    durations, rnpds = rng.uniform(0, 12, 64), rng.uniform(0, 0.6, 64)
+    batch = {'SecurityID': list(range(64)), 'Duration': durations.tolist(), 'Rnpd': rnpds.tolist()}
+
+    async def run():
+        server = await service.start(port=0)
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+
+        status, response = await send(reader, writer, 'POST', '/predict', batch)
+        assert status == 200 and response['month'] == '2020-01' and response['SecurityID'] == batch['SecurityID']
+        assert response['M_pred'] == first.get_matching_groups(durations, rnpds).tolist()
+
+        service.swap(second)  # the same connection keeps being served
+        status, response = await send(reader, writer, 'POST', '/predict', batch)
+        assert response['month'] == '2020-02'
+        assert response['M_pred'] == second.get_matching_groups(durations, rnpds).tolist()
+
+        store.save(store.get_key(first.data, get_fit_settings()), first, get_fit_settings())
+        first.month = '2020-03'
+        store.save(store.get_key(first.data, get_fit_settings()), first, get_fit_settings())
+        assert await send(reader, writer, 'POST', '/reload') == (200, {'month': '2020-03'})
+        assert (await send(reader, writer, 'GET', '/health'))[1] == {'month': '2020-03', 'requests': 2}
+
+        assert (await send(reader, writer, 'POST', '/predict', {'Duration': [1, 2], 'Rnpd': [0.1]}))[0] == 400
+        assert (await send(reader, writer, 'GET', '/models'))[0] == 404
+        writer.close()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())
+
+
+def test_newly_fitted_month_is_swapped_in_without_reload(tmp_path):
+    first = fitted_equation()
+    store = ModelStore(str(tmp_path))
+    store.save(store.get_key(first.data, get_fit_settings()), first, get_fit_settings())
+    service = ScoringService(store=ModelStore(str(tmp_path)))
+    assert service.reload() == '2020-01'
+
+    async def run():
+        watcher = asyncio.create_task(service.watch(interval=0.01))
+        await asyncio.sleep(0.05)
+        assert service.model.month == '2020-01'
+        second = fitted_equation(groups=(1, 4, 6, 9, 11))
+        second.month = '2020-02'
+        store.save(store.get_key(second.data, get_fit_settings()), second, get_fit_settings())
+        for _ in range(200):
+            if service.model.month == '2020-02':
+                break
+            await asyncio.sleep(0.01)
+        watcher.cancel()
+
+    asyncio.run(run())
+    assert service.model.month == '2020-02' and service.model.table.labels.tolist() == [1, 4, 6, 9, 11]
+
+
+def test_service_without_model_is_unavailable():
+    status, response = asyncio.run(ScoringService().route('POST', '/predict', b'{"Duration": [1], "Rnpd": [0.1]}'))
+    assert status == 503 and response == {'error': 'No model loaded'}
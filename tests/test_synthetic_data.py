@@ -0,0 +1,30 @@
+import numpy as np
+
+from const import EXPECTED_DATA_COLUMNS
+from data.const import RANKED_FILE_COLUMNS
+from data.data_loader import Loader
+from model_class import ModelData
+from synthetic_data import make_convex_data, make_ranked_data
+
+
+def test_convex_data_fits_and_predicts_its_groups():
+    data = make_convex_data(months=14, securities=300, groups=6, durations=7)
+    assert list(data.columns) == EXPECTED_DATA_COLUMNS and len(data) == 14 * 300
+    assert set(data['M']) == set(range(1, 7)) and set(data['Duration']) <= set(range(7))
+
+    model = ModelData()
+    for month, frame in data.groupby('month'):
+        model.load_month(data=frame, month=month)
+    months = sorted(model.models_data)
+    model.add_monthly_model(months[-2])
+    last = data[data['month'] == months[-1]]
+    assert np.mean(model.predict_class(month=months[-2], data=last).values == last['M'].values) > 0.9
+
+
+def test_ranked_data_runs_through_the_loader_steps():
+    secs, gov, prospectus = make_ranked_data(months=3, securities=50)
+    assert list(secs.columns) == RANKED_FILE_COLUMNS and len(secs) == 150 and len(gov) == 15
+    loader = Loader()
+    loader.secs, loader.gov = Loader.filter_ranked_data(secs, gov)
+    assert len(loader.gov) == 15 and 100 < len(loader.secs) < 150
+    assert set(prospectus['SecurityID']) == set(secs['SecurityID'])